@@ -2,6 +2,7 @@ import logging
 from typing import Mapping, List, Any
 
 from core.sync import get_cert_store_type
+from core.tracing import span
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -154,7 +155,8 @@ def _get_annotation_vals_as_list(annotation_val) -> List[str]:
 def sync_certificate(body) -> Mapping[str, List[Mapping[str, Any]]]:
     # Request API at for DecoratorController at https://metacontroller.github.io/metacontroller/api/decoratorcontroller.html#sync-hook-request
     obj = body["object"]
-    certificate = _new_certificate(obj)
+    with span("certificate"):
+        certificate = _new_certificate(obj)
     attachments = [certificate] if certificate else []
     desired_state = {"attachments": attachments}
     return desired_state
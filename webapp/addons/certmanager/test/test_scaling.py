@@ -0,0 +1,39 @@
+import copy
+import os
+from typing import Mapping
+
+import pytest
+
+from conftest import assert_linear_scaling, load_json_as_dict, measure_scaling
+from webapp.addons.certmanager.main import sync_certificate
+
+
+@pytest.fixture(scope="module")
+def full_route_load() -> Mapping:
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    return load_json_as_dict(f"{cwd}/json/full-integration-route-request.json")
+
+
+def test_sync_certificate_alt_names_scale_linearly(full_route_load):
+    def make_route(n: int) -> dict:
+        route = copy.deepcopy(full_route_load)
+        route["object"]["metadata"]["annotations"]["cert-manager.io/alt-names"] = (
+            ",".join(f"alt-{i}.example.com" for i in range(n))
+        )
+        return route
+
+    samples = measure_scaling(sync_certificate, make_route)
+
+    assert_linear_scaling(samples)
+
+
+def test_sync_certificate_annotations_scale_linearly(full_route_load):
+    def make_route(n: int) -> dict:
+        route = copy.deepcopy(full_route_load)
+        annotations = route["object"]["metadata"]["annotations"]
+        annotations.update({f"annotation-{i}": f"value-{i}" for i in range(n)})
+        return route
+
+    samples = measure_scaling(sync_certificate, make_route)
+
+    assert_linear_scaling(samples)
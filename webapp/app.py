@@ -1,16 +1,22 @@
+import contextlib
 import logging.config
 
 from starlette.applications import Starlette
+from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
 from starlette.routing import Route, Mount
 from starlette.types import ASGIApp
 
 import config as cfg
+from core import k8s_client, xml_preflight
+from core.tracing import ServerTimingMiddleware
 from logconf import LOG_CONF
-from routes import webhook
+from routes import debug, webhook
+from routes.metrics import metrics
 from routes.webhook import build_webhook
-from routes.deploy import deploy_route
+from routes.deploy import cancel_job, deploy_route, get_job, jobs, retry_job
+from routes.read import get_route, list_routes
 from addons.certmanager.main import sync_certificate
 
 _LOGGER = logging.getLogger(__name__)
@@ -29,10 +35,19 @@ def _with_cors(app: Starlette, origins_env: str) -> ASGIApp:
     return CORSMiddleware(
         app=app,
         allow_origins=origins,
-        allow_methods=["GET", "PUT"],
+        allow_methods=["GET", "PUT", "POST", "DELETE"],
     )
 
 
+@contextlib.asynccontextmanager
+async def _lifespan(app: Starlette):
+    yield
+    await jobs.shutdown()
+    await k8s_client.close_async_client()
+    k8s_client.stop_informers()
+    xml_preflight.shutdown()
+
+
 async def status(request):
     return JSONResponse({"status": "UP"})
 
@@ -53,11 +68,32 @@ def create_app() -> ASGIApp:
 
     routes = [
         Route("/route", deploy_route, methods=["PUT"]),
+        Route("/route/jobs/{job_id}", get_job, methods=["GET"]),
+        Route("/route/jobs/{job_id}", cancel_job, methods=["DELETE"]),
+        Route("/route/jobs/{job_id}/retry", retry_job, methods=["POST"]),
+        # After the jobs, which take precedence over routes in a namespace named 'jobs'
+        Route("/route", list_routes, methods=["GET"]),
+        Route("/route/{namespace}/{name}", get_route, methods=["GET"]),
         Route("/status", status, methods=["GET"]),
         Mount(path="/webhook", routes=webhook.routes + addon_routes),
     ]
 
-    starlette_app = Starlette(debug=cfg.DEBUG, routes=routes)
+    if cfg.METRICS_ENABLED:
+        routes.append(Route("/metrics", metrics, methods=["GET"]))
+
+    middleware = []
+    if cfg.SERVER_TIMING_ENABLED:
+        middleware.append(
+            Middleware(ServerTimingMiddleware, export_file=cfg.TRACE_EXPORT_FILE)
+        )
+
+    if cfg.DEBUG_ENDPOINTS_ENABLED:
+        _LOGGER.warning("Debug endpoints are enabled under '/debug'")
+        routes.append(Mount(path="/debug", routes=debug.routes))
+
+    starlette_app = Starlette(
+        debug=cfg.DEBUG, routes=routes, middleware=middleware, lifespan=_lifespan
+    )
 
     if cfg.CORS_ALLOWED_ORIGINS:
         starlette_app = _with_cors(starlette_app, cfg.CORS_ALLOWED_ORIGINS)
@@ -12,3 +12,200 @@ CORS_ALLOWED_ORIGINS = cfg("CORS_ALLOWED_ORIGINS", cast=str, default="")
 INTEGRATION_CONTAINER_IMAGE = cfg(
     "INTEGRATION_IMAGE", cast=str, default="keip-integration"
 )
+
+# Image of the init container that reassembles compressed routes (needs 'sh', 'cat' and 'gunzip')
+ROUTE_INIT_CONTAINER_IMAGE = cfg("ROUTE_INIT_IMAGE", cast=str, default="busybox:1.36")
+
+# Tracing
+# Report per-phase request timings in a 'Server-Timing' response header
+SERVER_TIMING_ENABLED = cfg("SERVER_TIMING_ENABLED", cast=bool, default=True)
+
+# Optional file path to export request spans to, in Chrome Trace Event format (loadable in Perfetto)
+TRACE_EXPORT_FILE = cfg("TRACE_EXPORT_FILE", cast=str, default="")
+
+# Traffic capture
+# File to write sampled webhook requests/responses to (with secrets redacted). Disabled when empty.
+WEBHOOK_CAPTURE_FILE = cfg("WEBHOOK_CAPTURE_FILE", cast=str, default="")
+
+# Fraction of webhook requests to capture, between 0.0 and 1.0
+WEBHOOK_CAPTURE_SAMPLE_RATE = cfg(
+    "WEBHOOK_CAPTURE_SAMPLE_RATE", cast=float, default=1.0
+)
+
+# Size at which the capture file is rotated, and the number of rotated files to keep
+WEBHOOK_CAPTURE_MAX_BYTES = cfg(
+    "WEBHOOK_CAPTURE_MAX_BYTES", cast=int, default=10 * 1024 * 1024
+)
+WEBHOOK_CAPTURE_BACKUP_COUNT = cfg("WEBHOOK_CAPTURE_BACKUP_COUNT", cast=int, default=3)
+
+# Diagnostics
+# Expose the '/debug' endpoints (memory diagnostics). NOT SUITABLE FOR PRODUCTION unless a token is set.
+DEBUG_ENDPOINTS_ENABLED = cfg("DEBUG_ENDPOINTS_ENABLED", cast=bool, default=False)
+
+# If set, '/debug' requests must carry an 'Authorization: Bearer <token>' header
+DEBUG_ENDPOINTS_TOKEN = cfg("DEBUG_ENDPOINTS_TOKEN", cast=str, default="")
+
+# Kubernetes client
+# Force server-side apply of route resources when another field manager owns a conflicting field
+K8S_APPLY_FORCE_CONFLICTS = cfg("K8S_APPLY_FORCE_CONFLICTS", cast=bool, default=True)
+
+# Connections the blocking client keeps open to the API server; requests beyond this open throwaway connections
+K8S_POOL_MAXSIZE = cfg("K8S_POOL_MAXSIZE", cast=int, default=32)
+
+# Send TCP keepalive probes on idle API server connections
+K8S_TCP_KEEPALIVE = cfg("K8S_TCP_KEEPALIVE", cast=bool, default=True)
+
+# Timeouts for connecting to the API server and waiting for each response
+K8S_CONNECT_TIMEOUT_SECONDS = cfg(
+    "K8S_CONNECT_TIMEOUT_SECONDS", cast=float, default=5.0
+)
+K8S_READ_TIMEOUT_SECONDS = cfg("K8S_READ_TIMEOUT_SECONDS", cast=float, default=30.0)
+
+# Client-side throttling of API requests, to stay within the API server's priority-and-fairness share for
+# keip's service account. A QPS of 0 disables throttling.
+K8S_CLIENT_QPS = cfg("K8S_CLIENT_QPS", cast=float, default=0.0)
+K8S_CLIENT_BURST = cfg("K8S_CLIENT_BURST", cast=int, default=10)
+
+# How long a successful cluster reachability check is reused before probing the API server again
+K8S_REACHABILITY_TTL_SECONDS = cfg(
+    "K8S_REACHABILITY_TTL_SECONDS", cast=float, default=10.0
+)
+
+# Consecutive API server failures before deployments fail fast, and how long to wait before probing again
+K8S_CIRCUIT_FAILURE_THRESHOLD = cfg(
+    "K8S_CIRCUIT_FAILURE_THRESHOLD", cast=int, default=3
+)
+K8S_CIRCUIT_RESET_SECONDS = cfg("K8S_CIRCUIT_RESET_SECONDS", cast=float, default=15.0)
+
+# Exponential backoff for retrying a failed client configuration load
+K8S_CONFIG_RETRY_BASE_SECONDS = cfg(
+    "K8S_CONFIG_RETRY_BASE_SECONDS", cast=float, default=1.0
+)
+K8S_CONFIG_RETRY_MAX_SECONDS = cfg(
+    "K8S_CONFIG_RETRY_MAX_SECONDS", cast=float, default=60.0
+)
+
+# Retries of route API requests failing with a connection error, a 429, a 5xx or (when taking ownership) a
+# conflict: attempts per request, exponential backoff with full jitter between them (unless the API server
+# sends a 'Retry-After'), and the deadline all attempts of a request must finish within. 1 attempt disables
+# retries.
+K8S_RETRY_MAX_ATTEMPTS = cfg("K8S_RETRY_MAX_ATTEMPTS", cast=int, default=4)
+K8S_RETRY_BASE_SECONDS = cfg("K8S_RETRY_BASE_SECONDS", cast=float, default=0.2)
+K8S_RETRY_MAX_SECONDS = cfg("K8S_RETRY_MAX_SECONDS", cast=float, default=5.0)
+K8S_RETRY_DEADLINE_SECONDS = cfg("K8S_RETRY_DEADLINE_SECONDS", cast=float, default=60.0)
+
+# Deploy routes with the asyncio client instead of running the blocking client on worker threads
+K8S_ASYNC_CLIENT_ENABLED = cfg("K8S_ASYNC_CLIENT_ENABLED", cast=bool, default=False)
+
+# Maximum routes deployed at once by the asyncio client, which is also the size of its connection pool
+K8S_ASYNC_MAX_CONCURRENCY = cfg("K8S_ASYNC_MAX_CONCURRENCY", cast=int, default=64)
+
+# Skip writing route resources whose content digest annotation already matches. Without the informer cache,
+# this costs a read per resource, which is still far cheaper for the API server than a write.
+K8S_SKIP_UNCHANGED_WRITES = cfg("K8S_SKIP_UNCHANGED_WRITES", cast=bool, default=True)
+
+# Store routes of at least 'ROUTE_COMPRESSION_MIN_BYTES' minified and gzipped in 'binaryData', split across
+# ConfigMaps holding at most 'ROUTE_CHUNK_BYTES' of compressed data each (ConfigMaps are limited to 1 MiB)
+ROUTE_COMPRESSION_ENABLED = cfg("ROUTE_COMPRESSION_ENABLED", cast=bool, default=False)
+ROUTE_COMPRESSION_MIN_BYTES = cfg(
+    "ROUTE_COMPRESSION_MIN_BYTES", cast=int, default=64 * 1024
+)
+ROUTE_CHUNK_BYTES = cfg("ROUTE_CHUNK_BYTES", cast=int, default=512 * 1024)
+
+# Keep a watch-backed cache of keip's ConfigMaps and IntegrationRoutes (needs the 'list' and 'watch' verbs)
+K8S_INFORMER_ENABLED = cfg("K8S_INFORMER_ENABLED", cast=bool, default=False)
+
+# Objects requested per page when the informers (or a batch deploy) list, and how long each watch runs before
+# it is renewed
+K8S_INFORMER_PAGE_SIZE = cfg("K8S_INFORMER_PAGE_SIZE", cast=int, default=500)
+K8S_WATCH_TIMEOUT_SECONDS = cfg("K8S_WATCH_TIMEOUT_SECONDS", cast=int, default=300)
+
+# Routes a batch deploys to a namespace before it lists the namespace's keip-created resources for their digests,
+# instead of reading the metadata of each resource on its own
+K8S_BATCH_LIST_MIN_ROUTES = cfg("K8S_BATCH_LIST_MIN_ROUTES", cast=int, default=10)
+
+# Routes deployed at once across all '/route' requests
+DEPLOY_MAX_CONCURRENCY = cfg("DEPLOY_MAX_CONCURRENCY", cast=int, default=64)
+
+# Routes deployed per second (and bursts above it) across all '/route' requests, per namespace and per
+# client. A rate of 0 disables that limit. Routes waiting for the global rate are served weighted-fair across
+# namespaces.
+DEPLOY_RATE_LIMIT_QPS = cfg("DEPLOY_RATE_LIMIT_QPS", cast=float, default=0.0)
+DEPLOY_RATE_LIMIT_BURST = cfg("DEPLOY_RATE_LIMIT_BURST", cast=int, default=100)
+DEPLOY_NAMESPACE_QPS = cfg("DEPLOY_NAMESPACE_QPS", cast=float, default=0.0)
+DEPLOY_NAMESPACE_BURST = cfg("DEPLOY_NAMESPACE_BURST", cast=int, default=50)
+DEPLOY_CLIENT_QPS = cfg("DEPLOY_CLIENT_QPS", cast=float, default=0.0)
+DEPLOY_CLIENT_BURST = cfg("DEPLOY_CLIENT_BURST", cast=int, default=50)
+
+# Comma-separated namespace weights for the global rate (e.g. "team-a=2,batch=0.5"); namespaces default to 1
+DEPLOY_NAMESPACE_WEIGHTS = cfg("DEPLOY_NAMESPACE_WEIGHTS", cast=str, default="")
+
+# Longest a '/route' request's route may wait for the rate limits before the request is rejected with a 429.
+# Background jobs always wait.
+DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS = cfg(
+    "DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS", cast=float, default=10.0
+)
+
+# Header identifying the client for the per-client rate (e.g. "X-Forwarded-For" behind an ingress). The
+# client's address is used when empty.
+DEPLOY_CLIENT_ID_HEADER = cfg("DEPLOY_CLIENT_ID_HEADER", cast=str, default="")
+
+# Largest '/route' request body, and largest single route in it as encoded in the JSON body (or as a file of an
+# archive body). Larger requests are rejected with a 413 as soon as the limit is crossed, without buffering the
+# rest of the body.
+ROUTE_MAX_BODY_BYTES = cfg("ROUTE_MAX_BODY_BYTES", cast=int, default=64 * 1024 * 1024)
+ROUTE_MAX_ITEM_BYTES = cfg("ROUTE_MAX_ITEM_BYTES", cast=int, default=4 * 1024 * 1024)
+# Most bytes a compressed archive body may inflate to in all, counting the files that are not routes too
+ROUTE_MAX_INFLATED_BYTES = cfg(
+    "ROUTE_MAX_INFLATED_BYTES", cast=int, default=256 * 1024 * 1024
+)
+
+# Check that each '/route' route is well-formed Spring XML before any of its resources are written, in a pool
+# of 'ROUTE_XML_PREFLIGHT_WORKERS' threads so large routes don't stall the event loop
+ROUTE_XML_PREFLIGHT_ENABLED = cfg(
+    "ROUTE_XML_PREFLIGHT_ENABLED", cast=bool, default=True
+)
+ROUTE_XML_PREFLIGHT_WORKERS = cfg("ROUTE_XML_PREFLIGHT_WORKERS", cast=int, default=4)
+
+# How long the response to a '/route' request carrying an 'Idempotency-Key' header is replayed to retries
+# with the same key
+ROUTE_IDEMPOTENCY_TTL_SECONDS = cfg(
+    "ROUTE_IDEMPOTENCY_TTL_SECONDS", cast=float, default=600.0
+)
+
+# How long the result of deploying a route is reused, reported as unchanged, for an identical route in another
+# '/route' request. Identical routes deployed at the same time always share one deployment. Reuse is off by
+# default, as a reused route is not written again, so it won't repair resources edited or deleted meanwhile.
+ROUTE_DEDUPE_TTL_SECONDS = cfg("ROUTE_DEDUPE_TTL_SECONDS", cast=float, default=0.0)
+
+# Idempotency keys and route results kept for replay; the oldest are dropped beyond this
+ROUTE_IDEMPOTENCY_MAX_ENTRIES = cfg(
+    "ROUTE_IDEMPOTENCY_MAX_ENTRIES", cast=int, default=1000
+)
+
+# Longest a 'PUT /route?wait=true' request streams the status of its routes until they are all Ready, and
+# the wait used when the request doesn't set a shorter 'timeout'
+ROUTE_WAIT_TIMEOUT_SECONDS = cfg(
+    "ROUTE_WAIT_TIMEOUT_SECONDS", cast=float, default=300.0
+)
+
+# Routes returned per page by 'GET /route', unless the request's 'limit' asks for fewer
+ROUTE_LIST_MAX_LIMIT = cfg("ROUTE_LIST_MAX_LIMIT", cast=int, default=500)
+
+# Background deployment jobs ('PUT /route?async=true'): workers running jobs at once, jobs allowed to wait for
+# a worker, and how many finished jobs are kept (and for how long) for polling
+DEPLOY_JOB_WORKERS = cfg("DEPLOY_JOB_WORKERS", cast=int, default=2)
+DEPLOY_JOB_MAX_QUEUED = cfg("DEPLOY_JOB_MAX_QUEUED", cast=int, default=100)
+DEPLOY_JOB_RETENTION_COUNT = cfg("DEPLOY_JOB_RETENTION_COUNT", cast=int, default=100)
+DEPLOY_JOB_RETENTION_SECONDS = cfg(
+    "DEPLOY_JOB_RETENTION_SECONDS", cast=float, default=3600.0
+)
+
+# Retry-After sent when the job queue is full
+DEPLOY_JOB_RETRY_AFTER_SECONDS = cfg(
+    "DEPLOY_JOB_RETRY_AFTER_SECONDS", cast=int, default=30
+)
+
+# Metrics
+# Expose Prometheus metrics at '/metrics'
+METRICS_ENABLED = cfg("METRICS_ENABLED", cast=bool, default=True)
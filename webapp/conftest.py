@@ -1,7 +1,121 @@
+import copy
 import json
-from typing import Mapping
+import math
+import os
+import time
+import tracemalloc
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, List, Mapping
+
+import pytest
 
 
 def load_json_as_dict(filepath: str) -> Mapping:
     with open(filepath, "r") as f:
         return json.load(f)
+
+
+# Comma-separated input sizes used by the scaling tests.
+SCALING_SIZES = [
+    int(n) for n in os.getenv("SCALING_SIZES", "10,100,1000,10000").split(",")
+]
+
+# How far above linear (as a log-log growth exponent) a measurement may grow before failing.
+SCALING_TOLERANCE = float(os.getenv("SCALING_TOLERANCE", "0.5"))
+
+_SCALING_REPEATS = 5
+
+
+@dataclass
+class ScalingSample:
+    size: int
+    seconds: float
+    peak_bytes: int
+
+
+def measure_scaling(
+    func: Callable[[Any], Any], make_input: Callable[[int], Any]
+) -> List[ScalingSample]:
+    """
+    Call `func` with inputs of increasing size and record the best wall time and the peak memory
+    allocated during a single call.
+
+    Inputs are built (and deep-copied per call) outside the measured region so only `func` is counted.
+    """
+    samples = []
+    for size in SCALING_SIZES:
+        payload = make_input(size)
+
+        best = float("inf")
+        for _ in range(_SCALING_REPEATS):
+            arg = copy.deepcopy(payload)
+            start = time.perf_counter()
+            func(arg)
+            best = min(best, time.perf_counter() - start)
+
+        arg = copy.deepcopy(payload)
+        tracemalloc.start()
+        try:
+            func(arg)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        samples.append(ScalingSample(size, best, peak))
+    return samples
+
+
+def growth_exponent(samples: List[ScalingSample], metric: str) -> float:
+    """
+    Estimate the growth exponent k (cost ~ n^k) from the two largest samples.
+
+    Small sizes are dominated by fixed per-call overhead, so they only serve as a sanity baseline.
+    """
+    small, large = samples[-2], samples[-1]
+    small_val = max(getattr(small, metric), 1e-9)
+    large_val = max(getattr(large, metric), 1e-9)
+    return math.log(large_val / small_val) / math.log(large.size / small.size)
+
+
+def assert_linear_scaling(samples: List[ScalingSample]) -> None:
+    limit = 1 + SCALING_TOLERANCE
+    report = ", ".join(
+        f"n={s.size}: {s.seconds * 1e3:.3f}ms/{s.peak_bytes}B" for s in samples
+    )
+    for metric in ("seconds", "peak_bytes"):
+        exponent = growth_exponent(samples, metric)
+        assert (
+            exponent <= limit
+        ), f"{metric} grows as n^{exponent:.2f} (limit n^{limit:.2f}): {report}"
+
+
+@pytest.fixture
+def fake_api(tmp_path, monkeypatch):
+    """Run a fake API server and point `core.k8s_client` at it through a generated kubeconfig."""
+    from kubernetes import client
+
+    import core.k8s_client
+    from core.circuit_breaker import CircuitBreaker
+    from core.test.fake_apiserver import FakeApiServer
+
+    with FakeApiServer(namespaces=("default", "other")) as server:
+        kubeconfig = server.write_kubeconfig(str(tmp_path / "kubeconfig"))
+        monkeypatch.setenv("KUBECONFIG", kubeconfig)
+        monkeypatch.setattr(client.Configuration, "_default", None)
+        for name, value in [
+            ("_configured", False),
+            ("_config_attempts", 0),
+            ("_config_retry_at", 0.0),
+            ("_reachable_until", 0.0),
+            ("_breaker", CircuitBreaker("kubernetes-api", 3, 15.0)),
+            ("_async_apis", weakref.WeakKeyDictionary()),
+            ("_informers", {}),
+            ("_route_watch", None),
+            ("_route_watchers", 0),
+            ("v1", None),
+            ("routeApi", None),
+        ]:
+            monkeypatch.setattr(core.k8s_client, name, value)
+        yield server
+        core.k8s_client.stop_informers()
@@ -0,0 +1,523 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Output inflated per call, so that a small chunk of a highly compressed archive is never inflated at once
+_INFLATE_BYTES = 64 * 1024
+
+_TAR_BLOCK = 512
+_TAR_FILE_TYPES = (b"0", b"\0", b"7")
+# GNU long names and pax headers are buffered whole, so they are kept short
+_TAR_MAX_HEADER_DATA_BYTES = 64 * 1024
+
+_ZIP_LOCAL_HEADER = b"PK\x03\x04"
+_ZIP_DESCRIPTOR = b"PK\x07\x08"
+# Any of these after the entries means there are no more of them: the central directory adds nothing needed
+_ZIP_ENDS = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+_ZIP_LOCAL_FORMAT = struct.Struct("<4sHHHHHIIIHH")
+_ZIP_STORED, _ZIP_DEFLATED = 0, 8
+_ZIP_ENCRYPTED_FLAG = 0x1
+_ZIP_DESCRIPTOR_FLAG = 0x8
+_ZIP_UTF8_FLAG = 0x800
+_ZIP64_EXTRA = 0x0001
+_ZIP64_UNKNOWN = 0xFFFFFFFF
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class ArchiveStreamError(ValueError):
+    pass
+
+
+class EntryTooLargeError(ArchiveStreamError):
+    pass
+
+
+class InflatedTooLargeError(ArchiveStreamError):
+    pass
+
+
+class _Inflated:
+    """The bytes inflated out of an archive so far, across its gzip and zip layers."""
+
+    def __init__(self, max_bytes: Optional[int]) -> None:
+        self.max_bytes = max_bytes
+        self.count = 0
+
+    def add(self, count: int) -> None:
+        self.count += count
+        if self.max_bytes is not None and self.count > self.max_bytes:
+            raise InflatedTooLargeError(
+                f"Archive inflates to more than {self.max_bytes} bytes"
+            )
+
+
+@dataclass
+class ArchiveEntry:
+    path: str
+    data: bytes
+
+
+class _Stream:
+    """
+    Buffers the bytes fed to an archive parser, of which `_scan` consumes what it can, keeping its state in
+    between calls.
+    """
+
+    def __init__(self, max_entry_bytes: int, select: Callable[[str], bool]) -> None:
+        self.max_entry_bytes = max_entry_bytes
+        self._select = select
+        self._buf = bytearray()
+        self._pos = 0
+        self._done = False
+
+    def feed(self, data: bytes) -> Iterator[ArchiveEntry]:
+        self._buf += data
+        return self._entries()
+
+    def _entries(self) -> Iterator[ArchiveEntry]:
+        try:
+            yield from self._scan()
+        finally:
+            if self._done:
+                # Anything after the end of the archive is padding
+                self._pos = len(self._buf)
+            del self._buf[: self._pos]
+            self._pos = 0
+
+    def _available(self) -> int:
+        return len(self._buf) - self._pos
+
+    def _take(self, count: int) -> bytes:
+        data = bytes(self._buf[self._pos : self._pos + count])
+        self._pos += count
+        return data
+
+    def _check_size(self, path: str, size: int) -> None:
+        if size > self.max_entry_bytes:
+            raise EntryTooLargeError(
+                f"Archive entry '{path}' exceeds {self.max_entry_bytes} bytes"
+            )
+
+    def _scan(self) -> Iterator[ArchiveEntry]:
+        raise NotImplementedError
+
+
+def _tar_number(field: bytes) -> int:
+    if field[0] & 0x80:
+        # GNU base-256, for sizes that don't fit the octal field
+        if field[0] != 0x80:
+            raise ArchiveStreamError("Invalid tar header")
+        return int.from_bytes(field[1:], "big")
+    try:
+        return int(field.strip(b" \0") or b"0", 8)
+    except ValueError:
+        raise ArchiveStreamError("Invalid tar header")
+
+
+def _tar_string(field: bytes) -> str:
+    return field.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def _pax_records(data: bytes) -> Dict[str, str]:
+    records = {}
+    pos = 0
+    try:
+        while pos < len(data) and data[pos] != 0:
+            space = data.index(b" ", pos)
+            end = pos + int(data[pos:space])
+            key, _, value = data[space + 1 : end - 1].partition(b"=")
+            records[key.decode()] = value.decode("utf-8", "replace")
+            pos = end
+    except ValueError:
+        raise ArchiveStreamError("Invalid pax header")
+    return records
+
+
+class TarStream(_Stream):
+    """
+    Incrementally extracts the regular files of a tar archive (ustar, GNU or pax) as it arrives in chunks.
+    Only the entry being received is buffered, and entries that aren't selected are skipped without being
+    buffered at all.
+    """
+
+    def __init__(self, max_entry_bytes: int, select: Callable[[str], bool]) -> None:
+        super().__init__(max_entry_bytes, select)
+        # The kind, path and size of the entry whose data comes next
+        self._member: Optional[Tuple[str, str, int]] = None
+        self._skip = 0
+        self._long_name: Optional[str] = None
+        self._pax: Dict[str, str] = {}
+
+    def close(self) -> None:
+        """
+        Raises:
+            ArchiveStreamError: If the archive ends within an entry.
+        """
+        if not self._done and (self._member or self._skip or self._available()):
+            raise ArchiveStreamError("Unexpected end of tar archive")
+
+    def _scan(self) -> Iterator[ArchiveEntry]:
+        while not self._done:
+            if self._skip:
+                skipped = min(self._skip, self._available())
+                self._pos += skipped
+                self._skip -= skipped
+                if self._skip:
+                    return
+            elif self._member is None:
+                if self._available() < _TAR_BLOCK:
+                    return
+                self._read_header(self._take(_TAR_BLOCK))
+            else:
+                kind, path, size = self._member
+                padding = -size % _TAR_BLOCK
+                if self._available() < size + padding:
+                    return
+                data = self._take(size)
+                self._pos += padding
+                self._member = None
+                if kind == "L":
+                    self._long_name = _tar_string(data)
+                elif kind == "x":
+                    self._pax = _pax_records(data)
+                else:
+                    yield ArchiveEntry(path, data)
+
+    def _read_header(self, header: bytes) -> None:
+        if not any(header):
+            # The first of the zero blocks ending the archive
+            self._done = True
+            return
+        checksum = sum(header[:148]) + 8 * ord(" ") + sum(header[156:])
+        if _tar_number(header[148:156]) != checksum:
+            raise ArchiveStreamError("Invalid tar header checksum")
+
+        kind = header[156:157]
+        size = _tar_number(header[124:136])
+        if kind in (b"L", b"x"):
+            if size > _TAR_MAX_HEADER_DATA_BYTES:
+                raise ArchiveStreamError("Tar extended header is too large")
+            self._member = (kind.decode(), "", size)
+            return
+
+        path = _tar_string(header[:100])
+        if header[257:262] == b"ustar" and header[345]:
+            path = f"{_tar_string(header[345:500])}/{path}"
+        path = self._pax.get("path") or self._long_name or path
+        if "size" in self._pax:
+            if not self._pax["size"].isdigit():
+                raise ArchiveStreamError("Invalid pax header")
+            size = int(self._pax["size"])
+        self._long_name = None
+        self._pax = {}
+
+        if kind in _TAR_FILE_TYPES and self._select(path):
+            self._check_size(path, size)
+            self._member = ("file", path, size)
+        else:
+            self._skip = size + -size % _TAR_BLOCK
+
+
+@dataclass
+class _ZipMember:
+    path: str
+    keep: bool
+    crc: int
+    # Compressed bytes left to read, or None until the deflate stream ends
+    remaining: Optional[int]
+    size: Optional[int]
+    inflater: Optional["zlib._Decompress"]
+    descriptor: bool
+    zip64: bool
+    data: bytearray
+    received: int = 0
+    crc_received: int = 0
+
+
+class ZipStream(_Stream):
+    """
+    Incrementally extracts the files of a zip archive (stored or deflated, including zip64) as it arrives
+    in chunks, from their local headers: the central directory at the end of the archive is not needed.
+    Only the entry being received is buffered, and entries that aren't selected are skipped without being
+    buffered at all.
+
+    Stored entries must declare their size in their local header, as nothing else tells where they end.
+    """
+
+    def __init__(
+        self,
+        max_entry_bytes: int,
+        select: Callable[[str], bool],
+        inflated: Optional[_Inflated] = None,
+    ) -> None:
+        super().__init__(max_entry_bytes, select)
+        self._inflated = inflated or _Inflated(None)
+        self._member: Optional[_ZipMember] = None
+        self._data_read = False
+
+    def close(self) -> None:
+        """
+        Raises:
+            ArchiveStreamError: If the archive ends within an entry.
+        """
+        if not self._done and (self._member or self._available()):
+            raise ArchiveStreamError("Unexpected end of zip archive")
+
+    def _scan(self) -> Iterator[ArchiveEntry]:
+        while not self._done:
+            member = self._member
+            if member is None:
+                if not self._read_header():
+                    return
+            elif not self._data_read:
+                if not self._read_data(member):
+                    return
+                self._data_read = True
+            else:
+                if member.descriptor and not self._read_descriptor(member):
+                    return
+                self._member = None
+                entry = self._finish(member)
+                if entry is not None:
+                    yield entry
+
+    def _read_header(self) -> bool:
+        if self._available() < 4:
+            return False
+        signature = bytes(self._buf[self._pos : self._pos + 4])
+        if signature in _ZIP_ENDS:
+            self._done = True
+            return False
+        if signature != _ZIP_LOCAL_HEADER:
+            raise ArchiveStreamError("Invalid zip entry header")
+        if self._available() < _ZIP_LOCAL_FORMAT.size:
+            return False
+        (
+            _,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compressed,
+            size,
+            name_length,
+            extra_length,
+        ) = _ZIP_LOCAL_FORMAT.unpack_from(self._buf, self._pos)
+        if self._available() < _ZIP_LOCAL_FORMAT.size + name_length + extra_length:
+            return False
+        self._pos += _ZIP_LOCAL_FORMAT.size
+        name = self._take(name_length)
+        extra = self._take(extra_length)
+
+        path = name.decode("utf-8" if flags & _ZIP_UTF8_FLAG else "cp437", "replace")
+        if flags & _ZIP_ENCRYPTED_FLAG:
+            raise ArchiveStreamError(f"Zip entry '{path}' is encrypted")
+        if method not in (_ZIP_STORED, _ZIP_DEFLATED):
+            raise ArchiveStreamError(
+                f"Zip entry '{path}' uses unsupported compression method {method}"
+            )
+        zip64 = False
+        for field_id, data in _zip_extra_fields(extra):
+            if field_id == _ZIP64_EXTRA:
+                zip64 = True
+                # The 64-bit sizes of the fields that didn't fit, in this order
+                if size == _ZIP64_UNKNOWN:
+                    (size,), data = struct.unpack_from("<Q", data), data[8:]
+                if compressed == _ZIP64_UNKNOWN:
+                    (compressed,) = struct.unpack_from("<Q", data)
+        descriptor = bool(flags & _ZIP_DESCRIPTOR_FLAG)
+        if descriptor and not compressed:
+            if method == _ZIP_STORED:
+                raise ArchiveStreamError(
+                    f"Zip entry '{path}' is stored without its size, so it can't be streamed"
+                )
+            # Sizes follow the data, whose end is told by the deflate stream itself
+            compressed = size = None
+
+        keep = not path.endswith("/") and self._select(path)
+        if keep and size is not None:
+            self._check_size(path, size)
+        self._member = _ZipMember(
+            path=path,
+            keep=keep,
+            crc=crc,
+            remaining=compressed,
+            size=size,
+            inflater=zlib.decompressobj(-15) if method == _ZIP_DEFLATED else None,
+            descriptor=descriptor,
+            zip64=zip64,
+            data=bytearray(),
+        )
+        self._data_read = False
+        return True
+
+    def _read_data(self, member: _ZipMember) -> bool:
+        if member.remaining is None:
+            chunk = self._take(self._available())
+            self._inflate(member, chunk)
+            if not member.inflater.eof:
+                return False
+            # Give back what follows the deflate stream
+            self._pos -= len(member.inflater.unused_data)
+            return True
+        chunk = self._take(min(member.remaining, self._available()))
+        member.remaining -= len(chunk)
+        if member.inflater is None:
+            self._received(member, chunk)
+        else:
+            self._inflate(member, chunk)
+        if member.remaining:
+            return False
+        if member.inflater is not None and not member.inflater.eof:
+            raise ArchiveStreamError(f"Zip entry '{member.path}' is truncated")
+        return True
+
+    def _inflate(self, member: _ZipMember, chunk: bytes) -> None:
+        inflater = member.inflater
+        try:
+            while True:
+                out = inflater.decompress(chunk, _INFLATE_BYTES)
+                self._inflated.add(len(out))
+                self._received(member, out)
+                chunk = inflater.unconsumed_tail
+                if inflater.eof or (not chunk and len(out) < _INFLATE_BYTES):
+                    return
+        except zlib.error as e:
+            raise ArchiveStreamError(f"Zip entry '{member.path}' is corrupt: {e}")
+
+    def _received(self, member: _ZipMember, data: bytes) -> None:
+        member.received += len(data)
+        if not member.keep:
+            return
+        self._check_size(member.path, member.received)
+        member.crc_received = zlib.crc32(data, member.crc_received)
+        member.data += data
+
+    def _read_descriptor(self, member: _ZipMember) -> bool:
+        if self._available() < 4:
+            return False
+        signed = self._buf[self._pos : self._pos + 4] == _ZIP_DESCRIPTOR
+        size_format = "<QQ" if member.zip64 else "<II"
+        length = 4 * signed + 4 + struct.calcsize(size_format)
+        if self._available() < length:
+            return False
+        self._pos += 4 * signed
+        (member.crc,) = struct.unpack("<I", self._take(4))
+        _, member.size = struct.unpack(
+            size_format, self._take(struct.calcsize(size_format))
+        )
+        return True
+
+    def _finish(self, member: _ZipMember) -> Optional[ArchiveEntry]:
+        if not member.keep:
+            return None
+        if member.received != member.size or member.crc_received != member.crc:
+            raise ArchiveStreamError(f"Zip entry '{member.path}' is corrupt")
+        return ArchiveEntry(member.path, bytes(member.data))
+
+
+def _zip_extra_fields(extra: bytes) -> Iterator[Tuple[int, bytes]]:
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, length = struct.unpack_from("<HH", extra, pos)
+        yield field_id, extra[pos + 4 : pos + 4 + length]
+        pos += 4 + length
+
+
+class _GzipStream:
+    """Inflates a gzip stream (of one or more members) into another stream, a bounded piece at a time."""
+
+    def __init__(self, inner: "ArchiveStream", inflated: _Inflated) -> None:
+        self._inner = inner
+        self._inflated = inflated
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, data: bytes) -> Iterator[ArchiveEntry]:
+        try:
+            while True:
+                out = self._inflater.decompress(data, _INFLATE_BYTES)
+                self._inflated.add(len(out))
+                yield from self._inner.feed(out)
+                if self._inflater.eof:
+                    # Data after the end of a member starts the next one
+                    data = self._inflater.unused_data
+                    if not data:
+                        return
+                    self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                elif self._inflater.unconsumed_tail or len(out) == _INFLATE_BYTES:
+                    data = self._inflater.unconsumed_tail
+                else:
+                    return
+        except zlib.error as e:
+            raise ArchiveStreamError(f"Invalid gzip data: {e}")
+
+    def close(self) -> None:
+        if not self._inflater.eof:
+            raise ArchiveStreamError("Unexpected end of gzip data")
+        self._inner.close()
+
+
+class ArchiveStream:
+    """
+    Incrementally extracts the files of a tar or zip archive, optionally gzip-compressed, as it arrives in
+    chunks. The format is told from the archive's first bytes.
+
+    `feed` returns an iterator over the files completed by a chunk, which must be consumed before the next
+    chunk is fed. Files are extracted as the iterator is consumed, so the memory held is bounded by a single
+    file (of at most `max_entry_bytes`) however large the archive or its compression ratio. Only the files
+    whose path is accepted by `select` are extracted; the others are skipped. The bytes inflated in all,
+    whether of selected files or not, are bounded by `max_inflated_bytes` if it is given.
+    """
+
+    def __init__(
+        self,
+        max_entry_bytes: int,
+        select: Optional[Callable[[str], bool]] = None,
+        max_inflated_bytes: Optional[int] = None,
+    ) -> None:
+        self.max_entry_bytes = max_entry_bytes
+        self._select = select or (lambda path: True)
+        self._inflated = _Inflated(max_inflated_bytes)
+        self._head = b""
+        self._stream = None
+
+    def feed(self, data: bytes) -> Iterator[ArchiveEntry]:
+        """
+        Raises:
+            ArchiveStreamError: If the archive is malformed, or uses an unsupported feature.
+            EntryTooLargeError: If a selected file is larger than `max_entry_bytes`.
+            InflatedTooLargeError: If the archive inflates to more than `max_inflated_bytes`.
+        """
+        if self._stream is None:
+            self._head += data
+            if len(self._head) < 4:
+                return iter(())
+            self._stream = self._detect(self._head)
+            data, self._head = self._head, b""
+        return self._stream.feed(data)
+
+    def close(self) -> None:
+        """
+        Raises:
+            ArchiveStreamError: If the archive is incomplete.
+        """
+        if self._stream is None:
+            if self._head:
+                raise ArchiveStreamError("Unrecognized archive format")
+            return
+        self._stream.close()
+
+    def _detect(self, head: bytes):
+        if head.startswith(_GZIP_MAGIC):
+            inner = ArchiveStream(self.max_entry_bytes, self._select)
+            # Both layers count against the same total
+            inner._inflated = self._inflated
+            return _GzipStream(inner, self._inflated)
+        if head.startswith(_ZIP_LOCAL_HEADER) or head[:4] in _ZIP_ENDS:
+            return ZipStream(self.max_entry_bytes, self._select, self._inflated)
+        # Anything else that is not a tar archive fails its first header's checksum
+        return TarStream(self.max_entry_bytes, self._select)
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and `allow_request` rejects calls
+    until `reset_timeout` seconds have passed. The circuit then goes half-open and lets a single probe
+    through: a success closes the circuit, a failure opens it again for another `reset_timeout`. A probe
+    that ends with neither, for instance because it was cancelled, must be released for another to go.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.reset_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return True
+            if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                _LOGGER.info("Circuit '%s' closed", self.name)
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == CircuitState.HALF_OPEN or (
+                state == CircuitState.CLOSED
+                and self._failures >= self.failure_threshold
+            ):
+                _LOGGER.warning(
+                    "Circuit '%s' opened after %d failure(s), failing fast for %.1fs",
+                    self.name,
+                    self._failures,
+                    self.reset_timeout,
+                )
+                self._state = CircuitState.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Let another probe through, the one in flight having ended without a success or failure."""
+        with self._lock:
+            self._probe_in_flight = False
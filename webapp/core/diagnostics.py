@@ -0,0 +1,130 @@
+import gc
+import os
+import resource
+import threading
+import tracemalloc
+from typing import Callable, Dict, List, Mapping, Optional
+
+_cache_sizers: Dict[str, Callable[[], int]] = {}
+
+
+def register_cache(name: str, sizer: Callable[[], int]) -> None:
+    """Register an in-process cache so its size is included in memory reports."""
+    _cache_sizers[name] = sizer
+
+
+def cache_sizes() -> Mapping[str, int]:
+    return {name: sizer() for name, sizer in sorted(_cache_sizers.items())}
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process, falling back to the peak RSS off Linux."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is reported in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def gc_report() -> Mapping:
+    return {
+        "counts": list(gc.get_count()),
+        "thresholds": list(gc.get_threshold()),
+        "generations": gc.get_stats(),
+    }
+
+
+def _format_stat(stat) -> Mapping:
+    frame = stat.traceback[0]
+    return {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size": stat.size,
+        "count": stat.count,
+        "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+    }
+
+
+def _format_diff(stat) -> Mapping:
+    return {
+        **_format_stat(stat),
+        "size_diff": stat.size_diff,
+        "count_diff": stat.count_diff,
+    }
+
+
+class MemoryProfiler:
+    """
+    Wraps tracemalloc so allocation tracing can be switched on and off at runtime.
+
+    Each snapshot is compared against the previous one, so two consecutive snapshot calls bracket the
+    allocations made in between (e.g. during a resync storm).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def status(self) -> Mapping:
+        tracing = tracemalloc.is_tracing()
+        status = {"tracing": tracing}
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            status |= {
+                "traced_bytes": current,
+                "peak_traced_bytes": peak,
+                "frames": tracemalloc.get_traceback_limit(),
+                "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            }
+        return status
+
+    def start(self, frames: int = 1) -> Mapping:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._previous = None
+        return self.status()
+
+    def stop(self) -> Mapping:
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+        return self.status()
+
+    def snapshot(self, limit: int = 20, group_by: str = "lineno") -> Mapping:
+        """
+        Return the top allocation sites and, if a previous snapshot exists, the top changes since then.
+
+        Raises:
+            RuntimeError: If tracemalloc is not tracing.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not tracing")
+
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                ]
+            )
+            top: List[Mapping] = [
+                _format_stat(s) for s in snapshot.statistics(group_by)[:limit]
+            ]
+            diff = None
+            if self._previous is not None:
+                diff = [
+                    _format_diff(s)
+                    for s in snapshot.compare_to(self._previous, group_by)[:limit]
+                ]
+            self._previous = snapshot
+
+        return {"top": top, "diff": diff}
+
+
+def memory_report() -> Mapping:
+    return {
+        "rss_bytes": rss_bytes(),
+        "gc": gc_report(),
+        "caches": cache_sizes(),
+    }
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Tuple,
+    TypeVar,
+)
+
+from core import metrics
+from core.diagnostics import register_cache
+
+T = TypeVar("T")
+
+_HITS = metrics.counter(
+    "keip_idempotency_hits_total",
+    "Executions answered by a result cache instead of running again, by cache and whether the result was "
+    "cached or in flight",
+    ("cache", "source"),
+)
+
+
+class ResultCache(Generic[T]):
+    """
+    Results of completed executions by key, kept for `ttl` seconds (dropping the oldest beyond
+    `max_entries`), along with the executions in flight so that concurrent duplicates wait for the same
+    execution instead of repeating it.
+
+    Each execution carries a `tag` (e.g. a digest of its input), so that a key can only be answered by an
+    execution doing the same work. An execution with another tag waits for the one in flight to finish and
+    then replaces it, so executions for a key are applied in the order they started. Failed executions,
+    and results rejected by `cacheable`, are not cached. Results are cached as `cached_as` turns them, e.g.
+    to tell later callers that the work was already done. A `ttl` of 0 only shares executions in flight.
+
+    Not thread-safe: it is meant to be used from the event loop.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, T]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Tuple[Any, asyncio.Future]] = {}
+        register_cache(f"results_{name}", lambda: len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_run(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[T]],
+        tag: Any = None,
+        cacheable: Callable[[T], bool] = lambda _: True,
+        cached_as: Callable[[T], T] = lambda result: result,
+    ) -> Tuple[T, bool]:
+        """
+        Returns:
+            Tuple[T, bool]: The result, and whether it was shared from a cached or in-flight execution
+                rather than produced by running `func`.
+
+        Raises:
+            Exception: The error `func` raised, in every caller sharing its execution.
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_tag, result = entry
+                if time.monotonic() >= expires_at:
+                    del self._entries[key]
+                elif entry_tag == tag:
+                    _HITS.inc(cache=self.name, source="cached")
+                    return result, True
+
+            flight = self._in_flight.get(key)
+            if flight is None:
+                return await self._run(key, func, tag, cacheable, cached_as), False
+            flight_tag, future = flight
+            # Unlike awaiting it, waiting doesn't cancel the shared execution if this caller is cancelled
+            await asyncio.wait((future,))
+            if flight_tag == tag and not future.cancelled():
+                _HITS.inc(cache=self.name, source="in_flight")
+                return future.result(), True
+
+    async def _run(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[T]],
+        tag: Any,
+        cacheable: Callable[[T], bool],
+        cached_as: Callable[[T], T],
+    ) -> T:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (tag, future)
+        # The result cached for other work no longer holds, whether or not this execution succeeds
+        self._entries.pop(key, None)
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Callers waiting for it run it themselves instead
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it, so an error nobody waited for is not reported as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if self.ttl > 0 and cacheable(result):
+                self._entries.pop(key, None)
+                self._entries[key] = (
+                    time.monotonic() + self.ttl,
+                    tag,
+                    cached_as(result),
+                )
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return result
+        finally:
+            del self._in_flight[key]
@@ -0,0 +1,339 @@
+import json
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from kubernetes.watch.watch import iter_resp_lines
+
+from core import metrics
+from core.diagnostics import register_cache
+
+_LOGGER = logging.getLogger(__name__)
+
+_OBJECTS = metrics.gauge(
+    "keip_informer_objects", "Objects held in an informer's store", ("informer",)
+)
+_SYNCED = metrics.gauge(
+    "keip_informer_synced",
+    "Whether an informer's store reflects the API server (1) or is being resynced (0)",
+    ("informer",),
+)
+_EVENTS = metrics.counter(
+    "keip_informer_events_total",
+    "Watch events received by an informer, by type",
+    ("informer", "type"),
+)
+_RELISTS = metrics.counter(
+    "keip_informer_relists_total",
+    "Full lists made by an informer, including the initial one",
+    ("informer",),
+)
+
+Transform = Callable[[dict], dict]
+Listener = Callable[[str, dict], None]
+
+
+class _Expired(Exception):
+    """The watch's resourceVersion is too old to resume from (HTTP 410), so a relist is needed."""
+
+
+def strip_managed_fields(obj: dict) -> dict:
+    obj.get("metadata", {}).pop("managedFields", None)
+    return obj
+
+
+LabelMatcher = Callable[[Mapping[str, str]], bool]
+
+_SET_REQUIREMENT = re.compile(r"^([^\s!=(),]+)\s+(in|notin)\s+\(([^()]*)\)$")
+_EQUALITY_REQUIREMENT = re.compile(r"^([^\s!=(),]+)\s*(==|=|!=)\s*([^\s!=(),]*)$")
+_EXISTS_REQUIREMENT = re.compile(r"^(!?)\s*([^\s!=(),]+)$")
+_REQUIREMENT_SEPARATOR = re.compile(r",(?![^()]*\))")
+
+
+def _requirement(requirement: str) -> LabelMatcher:
+    if m := _SET_REQUIREMENT.match(requirement):
+        key, op = m.group(1), m.group(2)
+        values = {v.strip() for v in m.group(3).split(",")}
+        return lambda labels: (labels.get(key) in values) == (op == "in")
+    if m := _EQUALITY_REQUIREMENT.match(requirement):
+        key, op, value = m.groups()
+        return lambda labels: (labels.get(key) == value) == (op != "!=")
+    if m := _EXISTS_REQUIREMENT.match(requirement):
+        negated, key = m.groups()
+        return lambda labels: (key in labels) != bool(negated)
+    raise ValueError(f"Invalid label selector requirement '{requirement}'")
+
+
+def parse_label_selector(selector: str) -> LabelMatcher:
+    """
+    Parse a Kubernetes label selector ('a=b,c!=d,e in (f,g),!h') into a function matching a set of labels.
+
+    Raises:
+        ValueError: If the selector is malformed.
+    """
+    requirements = [
+        _requirement(part.strip())
+        for part in _REQUIREMENT_SEPARATOR.split(selector)
+        if part.strip()
+    ]
+    return lambda labels: all(requirement(labels) for requirement in requirements)
+
+
+class Store:
+    """A thread-safe store of objects indexed by namespace and name."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Dict[str, dict]] = {}
+
+    @staticmethod
+    def _key(obj: Mapping) -> Tuple[str, str]:
+        metadata = obj["metadata"]
+        return metadata.get("namespace", ""), metadata["name"]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(objects) for objects in self._objects.values())
+
+    def get(self, namespace: str, name: str) -> Optional[dict]:
+        with self._lock:
+            return self._objects.get(namespace, {}).get(name)
+
+    def list(self, namespace: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            if namespace is not None:
+                return list(self._objects.get(namespace, {}).values())
+            return [o for objects in self._objects.values() for o in objects.values()]
+
+    def replace(self, objects: List[dict]) -> None:
+        index: Dict[str, Dict[str, dict]] = {}
+        for obj in objects:
+            namespace, name = self._key(obj)
+            index.setdefault(namespace, {})[name] = obj
+        with self._lock:
+            self._objects = index
+
+    def upsert(self, obj: dict) -> None:
+        namespace, name = self._key(obj)
+        with self._lock:
+            self._objects.setdefault(namespace, {})[name] = obj
+
+    def delete(self, obj: Mapping) -> None:
+        namespace, name = self._key(obj)
+        with self._lock:
+            objects = self._objects.get(namespace, {})
+            objects.pop(name, None)
+            if not objects:
+                self._objects.pop(namespace, None)
+
+
+class Informer:
+    """
+    Mirrors the objects at a cluster-wide list path into a local `Store` with list+watch.
+
+    The informer lists every matching object (in pages), then watches from the list's resourceVersion with
+    bookmarks enabled, so a reconnecting watch resumes from the last bookmark instead of relisting. When the
+    resourceVersion has expired (410 Gone) it relists; on other errors it backs off exponentially and
+    relists. `synced` is only set while the store is known to be complete, so callers can fall back to
+    live reads otherwise.
+
+    Objects are passed through `transform` before being stored, e.g. to drop large fields that are not
+    needed from the cache. Listeners added with `add_listener` are told of every change to the store.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        api_client: client.ApiClient,
+        path: str,
+        label_selector: str = "",
+        transform: Transform = strip_managed_fields,
+        page_size: int = 500,
+        watch_timeout: int = 300,
+        request_timeout: Tuple[float, float] = (5.0, 30.0),
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.path = path
+        self.label_selector = label_selector
+        self.store = Store()
+        self._api_client = api_client
+        self._transform = transform
+        self._page_size = page_size
+        self._watch_timeout = watch_timeout
+        self._request_timeout = request_timeout
+        self._max_backoff = max_backoff
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._response = None
+        # Replaced rather than mutated, so that the informer thread can iterate it without the lock
+        self._listeners: Tuple[Listener, ...] = ()
+        self._listeners_lock = threading.Lock()
+        self.resource_version = ""
+        self.last_event_at = 0.0
+        register_cache(f"informer_{name}", lambda: len(self.store))
+        _SYNCED.set(0, informer=name)
+
+    @property
+    def synced(self) -> bool:
+        return self._synced.is_set()
+
+    def wait_for_sync(self, timeout: Optional[float] = None) -> bool:
+        return self._synced.wait(timeout)
+
+    def add_listener(self, listener: Listener) -> None:
+        """
+        Call `listener` with the type and (transformed) object of each change to the store, on the
+        informer's thread, after the store was updated. A relist reports every listed object as "ADDED".
+        """
+        with self._listeners_lock:
+            self._listeners += (listener,)
+
+    def remove_listener(self, listener: Listener) -> None:
+        with self._listeners_lock:
+            self._listeners = tuple(
+                other for other in self._listeners if other is not listener
+            )
+
+    def _notify(self, event_type: str, obj: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event_type, obj)
+            except Exception as e:
+                _LOGGER.warning(
+                    "Informer '%s' listener failed: %s", self.name, e, exc_info=True
+                )
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name=f"informer-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._set_synced(False)
+        response = self._response
+        if response is not None:
+            # Unblocks the watch thread's read
+            response.shutdown()
+
+    def _set_synced(self, synced: bool) -> None:
+        if synced:
+            self._synced.set()
+        else:
+            self._synced.clear()
+        _SYNCED.set(int(synced), informer=self.name)
+
+    def _request(self, query: List[Tuple[str, str]], timeout: Tuple[float, float]):
+        return self._api_client.call_api(
+            self.path,
+            "GET",
+            query_params=query,
+            header_params={"Accept": "application/json"},
+            auth_settings=["BearerToken"],
+            _preload_content=False,
+            _return_http_data_only=True,
+            _request_timeout=timeout,
+        )
+
+    def _list(self) -> str:
+        _RELISTS.inc(informer=self.name)
+        objects = []
+        token = ""
+        while True:
+            query = [("limit", str(self._page_size))]
+            if self.label_selector:
+                query.append(("labelSelector", self.label_selector))
+            if token:
+                query.append(("continue", token))
+            response = self._request(query, self._request_timeout)
+            page = json.loads(response.data)
+            objects += [self._transform(o) for o in page.get("items") or []]
+            token = page["metadata"].get("continue", "")
+            if not token:
+                break
+        self.store.replace(objects)
+        _OBJECTS.set(len(objects), informer=self.name)
+        self.last_event_at = time.monotonic()
+        for obj in objects:
+            self._notify("ADDED", obj)
+        return page["metadata"]["resourceVersion"]
+
+    def _watch(self, resource_version: str) -> str:
+        """Watch from `resource_version` until the server ends the watch, returning the last version seen."""
+        query = [
+            ("watch", "true"),
+            ("allowWatchBookmarks", "true"),
+            ("resourceVersion", resource_version),
+            ("timeoutSeconds", str(self._watch_timeout)),
+        ]
+        if self.label_selector:
+            query.append(("labelSelector", self.label_selector))
+        connect_timeout, read_timeout = self._request_timeout
+        self._response = self._request(
+            query, (connect_timeout, self._watch_timeout + read_timeout)
+        )
+        try:
+            for line in iter_resp_lines(self._response):
+                if self._stopped.is_set():
+                    break
+                resource_version = self._handle_event(json.loads(line))
+        finally:
+            self._response.release_conn()
+            self._response = None
+        return resource_version
+
+    def _handle_event(self, event: Mapping) -> str:
+        event_type = event["type"]
+        obj = event["object"]
+        _EVENTS.inc(informer=self.name, type=event_type)
+        self.last_event_at = time.monotonic()
+        if event_type == "ERROR":
+            if obj.get("code") == 410:
+                raise _Expired(obj.get("message", ""))
+            raise ApiException(status=obj.get("code", 500), reason=obj.get("message"))
+        if event_type in ("ADDED", "MODIFIED"):
+            obj = self._transform(obj)
+            self.store.upsert(obj)
+        elif event_type == "DELETED":
+            self.store.delete(obj)
+        _OBJECTS.set(len(self.store), informer=self.name)
+        self.resource_version = obj["metadata"]["resourceVersion"]
+        if event_type != "BOOKMARK":
+            self._notify(event_type, obj)
+        return self.resource_version
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stopped.is_set():
+            try:
+                self.resource_version = self._list()
+                self._set_synced(True)
+                failures = 0
+                while not self._stopped.is_set():
+                    self.resource_version = self._watch(self.resource_version)
+            except _Expired as e:
+                _LOGGER.info("Informer '%s' watch expired, relisting: %s", self.name, e)
+                self._set_synced(False)
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                self._set_synced(False)
+                backoff = min(2**failures, self._max_backoff)
+                failures += 1
+                _LOGGER.warning(
+                    "Informer '%s' failed, relisting in %.1fs: %s",
+                    self.name,
+                    backoff,
+                    e,
+                )
+                self._stopped.wait(backoff)
+        self._set_synced(False)
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from core import metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+_QUEUE_DEPTH = metrics.gauge("keip_jobs_queued", "Jobs waiting for a worker")
+_RUNNING = metrics.gauge("keip_jobs_running", "Jobs being run by a worker")
+_FINISHED = metrics.counter(
+    "keip_jobs_finished_total", "Jobs that finished, by final status", ("status",)
+)
+_DURATION = metrics.histogram(
+    "keip_job_duration_seconds",
+    "Time from a job starting to finishing, by final status",
+    ("status",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+_QUEUE_WAIT = metrics.histogram(
+    "keip_job_queue_wait_seconds",
+    "Time jobs spent queued before a worker picked them up",
+)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+_FINAL = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    """
+    A unit of background work and its progress. `results` holds one entry per completed item, and the
+    job fails if any of them reports an error. The items that failed are kept in `failed_items`, so that
+    they can be retried without the rest, but are not reported.
+    """
+
+    id: str
+    total: int
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    completed: int = 0
+    failed: int = 0
+    results: List[Any] = field(default_factory=list)
+    error: Optional[str] = None
+    failed_items: List[Any] = field(default_factory=list, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in _FINAL
+
+    def record(self, result: Any, failed: bool = False, item: Any = None) -> None:
+        self.results.append(result)
+        self.completed += 1
+        self.failed += failed
+        if failed and item is not None:
+            self.failed_items.append(item)
+
+    def to_dict(self) -> Mapping:
+        job = asdict(replace(self, failed_items=[]))
+        del job["failed_items"]
+        job["status"] = self.status.value
+        return job
+
+
+JobFunc = Callable[[Job], Awaitable[None]]
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded queue drained by a fixed number of asyncio worker tasks.
+
+    Jobs run independently of the request that submitted them, so they survive client disconnects.
+    Finished jobs are kept for polling until there are more than `retention_count` of them or they are
+    older than `retention_seconds`. The queue and workers are bound to the event loop of the first
+    submission and recreated if a different loop is used (e.g. in tests).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        retention_count: int,
+        retention_seconds: float,
+    ) -> None:
+        self.workers = max(workers, 1)
+        self.max_queued = max(max_queued, 1)
+        self.retention_count = retention_count
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._funcs: Dict[str, JobFunc] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_queued)
+            self._worker_tasks = [
+                loop.create_task(self._work(), name=f"job-worker-{i}")
+                for i in range(self.workers)
+            ]
+        return self._queue
+
+    def submit(self, total: int, func: JobFunc) -> Job:
+        """
+        Queue `func` to run as a new job.
+
+        Raises:
+            QueueFullError: If 'max_queued' jobs are already waiting.
+        """
+        queue = self._ensure_workers()
+        job = Job(id=uuid.uuid4().hex, total=total)
+        try:
+            queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.max_queued} jobs are already queued")
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._funcs[job.id] = func
+        _QUEUE_DEPTH.set(queue.qsize())
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job. Finished jobs are returned unchanged."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return job
+            task = self._running.get(job_id)
+            if task is None:
+                # Still queued: the worker skips it when it is dequeued
+                self._finish(job, JobStatus.CANCELLED)
+                return job
+        task.cancel()
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel the workers and any running jobs."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._loop = None
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            _QUEUE_DEPTH.set(self._queue.qsize())
+            with self._lock:
+                job = self._jobs.get(job_id)
+                func = self._funcs.pop(job_id, None)
+                if job is None or job.done:
+                    continue
+                job.status = JobStatus.RUNNING
+                job.started_at = time.time()
+                task = asyncio.create_task(func(job))
+                self._running[job_id] = task
+            _QUEUE_WAIT.observe(job.started_at - job.created_at)
+            _RUNNING.inc()
+
+            status = JobStatus.CANCELLED
+            try:
+                await task
+                status = JobStatus.FAILED if job.failed else JobStatus.SUCCEEDED
+            except asyncio.CancelledError:
+                # Only swallow the cancellation of the job, not of the worker itself
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                _LOGGER.error("Job '%s' failed: %s", job_id, e, exc_info=True)
+                job.error = "Internal server error"
+                status = JobStatus.FAILED
+            finally:
+                _RUNNING.dec()
+                with self._lock:
+                    self._running.pop(job_id, None)
+                    if not job.done:
+                        self._finish(job, status)
+
+            _LOGGER.info(
+                "Job '%s' %s: %d/%d items completed, %d failed",
+                job_id,
+                job.status.value,
+                job.completed,
+                job.total,
+                job.failed,
+            )
+
+    def _finish(self, job: Job, status: JobStatus) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        self._funcs.pop(job.id, None)
+        self._finished[job.id] = job.finished_at
+        _FINISHED.inc(status=status.value)
+        if job.started_at is not None:
+            _DURATION.observe(job.finished_at - job.started_at, status=status.value)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.retention_count and finished_at >= cutoff:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
@@ -0,0 +1,196 @@
+import json
+import re
+from typing import List, Optional
+
+# Characters that change the parser's state outside of strings
+_STRUCTURAL = re.compile(rb'[{}\[\]",:]')
+_WHITESPACE = b" \t\n\r"
+
+# Only strings this short are kept around as candidate keys
+_MAX_KEY_BYTES = 256
+
+
+class JsonStreamError(ValueError):
+    pass
+
+
+class ItemTooLargeError(JsonStreamError):
+    pass
+
+
+class JsonArrayStream:
+    """
+    Incrementally extracts the elements of the array under `key` in a top-level JSON object, e.g. the routes
+    of `{"routes": [{...}, {...}]}`, as the document arrives in chunks.
+
+    `feed` returns the raw bytes of every element completed by a chunk, to be decoded by the caller, and only
+    the element currently being received is buffered. The document's structure is checked loosely: other
+    keys are skipped without being decoded.
+    """
+
+    def __init__(self, key: str, max_item_bytes: int) -> None:
+        self.max_item_bytes = max_item_bytes
+        self.key_seen = False
+        self.found = False
+        self._key = json.dumps(key).encode()
+        self._buf = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start: Optional[int] = None
+        self._last_string = b""
+        self._last_structural = b""
+        # Depth of the target array's elements, and where the current element starts
+        self._array_depth: Optional[int] = None
+        self._item_start = 0
+        self._done = False
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Raises:
+            JsonStreamError: If the document is malformed.
+            ItemTooLargeError: If an element is larger than `max_item_bytes`.
+        """
+        self._buf += data
+        items = self._scan()
+        if self._array_depth is not None:
+            if len(self._buf) - self._item_start > self.max_item_bytes:
+                raise ItemTooLargeError(
+                    f"Array element exceeds {self.max_item_bytes} bytes"
+                )
+            keep = self._item_start
+        elif self._string_start is not None:
+            keep = self._string_start
+        else:
+            keep = self._pos
+        self._discard(min(keep, self._pos))
+        return items
+
+    def close(self) -> None:
+        """
+        Raises:
+            JsonStreamError: If the document is incomplete.
+        """
+        if not self._done:
+            raise JsonStreamError("Unexpected end of JSON document")
+
+    def _discard(self, count: int) -> None:
+        if count <= 0:
+            return
+        del self._buf[:count]
+        self._pos -= count
+        self._item_start -= count
+        if self._string_start is not None:
+            self._string_start -= count
+
+    def _end_item(self, end: int, items: List[bytes]) -> None:
+        buf = self._buf
+        start = self._item_start
+        while start < end and buf[start] in _WHITESPACE:
+            start += 1
+        while end > start and buf[end - 1] in _WHITESPACE:
+            end -= 1
+        if end - start > self.max_item_bytes:
+            raise ItemTooLargeError(
+                f"Array element exceeds {self.max_item_bytes} bytes"
+            )
+        if start == end:
+            raise JsonStreamError("Empty array element")
+        # Copied out of the buffer once, rather than sliced and then copied again
+        with memoryview(buf) as view:
+            items.append(bytes(view[start:end]))
+
+    def _string_end(self) -> int:
+        """
+        The position of the closing quote of the string being scanned, or -1 if it is not in the buffer yet,
+        in which case `_pos` is moved up to the escape sequence, if any, that the buffer ends in.
+        """
+        buf = self._buf
+        pos = self._pos
+        while True:
+            quote = buf.find(b'"', pos)
+            if quote < 0:
+                end = len(buf)
+                while end > pos and buf[end - 1] == 0x5C:
+                    end -= 1
+                self._pos = end
+                return -1
+            # A quote after an odd number of backslashes is escaped
+            backslash = quote
+            while backslash > 0 and buf[backslash - 1] == 0x5C:
+                backslash -= 1
+            if (quote - backslash) % 2 == 0:
+                return quote
+            pos = quote + 1
+
+    def _scan(self) -> List[bytes]:
+        items: List[bytes] = []
+        buf = self._buf
+        while self._pos < len(buf):
+            if self._in_string:
+                # Strings, such as route XML, make up most of the document, so they are skipped with a
+                # search for their closing quote rather than scanned character by character
+                end = self._string_end()
+                if end < 0:
+                    # The string continues in the next chunk
+                    break
+                self._pos = end + 1
+                self._in_string = False
+                if self._string_start is not None:
+                    self._last_string = bytes(buf[self._string_start : self._pos])
+                    self._last_structural = b'"'
+                    self._string_start = None
+                continue
+
+            m = _STRUCTURAL.search(buf, self._pos)
+            if m is None:
+                self._pos = len(buf)
+                break
+            char = m.group()
+            self._pos = m.end()
+            if self._done:
+                raise JsonStreamError("Unexpected data after the JSON document")
+
+            if char == b'"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string_start = m.start()
+                    # Keys are short, so don't hold on to long values just in case
+                    if self._pos - self._string_start > _MAX_KEY_BYTES:
+                        self._string_start = None
+            elif char in (b"{", b"["):
+                if self._depth == 0 and char != b"{":
+                    raise JsonStreamError("Expected a JSON object")
+                if self._depth == 1 and char == b"[" and self._after_key():
+                    self.found = True
+                    self._array_depth = 2
+                    self._item_start = self._pos
+                self._depth += 1
+            elif char in (b"}", b"]"):
+                if self._array_depth is not None and self._depth == self._array_depth:
+                    if char != b"]":
+                        raise JsonStreamError("Mismatched brackets")
+                    if buf[self._item_start : m.start()].strip():
+                        self._end_item(m.start(), items)
+                    elif self._last_structural == b",":
+                        raise JsonStreamError("Empty array element")
+                    self._array_depth = None
+                self._depth -= 1
+                if self._depth < 0:
+                    raise JsonStreamError("Mismatched brackets")
+                if self._depth == 0:
+                    self._done = True
+            elif char == b",":
+                if self._array_depth is not None and self._depth == self._array_depth:
+                    self._end_item(m.start(), items)
+                    self._item_start = self._pos
+            elif char == b":" and self._depth == 1:
+                if self._last_structural == b'"' and self._last_string == self._key:
+                    self.key_seen = True
+
+            if self._depth <= 2:
+                self._last_structural = char if char != b'"' else self._last_structural
+        return items
+
+    def _after_key(self) -> bool:
+        return self._last_structural == b":" and self._last_string == self._key
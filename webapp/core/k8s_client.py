@@ -1,35 +1,138 @@
-from typing import Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from kubernetes import config, client
 from kubernetes.client.rest import ApiException
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import HTTPError
+import aiohttp
+import asyncio
+import contextlib
+import hashlib
+import json
 import logging
 import os
+import socket
+import ssl
 import threading
+import time
+import weakref
+from dataclasses import dataclass, field
 
+import config as cfg
+from core import metrics, retry
+from core.circuit_breaker import CircuitBreaker, CircuitState
+from core.informer import Informer, Store, strip_managed_fields
+from core.rate_limit import ConcurrencyLimiter, TokenBucket
+from core.route_payload import (
+    GZIP_ENCODING,
+    ROUTE_FILE,
+    compress_route,
+    decompress_route,
+)
+from core.tracing import span
 from models import RouteData, Resource, Status
 
 ROUTE_API_GROUP = "keip.codice.org"
 ROUTE_API_VERSION = "v1alpha2"
 ROUTE_PLURAL = "integrationroutes"
 WEBHOOK_CONTROLLER_PREFIX = "integrationroute-webhook"
+FIELD_MANAGER = "keip"
+APPLY_CONTENT_TYPE = "application/apply-patch+yaml"
+CONFIGMAP_PATH = "/api/v1/namespaces/{namespace}/configmaps/{name}"
+INTEGRATION_ROUTE_PATH = f"/apis/{ROUTE_API_GROUP}/{ROUTE_API_VERSION}/namespaces/{{namespace}}/{ROUTE_PLURAL}/{{name}}"
+NAMESPACE_PATH = "/api/v1/namespaces/{namespace}"
+CONFIGMAPS_PATH = "/api/v1/namespaces/{namespace}/configmaps"
+INTEGRATION_ROUTES_PATH = f"/apis/{ROUTE_API_GROUP}/{ROUTE_API_VERSION}/namespaces/{{namespace}}/{ROUTE_PLURAL}"
+CREATED_BY_SELECTOR = "app.kubernetes.io/created-by=keip"
+# Lists only need metadata (the digest annotation), so ask for it without the route XML where supported
+METADATA_LIST_ACCEPT = (
+    "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+)
+# Likewise for reading a single resource's digest, which would otherwise fetch up to 1 MiB of route XML
+METADATA_ACCEPT = (
+    "application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1,application/json"
+)
+DIGEST_ANNOTATION = f"{ROUTE_API_GROUP}/content-digest"
+# Statuses of requests worth retrying: throttled by the API server, or failing on its side
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Size of the reads that discard response bodies that aren't used
+_DISCARD_CHUNK_BYTES = 64 * 1024
 
 
 _LOGGER = logging.getLogger(__name__)
 
 _lock = threading.Lock()
 _configured = False
-_config_failed = False
+_config_attempts = 0
+_config_retry_at = 0.0
 v1 = None
 routeApi = None
 
+_breaker = CircuitBreaker(
+    "kubernetes-api",
+    failure_threshold=cfg.K8S_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=cfg.K8S_CIRCUIT_RESET_SECONDS,
+)
+_probe_lock = threading.Lock()
+_reachable_until = 0.0
+
+_throttle = TokenBucket(cfg.K8S_CLIENT_QPS, cfg.K8S_CLIENT_BURST)
+
+# Watch-backed caches of keip's route resources, by kind, when 'K8S_INFORMER_ENABLED' is set
+_informers: Dict[str, Informer] = {}
+# Otherwise, the IntegrationRoute informer started while callers are watching routes, and how many are
+_route_watch_lock = threading.Lock()
+_route_watch: Optional[Informer] = None
+_route_watchers = 0
+
+_THROTTLE_WAIT = metrics.histogram(
+    "keip_k8s_throttle_wait_seconds",
+    "Time API requests were delayed by client-side throttling",
+    ("client",),
+)
+_THROTTLED_REQUESTS = metrics.counter(
+    "keip_k8s_throttled_requests_total",
+    "API requests delayed by client-side throttling",
+    ("client",),
+)
+_POOL_CONNECTIONS = metrics.gauge(
+    "keip_k8s_pool_connections",
+    "Connections to the API server held by the blocking client's pool",
+    ("state",),
+)
+_POOL_MAX_CONNECTIONS = metrics.gauge(
+    "keip_k8s_pool_max_connections",
+    "Connections to the API server the blocking client keeps open",
+)
+_WRITES_SKIPPED = metrics.counter(
+    "keip_k8s_writes_skipped_total",
+    "Route resource writes skipped because their content digest was unchanged",
+    ("kind",),
+)
+
 
 def _ensure_configured():
-    global _configured, _config_failed, v1, routeApi
+    """
+    Load the client configuration, retrying with exponential backoff if it fails (e.g. the service
+    account token is not mounted yet) instead of giving up until the pod is restarted.
+    """
+    global _configured, _config_attempts, _config_retry_at, v1, routeApi
     if _configured:
         return
-    if _config_failed:
+    if time.monotonic() < _config_retry_at:
         return
     with _lock:
-        if _configured or _config_failed:
+        if _configured or time.monotonic() < _config_retry_at:
             return
         try:
             (
@@ -37,143 +140,810 @@ def _ensure_configured():
                 if os.getenv("KUBECONFIG")
                 else config.load_incluster_config()
             )
-        except config.ConfigException:
+        except config.ConfigException as e:
+            backoff = min(
+                cfg.K8S_CONFIG_RETRY_BASE_SECONDS * 2**_config_attempts,
+                cfg.K8S_CONFIG_RETRY_MAX_SECONDS,
+            )
+            _config_attempts += 1
+            _config_retry_at = time.monotonic() + backoff
             _LOGGER.error(
-                msg="Failed to configure the k8s_client. keip will be unable to deploy integration routes.",
+                "Failed to configure the k8s_client (attempt %d): %s. Retrying in %.1fs.",
+                _config_attempts,
+                e,
+                backoff,
             )
-            _config_failed = True
             return
-        v1 = client.CoreV1Api()
-        routeApi = client.CustomObjectsApi()
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = cfg.K8S_POOL_MAXSIZE
+        api_client = client.ApiClient(configuration)
+        if cfg.K8S_TCP_KEEPALIVE:
+            _enable_tcp_keepalive(api_client)
+        v1 = client.CoreV1Api(api_client)
+        routeApi = client.CustomObjectsApi(api_client)
         _configured = True
+        _config_attempts = 0
+        if cfg.K8S_INFORMER_ENABLED:
+            _start_informers(api_client)
+
+
+def _drop_configmap_data(obj: dict) -> dict:
+    """Only route ConfigMap metadata is read from the cache, so don't hold on to the route XML."""
+    obj.pop("data", None)
+    obj.pop("binaryData", None)
+    return strip_managed_fields(obj)
+
+
+def _informer_args() -> Dict[str, Any]:
+    return dict(
+        label_selector=CREATED_BY_SELECTOR,
+        page_size=cfg.K8S_INFORMER_PAGE_SIZE,
+        watch_timeout=cfg.K8S_WATCH_TIMEOUT_SECONDS,
+        request_timeout=_request_timeout(),
+    )
+
+
+def _route_informer(name: str, api_client: client.ApiClient) -> Informer:
+    return Informer(
+        name,
+        api_client,
+        f"/apis/{ROUTE_API_GROUP}/{ROUTE_API_VERSION}/{ROUTE_PLURAL}",
+        **_informer_args(),
+    )
+
+
+def _start_informers(api_client: client.ApiClient) -> None:
+    _informers["ConfigMap"] = Informer(
+        "configmaps",
+        api_client,
+        "/api/v1/configmaps",
+        transform=_drop_configmap_data,
+        **_informer_args(),
+    )
+    _informers["IntegrationRoute"] = _route_informer("integrationroutes", api_client)
+    for informer in _informers.values():
+        informer.start()
+
+
+@contextlib.contextmanager
+def watch_integration_routes() -> Iterator[Optional[Informer]]:
+    """
+    Watch keip's IntegrationRoutes (e.g. for their status) through an informer, so that all concurrent
+    watchers share a single watch on the API server. The informer started with 'K8S_INFORMER_ENABLED' is
+    used if there is one; otherwise one is started for the first watcher and stopped after the last. The
+    informer may not be synced yet.
+
+    Yields None if the client isn't configured.
+    """
+    global _route_watch, _route_watchers
+    _ensure_configured()
+    informer = _informers.get("IntegrationRoute")
+    if informer is not None or v1 is None:
+        yield informer
+        return
+    with _route_watch_lock:
+        if _route_watch is None:
+            _route_watch = _route_informer("integrationroutes-watch", v1.api_client)
+            _route_watch.start()
+        informer = _route_watch
+        _route_watchers += 1
+    try:
+        yield informer
+    finally:
+        with _route_watch_lock:
+            _route_watchers -= 1
+            if _route_watchers == 0:
+                _route_watch.stop()
+                _route_watch = None
+
+
+def stop_informers() -> None:
+    for informer in _informers.values():
+        informer.stop()
+    _informers.clear()
+
+
+def _informers_synced() -> bool:
+    return bool(_informers) and all(i.synced for i in _informers.values())
+
+
+def cached_object(kind: str, namespace: str, name: str) -> Tuple[bool, Optional[dict]]:
+    """
+    Look up a keip-created 'ConfigMap' or 'IntegrationRoute' in the informer cache.
+
+    Returns:
+        Tuple[bool, Optional[dict]]: Whether the cache could answer (its informer is running and synced), and
+            the cached object, or None if it does not exist. Callers must fall back to a live read if the
+            cache could not answer.
+    """
+    informer = _informers.get(kind)
+    if informer is None or not informer.synced:
+        return False, None
+    return True, informer.store.get(namespace, name)
+
+
+def route_caches() -> Optional[Tuple[Store, Store]]:
+    """
+    The informer stores of keip's IntegrationRoutes and ConfigMaps (without their data), or None unless
+    'K8S_INFORMER_ENABLED' is set and both are synced.
+    """
+    _ensure_configured()
+    if not _informers_synced():
+        return None
+    return _informers["IntegrationRoute"].store, _informers["ConfigMap"].store
+
+
+def route_configmap_names(route: Mapping) -> List[str]:
+    """The ConfigMaps an IntegrationRoute's XML is stored in, in order."""
+    spec = route.get("spec", {})
+    return [spec["routeConfigMap"], *spec.get("routeConfigMapChunks", [])]
+
+
+def read_route_xml(route: Mapping) -> Optional[str]:
+    """
+    Read the XML of a deployed IntegrationRoute back from its ConfigMap(s), reassembling it if it was
+    compressed. Returns None if a ConfigMap is missing.
+
+    Raises:
+        ApiException: If the Kubernetes API fails.
+    """
+    namespace = route["metadata"]["namespace"]
+
+    def _read(name: str):
+        def _call(attempt: retry.Attempt):
+            _throttle_request()
+            return v1.read_namespaced_config_map(
+                name, namespace, _request_timeout=_request_timeout()
+            )
+
+        return _with_retry("read_configmap", _call)
+
+    try:
+        configmaps = [_read(name) for name in route_configmap_names(route)]
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return None
+    if route["spec"].get("routeEncoding") == GZIP_ENCODING:
+        return decompress_route([cm.binary_data or {} for cm in configmaps])
+    return (configmaps[0].data or {}).get(ROUTE_FILE)
+
+
+def _enable_tcp_keepalive(api_client: client.ApiClient) -> None:
+    """Send TCP keepalive probes on idle pooled connections so dead ones are detected and replaced."""
+    pool_manager = api_client.rest_client.pool_manager
+    pool_manager.connection_pool_kw["socket_options"] = (
+        HTTPConnection.default_socket_options
+        + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    )
+
+
+def _read_timeout() -> float:
+    """The read timeout of a request, cut short by the deadline of the retried call it is part of."""
+    left = retry.remaining()
+    if left is None:
+        return cfg.K8S_READ_TIMEOUT_SECONDS
+    return max(min(cfg.K8S_READ_TIMEOUT_SECONDS, left), 0.01)
+
+
+def _request_timeout() -> Tuple[float, float]:
+    return cfg.K8S_CONNECT_TIMEOUT_SECONDS, _read_timeout()
+
+
+def _retry_reason(e: Exception) -> Optional[str]:
+    """Why a failed API request is worth retrying, or None if it isn't."""
+    if isinstance(e, ApiException):
+        if e.status == 0:
+            return "connection"
+        if e.status in RETRYABLE_STATUSES:
+            return str(e.status)
+        # Applies only conflict despite taking ownership if the resource changed under them, so they are
+        # retried against its current state. Otherwise, the conflict is for the operator to resolve.
+        if e.status == 409 and cfg.K8S_APPLY_FORCE_CONFLICTS:
+            return "conflict"
+        return None
+    if isinstance(e, HTTPError):
+        return "connection"
+    return None
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(e, "headers", None)
+    return retry.parse_retry_after(headers.get("Retry-After")) if headers else None
+
+
+def _retry_policy() -> retry.RetryPolicy:
+    return retry.RetryPolicy(
+        max_attempts=max(cfg.K8S_RETRY_MAX_ATTEMPTS, 1),
+        base_delay=cfg.K8S_RETRY_BASE_SECONDS,
+        max_delay=cfg.K8S_RETRY_MAX_SECONDS,
+        deadline=cfg.K8S_RETRY_DEADLINE_SECONDS,
+    )
+
+
+def _with_retry(operation: str, func: Callable[[retry.Attempt], Any]) -> Any:
+    """Call the API through `func`, retrying transient failures (see `_retry_reason`)."""
+    return retry.call(
+        func, _retry_policy(), f"k8s_{operation}", _retry_reason, _retry_after
+    )
+
+
+async def _with_retry_async(
+    operation: str, func: Callable[[retry.Attempt], Awaitable[Any]]
+) -> Any:
+    """The asyncio equivalent of `_with_retry`."""
+    return await retry.call_async(
+        func, _retry_policy(), f"k8s_{operation}", _retry_reason, _retry_after
+    )
+
+
+def _conflicted(attempt: retry.Attempt) -> bool:
+    return isinstance(attempt.error, ApiException) and attempt.error.status == 409
+
+
+def _record_throttle(client_name: str, wait: float) -> None:
+    _THROTTLE_WAIT.observe(wait, client=client_name)
+    if wait > 0:
+        _THROTTLED_REQUESTS.inc(client=client_name)
+
+
+def _throttle_request() -> None:
+    """Wait for the client-side 'K8S_CLIENT_QPS' / 'K8S_CLIENT_BURST' limit before an API request."""
+    _record_throttle("thread", _throttle.acquire())
+
+
+def _collect_pool_metrics() -> None:
+    in_use = idle = maxsize = 0
+    if v1 is not None:
+        pools = v1.api_client.rest_client.pool_manager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            queue = getattr(pool, "pool", None)
+            if queue is None:
+                continue
+            maxsize += queue.maxsize
+            in_use += queue.maxsize - queue.qsize()
+            idle += sum(conn is not None for conn in list(queue.queue))
+    _POOL_CONNECTIONS.set(in_use, state="in_use")
+    _POOL_CONNECTIONS.set(idle, state="idle")
+    _POOL_MAX_CONNECTIONS.set(maxsize)
+
+
+metrics.REGISTRY.register_collector(_collect_pool_metrics)
 
 
 def _check_cluster_reachable() -> bool:
     """
     Checks if the Kubernetes cluster is reachable by attempting to retrieve API resources.
 
-    This function attempts to call the Kubernetes API to list available API resources.
-    If the call succeeds, it confirms that the cluster is reachable and returns True.
-    If the call fails or raises an exception, it indicates that the cluster is unreachable
-    and returns False.
+    A successful check is cached for 'K8S_REACHABILITY_TTL_SECONDS' and shared by all concurrent
+    deployments, and only one thread probes the API server at a time while the others wait for its
+    result. Probe failures (and failed API calls, see `_record_api_failure`) feed a circuit breaker: while
+    it is open, this returns False immediately, and once it goes half-open a single probe decides whether
+    to close it again.
 
     Returns:
         bool: True if the cluster is reachable, False otherwise.
     """
-    _ensure_configured()
-    if v1 is None:
-        return False
-    try:
-        v1.get_api_resources()
+    global _reachable_until
+    if time.monotonic() < _reachable_until or _informers_vouch_for_cluster():
+        return True
+
+    with _probe_lock:
+        if time.monotonic() < _reachable_until:
+            return True
+        _ensure_configured()
+        if v1 is None:
+            return False
+        if not _breaker.allow_request():
+            return False
+        try:
+            _throttle_request()
+            v1.get_api_resources(_request_timeout=_request_timeout())
+        except (ApiException, HTTPError) as e:
+            _LOGGER.warning("Kubernetes cluster is not reachable: %s", e)
+            _breaker.record_failure()
+            return False
+        except BaseException:
+            _breaker.release_probe()
+            raise
+        _breaker.record_success()
+        _reachable_until = time.monotonic() + cfg.K8S_REACHABILITY_TTL_SECONDS
         return True
-    except ApiException:
-        return False
 
 
-def _create_integration_route(route_data: RouteData, configmap_name: str) -> Resource:
-    """Create or update a new Integration Route with the provided configmap"""
+def _informers_vouch_for_cluster() -> bool:
+    """
+    Synced informers hold open watches on the API server, so a separate reachability probe is redundant
+    unless the circuit breaker has seen failures since.
+    """
+    return _informers_synced() and _breaker.state == CircuitState.CLOSED
+
+
+def _is_server_failure(e: Exception) -> bool:
+    """Whether an error means the API server is unavailable, as opposed to rejecting the request."""
+    if isinstance(e, ApiException):
+        return e.status == 0 or e.status >= 500
+    return isinstance(e, HTTPError)
 
-    body = {
-        "apiVersion": "keip.codice.org/v1alpha2",
+
+def _record_api_failure(e: Exception) -> None:
+    """Invalidate the cached reachability and count the failure towards the circuit breaker."""
+    global _reachable_until
+    if _is_server_failure(e):
+        _reachable_until = 0.0
+        _breaker.record_failure()
+
+
+def _unreachable_error() -> ApiException:
+    if _breaker.state == CircuitState.OPEN:
+        return ApiException(
+            status=503,
+            reason="Kubernetes API unavailable, failing fast until it recovers",
+        )
+    return ApiException(
+        status=500,
+        reason="Kubernetes cluster not reachable. Verify the cluster is running",
+    )
+
+
+def _apply(path: str, path_params: Mapping[str, str], body: Mapping) -> bool:
+    """
+    Create or update a resource with a single server-side apply request, owned by the keip field manager.
+
+    If another field manager owns a field that keip sets to a different value, the API server rejects the
+    apply with a conflict. Since keip is the source of truth for route resources, the apply is retried with
+    `force=true` to take ownership of those fields unless 'K8S_APPLY_FORCE_CONFLICTS' is disabled.
+
+    The applied object the API server responds with (the route XML included) is not deserialized, since
+    only the response's status is used.
+
+    Returns:
+        bool: Whether the resource was newly created (HTTP 201).
+
+    Raises:
+        ApiException: If the apply fails, including unresolved conflicts.
+    """
+    api_client = v1.api_client
+
+    def _call(force: bool):
+        _throttle_request()
+        return api_client.call_api(
+            path,
+            "PATCH",
+            path_params=dict(path_params),
+            query_params=[
+                ("fieldManager", FIELD_MANAGER),
+                ("force", "true" if force else "false"),
+            ],
+            header_params={
+                "Accept": "application/json",
+                "Content-Type": APPLY_CONTENT_TYPE,
+            },
+            body=body,
+            response_type=None,
+            auth_settings=["BearerToken"],
+            _return_http_data_only=False,
+            _request_timeout=_request_timeout(),
+        )
+
+    try:
+        _, status, _ = _call(force=False)
+    except ApiException as e:
+        if e.status != 409 or not cfg.K8S_APPLY_FORCE_CONFLICTS:
+            raise
+        _LOGGER.warning(
+            "Server-side apply of '%s' conflicts with another field manager, taking ownership: %s",
+            body["metadata"]["name"],
+            e.body,
+        )
+        _, status, _ = _call(force=True)
+
+    return status == 201
+
+
+def _content_digest(content: Mapping) -> str:
+    """A SHA-256 digest of a resource's content, independent of key order."""
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _digest(obj: Optional[Mapping]) -> Optional[str]:
+    if obj is None:
+        return None
+    return (obj["metadata"].get("annotations") or {}).get(DIGEST_ANNOTATION)
+
+
+def _integration_route_body(
+    route_data: RouteData,
+    configmap_name: str,
+    chunk_configmaps: Optional[Sequence[str]] = None,
+) -> Mapping:
+    """
+    If `chunk_configmaps` is set, the route is stored gzipped, starting in `configmap_name` and continuing
+    in the listed ConfigMaps.
+    """
+    spec = {"routeConfigMap": configmap_name}
+    if chunk_configmaps is not None:
+        spec["routeEncoding"] = GZIP_ENCODING
+        if chunk_configmaps:
+            spec["routeConfigMapChunks"] = list(chunk_configmaps)
+    return {
+        "apiVersion": f"{ROUTE_API_GROUP}/{ROUTE_API_VERSION}",
         "kind": "IntegrationRoute",
         "metadata": {
             "name": route_data.route_name,
+            "namespace": route_data.namespace,
             "labels": {"app.kubernetes.io/created-by": "keip"},
+            "annotations": {DIGEST_ANNOTATION: _content_digest(spec)},
         },
-        "spec": {"routeConfigMap": configmap_name},
+        "spec": spec,
     }
 
-    existing_route = routeApi.list_namespaced_custom_object(
-        group=ROUTE_API_GROUP,
-        version=ROUTE_API_VERSION,
-        namespace=route_data.namespace,
-        plural=ROUTE_PLURAL,
-        field_selector=f"metadata.name={route_data.route_name}",
+
+def _configmap_body(
+    route_data: RouteData,
+    configmap_name: str,
+    binary_data: Optional[Mapping[str, str]] = None,
+) -> Mapping:
+    """A ConfigMap holding the route XML, or a chunk of the compressed route if `binary_data` is set."""
+    field, content = (
+        ("binaryData", binary_data)
+        if binary_data is not None
+        else ("data", {ROUTE_FILE: route_data.route_xml})
     )
+    return {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {
+            "name": configmap_name,
+            "namespace": route_data.namespace,
+            "labels": {"app.kubernetes.io/created-by": "keip"},
+            "annotations": {DIGEST_ANNOTATION: _content_digest(content)},
+        },
+        field: content,
+    }
 
-    if existing_route["items"]:
-        routeApi.patch_namespaced_custom_object(
-            group=ROUTE_API_GROUP,
-            version=ROUTE_API_VERSION,
-            namespace=route_data.namespace,
-            plural=ROUTE_PLURAL,
-            name=route_data.route_name,
-            body=body,
+
+def _encoded_length(text: str) -> int:
+    """The length of `text` in UTF-8, without encoding a copy of it when it is ASCII (as XML usually is)."""
+    return len(text) if text.isascii() else len(text.encode())
+
+
+def _route_configmap_bodies(route_data: RouteData) -> List[Mapping]:
+    """
+    The ConfigMaps storing a route. Routes of at least 'ROUTE_COMPRESSION_MIN_BYTES' are minified, gzipped
+    and split into chunks named '<route>-cm', '<route>-cm-1', ... when 'ROUTE_COMPRESSION_ENABLED' is set.
+    """
+    configmap_name = f"{route_data.route_name}-cm"
+    if (
+        not cfg.ROUTE_COMPRESSION_ENABLED
+        or _encoded_length(route_data.route_xml) < cfg.ROUTE_COMPRESSION_MIN_BYTES
+    ):
+        return [_configmap_body(route_data, configmap_name)]
+    chunks = compress_route(route_data.route_xml, cfg.ROUTE_CHUNK_BYTES)
+    names = [configmap_name] + [f"{configmap_name}-{i}" for i in range(1, len(chunks))]
+    return [
+        _configmap_body(route_data, name, binary_data=chunk)
+        for name, chunk in zip(names, chunks)
+    ]
+
+
+def _chunk_configmaps(configmaps: Sequence[Mapping]) -> Optional[List[str]]:
+    """The ConfigMaps after the first holding a compressed route, or None if the route is not compressed."""
+    if "binaryData" not in configmaps[0]:
+        return None
+    return [body["metadata"]["name"] for body in configmaps[1:]]
+
+
+@dataclass
+class _NamespaceState:
+    exists: bool
+    # Digests of the keip-created resources of each kind listed, by name
+    digests: Dict[str, Dict[str, Optional[str]]] = field(default_factory=dict)
+    listed: bool = False
+
+
+def _list_kinds() -> List[Tuple[str, str]]:
+    """The kinds whose digests a batch lists, leaving out those the informer cache already answers for."""
+    if not cfg.K8S_SKIP_UNCHANGED_WRITES:
+        return []
+    return [
+        (kind, path)
+        for kind, path in (
+            ("ConfigMap", CONFIGMAPS_PATH),
+            ("IntegrationRoute", INTEGRATION_ROUTES_PATH),
         )
-        return Resource(status=Status.UPDATED, name=route_data.route_name)
-
-    routeApi.create_namespaced_custom_object(
-        group=ROUTE_API_GROUP,
-        version=ROUTE_API_VERSION,
-        namespace=route_data.namespace,
-        plural=ROUTE_PLURAL,
-        body=body,
+        if not cached_object(kind, "", "")[0]
+    ]
+
+
+def _list_query(token: str) -> List[Tuple[str, str]]:
+    query = [
+        ("labelSelector", CREATED_BY_SELECTOR),
+        ("limit", str(cfg.K8S_INFORMER_PAGE_SIZE)),
+    ]
+    if token:
+        query.append(("continue", token))
+    return query
+
+
+def _page_digests(page: Mapping, digests: Dict[str, Optional[str]]) -> str:
+    for obj in page.get("items") or []:
+        digests[obj["metadata"]["name"]] = _digest(obj)
+    return page["metadata"].get("continue", "")
+
+
+def _get_namespaced(
+    operation: str,
+    namespace: str,
+    path: str,
+    query=None,
+    accept: str = "application/json",
+) -> Any:
+    def _call(attempt: retry.Attempt):
+        _throttle_request()
+        return v1.api_client.call_api(
+            path,
+            "GET",
+            path_params={"namespace": namespace},
+            query_params=query or [],
+            header_params={"Accept": accept},
+            response_type="object",
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True,
+            _request_timeout=_request_timeout(),
+        )
+
+    return _with_retry(operation, _call)
+
+
+def _load_namespace(namespace: str) -> _NamespaceState:
+    try:
+        _get_namespaced("load_namespace", namespace, NAMESPACE_PATH)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return _NamespaceState(exists=False)
+    return _NamespaceState(exists=True)
+
+
+def _list_digests(namespace: str) -> Dict[str, Dict[str, Optional[str]]]:
+    kinds: Dict[str, Dict[str, Optional[str]]] = {}
+    for kind, path in _list_kinds():
+        digests = kinds[kind] = {}
+        token = ""
+        while True:
+            token = _page_digests(
+                _get_namespaced(
+                    "list_digests",
+                    namespace,
+                    path,
+                    _list_query(token),
+                    METADATA_LIST_ACCEPT,
+                ),
+                digests,
+            )
+            if not token:
+                break
+    return kinds
+
+
+class BatchSnapshot:
+    """
+    The state of the namespaces a batch of routes is deployed to, loaded once per namespace for the whole
+    batch: whether the namespace exists and, once the batch has deployed 'K8S_BATCH_LIST_MIN_ROUTES' routes to
+    it, the content digests of its keip-created ConfigMaps and IntegrationRoutes from one paginated
+    label-selector list per kind. Deciding whether the resources of the routes after that changed then costs
+    no read of their own, while smaller batches read only their own resources' metadata instead of the whole
+    namespace.
+
+    The first route deployed to a namespace loads its state, and the route reaching the threshold lists it,
+    while concurrent routes to the same namespace wait for them. A failed load is not kept, so the next route
+    retries it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._routes: Dict[str, int] = {}
+        self._namespaces: Dict[str, _NamespaceState] = {}
+        self._loads: Dict[str, asyncio.Future] = {}
+        self._lists: Dict[str, asyncio.Future] = {}
+
+    def _count_route(self, namespace: str) -> bool:
+        """Count a route deployed to the namespace, returning whether the batch should have it listed."""
+        with self._lock:
+            count = self._routes[namespace] = self._routes.get(namespace, 0) + 1
+        return count >= cfg.K8S_BATCH_LIST_MIN_ROUTES
+
+    def namespace(self, namespace: str) -> _NamespaceState:
+        listed = self._count_route(namespace)
+        with self._lock:
+            lock = self._locks.setdefault(namespace, threading.Lock())
+        with lock:
+            state = self._namespaces.get(namespace)
+            if state is None:
+                with span("snapshot"):
+                    state = self._namespaces[namespace] = _load_namespace(namespace)
+            if listed and state.exists and not state.listed:
+                with span("snapshot"):
+                    state.digests = _list_digests(namespace)
+                state.listed = True
+            return state
+
+    async def namespace_async(
+        self, api: "_AsyncApi", namespace: str
+    ) -> _NamespaceState:
+        listed = self._count_route(namespace)
+        state = self._namespaces.get(namespace)
+        if state is None:
+            state = self._namespaces[namespace] = await self._once(
+                self._loads, namespace, lambda: api.load_namespace(namespace)
+            )
+        if listed and state.exists and not state.listed:
+            state.digests = await self._once(
+                self._lists, namespace, lambda: api.list_digests(namespace)
+            )
+            state.listed = True
+        return state
+
+    @staticmethod
+    async def _once(
+        loads: Dict[str, asyncio.Future],
+        namespace: str,
+        load: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Await the namespace's load, starting it unless a concurrent route already has."""
+        future = loads.get(namespace)
+        if future is None:
+            future = loads[namespace] = asyncio.ensure_future(load())
+        try:
+            with span("snapshot"):
+                return await asyncio.shield(future)
+        except Exception:
+            if loads.get(namespace) is future:
+                del loads[namespace]
+            raise
+
+
+def _require_namespace(state: _NamespaceState, namespace: str) -> None:
+    if not state.exists:
+        raise ApiException(status=404, reason=f"Namespace '{namespace}' not found")
+
+
+def _current_digest(
+    kind: str,
+    path: str,
+    path_params: Mapping[str, str],
+    state: Optional[_NamespaceState] = None,
+) -> Optional[str]:
+    """
+    The content digest of the resource as it is stored, read from the informer cache when it is synced, or
+    the batch's namespace state if it listed the kind, and from the API server otherwise. Returns None if the
+    resource does not exist.
+    """
+    cached, obj = cached_object(kind, path_params["namespace"], path_params["name"])
+    if cached:
+        return _digest(obj)
+    if state is not None and kind in state.digests:
+        return state.digests[kind].get(path_params["name"])
+    _throttle_request()
+    try:
+        obj = v1.api_client.call_api(
+            path,
+            "GET",
+            path_params=dict(path_params),
+            header_params={"Accept": METADATA_ACCEPT},
+            response_type="object",
+            auth_settings=["BearerToken"],
+            _return_http_data_only=True,
+            _request_timeout=_request_timeout(),
+        )
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return None
+    return _digest(obj)
+
+
+def _apply_if_changed(
+    kind: str,
+    path: str,
+    path_params: Mapping[str, str],
+    body: Mapping,
+    state: Optional[_NamespaceState] = None,
+) -> Status:
+    """
+    Apply a route resource unless its content digest annotation shows the stored resource already matches,
+    sparing the API server (and every watcher of the resource) a no-op write.
+
+    Transient failures are retried with backoff (see `_with_retry`). After a conflict, the stored digest is
+    read again rather than taken from the batch's state, since the resource changed since it was listed.
+    """
+
+    def _attempt(attempt: retry.Attempt) -> Status:
+        if cfg.K8S_SKIP_UNCHANGED_WRITES:
+            digest = body["metadata"]["annotations"][DIGEST_ANNOTATION]
+            current = _current_digest(
+                kind, path, path_params, state=None if _conflicted(attempt) else state
+            )
+            if current == digest:
+                _WRITES_SKIPPED.inc(kind=kind)
+                return Status.UNCHANGED
+        created = _apply(path, path_params, body)
+        return Status.CREATED if created else Status.UPDATED
+
+    return _with_retry("apply", _attempt)
+
+
+def _create_integration_route(
+    route_data: RouteData,
+    configmap_name: str,
+    chunk_configmaps: Optional[Sequence[str]] = None,
+    state: Optional[_NamespaceState] = None,
+) -> Resource:
+    """Create or update an Integration Route with the provided configmap, using server-side apply"""
+
+    status = _apply_if_changed(
+        "IntegrationRoute",
+        INTEGRATION_ROUTE_PATH,
+        {"namespace": route_data.namespace, "name": route_data.route_name},
+        _integration_route_body(route_data, configmap_name, chunk_configmaps),
+        state=state,
     )
-    return Resource(status=Status.CREATED, name=route_data.route_name)
+    return Resource(status=status, name=route_data.route_name)
 
 
-def _create_route_configmap(route_data: RouteData) -> Resource:
+def _create_route_configmaps(
+    route_data: RouteData,
+    configmaps: Optional[Sequence[Mapping]] = None,
+    state: Optional[_NamespaceState] = None,
+) -> List[Resource]:
     """
-    Creates or updates a ConfigMap containing an XML route payload for an integration route.
+    Creates or updates the ConfigMaps containing the XML route payload for an integration route.
 
-    This function generates a ConfigMap with the provided route configuration and creates or updates
-    it in the specified namespace.
+    This function generates the ConfigMaps with the provided route configuration (see
+    `_route_configmap_bodies`) and applies each to the specified namespace with a single server-side apply
+    request, which is skipped if the stored ConfigMap's content digest shows it is already up to date.
 
     Args:
         route_data (RouteData): The route data containing the route name, namespace, and XML route file.
+        configmaps (Sequence[Mapping]): The ConfigMaps to apply, if already generated.
+        state (_NamespaceState): The batch's state of the route's namespace, if any, to compare digests with.
 
     Returns:
-        Resource: A Resource object indicating the status (CREATED or UPDATED) and name of the created/updated ConfigMap.
+        List[Resource]: A Resource object per ConfigMap indicating its status (CREATED, UPDATED or UNCHANGED)
+            and name. A single ConfigMap is used unless the route is compressed and split into chunks.
 
     Raises:
         ApiException: If the Kubernetes cluster is unreachable or if there is an error during the API call.
         Exception: If an unexpected error occurs during processing.
     """
-    configmap_name = f"{route_data.route_name}-cm"
-    configmap = client.V1ConfigMap(
-        metadata=client.V1ObjectMeta(
-            name=configmap_name,
-            namespace=route_data.namespace,
-            labels={"app.kubernetes.io/created-by": "keip"},
-        ),
-        data={"integrationRoute.xml": route_data.route_xml},
-    )
-
-    result = v1.list_namespaced_config_map(
-        namespace=route_data.namespace, field_selector=f"metadata.name={configmap_name}"
-    )
-
-    updated = False
-
-    if len(result.items) > 0:
-        # Update if exists
-        _LOGGER.info(
-            "Route ConfigMap '%s' already exists and will be updated", configmap_name
-        )
-
-        v1.replace_namespaced_config_map(
-            name=configmap_name, namespace=route_data.namespace, body=configmap
-        )
-        updated = True
-    else:
-        # Create if doesn't exist
-        _LOGGER.info(
-            "Route ConfigMap '%s' does not exist and will be created", configmap_name
-        )
-        v1.create_namespaced_config_map(
-            namespace=route_data.namespace, body=configmap
+    resources = []
+    for body in configmaps or _route_configmap_bodies(route_data):
+        configmap_name = body["metadata"]["name"]
+        status = _apply_if_changed(
+            "ConfigMap",
+            CONFIGMAP_PATH,
+            {"namespace": route_data.namespace, "name": configmap_name},
+            body,
+            state=state,
         )
+        _LOGGER.info("Route ConfigMap '%s' was %s", configmap_name, status.value)
+        resources.append(Resource(status=status, name=configmap_name))
+    return resources
 
-    status = Status.UPDATED if updated else Status.CREATED
-    return Resource(status=status, name=configmap_name)
 
-
-def create_route_resources(route_data: RouteData) -> Tuple[Resource, Resource]:
+def create_route_resources(
+    route_data: RouteData, snapshot: Optional[BatchSnapshot] = None
+) -> Tuple[Resource, ...]:
     """
-    Creates both a ConfigMap and an Integration Route resource for the specified route configuration.
+    Creates both the ConfigMap(s) and an Integration Route resource for the specified route configuration.
 
-    This function orchestrates the creation of two Kubernetes resources:
-    1. A ConfigMap containing the XML route payload for the integration route
+    This function orchestrates the creation of the Kubernetes resources:
+    1. A ConfigMap containing the XML route payload for the integration route (or several, if the payload is
+       compressed and split into chunks, see `_route_configmap_bodies`)
     2. An Integration Route resource that routes traffic based on the provided configuration
 
     The function first creates the ConfigMap using the provided route data, then creates the Integration Route
@@ -183,25 +953,346 @@ def create_route_resources(route_data: RouteData) -> Tuple[Resource, Resource]:
     Args:
         route_data (RouteData): The route data containing the route name, namespace, and XML route file.
             Must include all required fields to properly configure the integration route.
+        snapshot (BatchSnapshot): The state of the namespaces deployed to by the batch this route belongs to,
+            if any. Its namespace must exist, and its resources' digests are read from the snapshot.
 
     Returns:
-        Tuple[Resource]: A list containing two Resource objects:
-            - The created/updated ConfigMap resource
-            - The created/updated Integration Route resource
-        The resources are returned in the order: [ConfigMap, Integration Route]
+        Tuple[Resource, ...]: The created/updated resources, in the order: [ConfigMap(s), Integration Route]
 
     Raises:
         ApiException: If the Kubernetes cluster is unreachable or if there is an error during API calls.
         Exception: If an unexpected error occurs during processing or resource creation.
     """
-    if not _check_cluster_reachable():
-        raise ApiException(
-            status=500,
-            reason="Kubernetes cluster not reachable. Verify the cluster is running",
+    with span("reachability"):
+        reachable = _check_cluster_reachable()
+    if not reachable:
+        raise _unreachable_error()
+
+    configmaps = _route_configmap_bodies(route_data)
+    try:
+        state = None
+        if snapshot is not None:
+            state = snapshot.namespace(route_data.namespace)
+            _require_namespace(state, route_data.namespace)
+        with span("configmap"):
+            route_cms = _create_route_configmaps(route_data, configmaps, state)
+        with span("integrationroute"):
+            route = _create_integration_route(
+                route_data=route_data,
+                configmap_name=route_cms[0].name,
+                chunk_configmaps=_chunk_configmaps(configmaps),
+                state=state,
+            )
+    except (ApiException, HTTPError) as e:
+        _record_api_failure(e)
+        raise
+    return (*route_cms, route)
+
+
+def _ssl_context(configuration: client.Configuration):
+    if not configuration.verify_ssl:
+        return False
+    context = ssl.create_default_context(cafile=configuration.ssl_ca_cert)
+    if configuration.cert_file:
+        context.load_cert_chain(configuration.cert_file, configuration.key_file)
+    if configuration.assert_hostname is False:
+        context.check_hostname = False
+    return context
+
+
+class _AsyncApi:
+    """
+    Non-blocking access to the API server for one event loop, sharing a single connection pool.
+
+    Uses the same configuration (host, TLS and bearer token, including in-cluster token refresh) as the
+    blocking client.
+    """
+
+    def __init__(self, configuration: client.Configuration) -> None:
+        self.configuration = configuration
+        self.host = configuration.host.rstrip("/")
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=cfg.K8S_ASYNC_MAX_CONCURRENCY,
+                ssl=_ssl_context(configuration),
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=cfg.K8S_CONNECT_TIMEOUT_SECONDS,
+                sock_read=cfg.K8S_READ_TIMEOUT_SECONDS,
+            ),
         )
+        self.limiter = ConcurrencyLimiter("k8s_async", cfg.K8S_ASYNC_MAX_CONCURRENCY)
+        self.probe_lock = asyncio.Lock()
 
-    route_cm = _create_route_configmap(route_data=route_data)
-    route = _create_integration_route(
-        route_data=route_data, configmap_name=route_cm.name
-    )
-    return route_cm, route
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Mapping] = None,
+        decode: bool = True,
+        **kwargs,
+    ) -> Tuple[int, Any]:
+        """
+        Returns:
+            Tuple[int, Any]: The response status and decoded JSON body, or None if `decode` is not set, in
+                which case a successful response's body is read and discarded as it arrives.
+
+        Raises:
+            ApiException: If the API server returns an error, or with status 0 if it cannot be reached.
+        """
+        headers = {"Accept": "application/json", **(headers or {})}
+        auth = self.configuration.auth_settings().get("BearerToken")
+        if auth:
+            headers[auth["key"]] = auth["value"]
+        if self.configuration.proxy:
+            kwargs["proxy"] = self.configuration.proxy
+        if self.configuration.tls_server_name:
+            kwargs["server_hostname"] = self.configuration.tls_server_name
+        if retry.remaining() is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=cfg.K8S_CONNECT_TIMEOUT_SECONDS,
+                sock_read=_read_timeout(),
+            )
+
+        _record_throttle("async", await _throttle.acquire_async())
+        try:
+            async with self.session.request(
+                method, self.host + path, headers=headers, **kwargs
+            ) as res:
+                if res.status < 400 and not decode:
+                    # Read to the end, so that the connection can be reused
+                    async for _ in res.content.iter_chunked(_DISCARD_CHUNK_BYTES):
+                        pass
+                    return res.status, None
+                text = await res.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ApiException(status=0, reason=f"{type(e).__name__}: {e}") from e
+
+        if res.status >= 400:
+            e = ApiException(status=res.status, reason=res.reason)
+            e.body = text
+            e.headers = res.headers
+            raise e
+        return res.status, json.loads(text) if text else None
+
+    async def apply(self, path: str, body: Mapping) -> bool:
+        """The non-blocking equivalent of `_apply`."""
+        # Serialized once, even if the apply is forced after a conflict
+        data = json.dumps(body).encode()
+
+        async def _call(force: bool) -> Tuple[int, Any]:
+            return await self.request(
+                "PATCH",
+                path,
+                headers={"Content-Type": APPLY_CONTENT_TYPE},
+                decode=False,
+                params={
+                    "fieldManager": FIELD_MANAGER,
+                    "force": "true" if force else "false",
+                },
+                data=data,
+            )
+
+        try:
+            status, _ = await _call(force=False)
+        except ApiException as e:
+            if e.status != 409 or not cfg.K8S_APPLY_FORCE_CONFLICTS:
+                raise
+            _LOGGER.warning(
+                "Server-side apply of '%s' conflicts with another field manager, taking ownership: %s",
+                body["metadata"]["name"],
+                e.body,
+            )
+            status, _ = await _call(force=True)
+
+        return status == 201
+
+    async def _get_json(self, operation: str, path: str, **kwargs) -> Any:
+        _, data = await _with_retry_async(
+            operation, lambda _: self.request("GET", path, **kwargs)
+        )
+        return data
+
+    async def load_namespace(self, namespace: str) -> _NamespaceState:
+        """The non-blocking equivalent of `_load_namespace`."""
+        try:
+            await self._get_json(
+                "load_namespace", NAMESPACE_PATH.format(namespace=namespace)
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return _NamespaceState(exists=False)
+        return _NamespaceState(exists=True)
+
+    async def list_digests(self, namespace: str) -> Dict[str, Dict[str, Optional[str]]]:
+        """The non-blocking equivalent of `_list_digests`."""
+        kinds: Dict[str, Dict[str, Optional[str]]] = {}
+        for kind, path in _list_kinds():
+            digests = kinds[kind] = {}
+            token = ""
+            while True:
+                page = await self._get_json(
+                    "list_digests",
+                    path.format(namespace=namespace),
+                    headers={"Accept": METADATA_LIST_ACCEPT},
+                    params=_list_query(token),
+                )
+                token = _page_digests(page, digests)
+                if not token:
+                    break
+        return kinds
+
+    async def current_digest(
+        self, kind: str, path: str, metadata: Mapping, state: Optional[_NamespaceState]
+    ) -> Optional[str]:
+        """The non-blocking equivalent of `_current_digest`."""
+        cached, obj = cached_object(kind, metadata["namespace"], metadata["name"])
+        if cached:
+            return _digest(obj)
+        if state is not None and kind in state.digests:
+            return state.digests[kind].get(metadata["name"])
+        try:
+            _, obj = await self.request(
+                "GET", path, headers={"Accept": METADATA_ACCEPT}
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return None
+        return _digest(obj)
+
+    async def apply_if_changed(
+        self,
+        kind: str,
+        path: str,
+        body: Mapping,
+        state: Optional[_NamespaceState] = None,
+    ) -> Status:
+        """The non-blocking equivalent of `_apply_if_changed`."""
+
+        async def _attempt(attempt: retry.Attempt) -> Status:
+            if cfg.K8S_SKIP_UNCHANGED_WRITES:
+                metadata = body["metadata"]
+                digest = await self.current_digest(
+                    kind, path, metadata, None if _conflicted(attempt) else state
+                )
+                if digest == metadata["annotations"][DIGEST_ANNOTATION]:
+                    _WRITES_SKIPPED.inc(kind=kind)
+                    return Status.UNCHANGED
+            created = await self.apply(path, body)
+            return Status.CREATED if created else Status.UPDATED
+
+        return await _with_retry_async("apply", _attempt)
+
+
+_async_apis: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncApi]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_async_api() -> Optional[_AsyncApi]:
+    _ensure_configured()
+    if not _configured:
+        return None
+    loop = asyncio.get_running_loop()
+    api = _async_apis.get(loop)
+    if api is None:
+        api = _async_apis[loop] = _AsyncApi(client.Configuration.get_default_copy())
+    return api
+
+
+async def close_async_client() -> None:
+    """Close the connection pool used by the current event loop, if any."""
+    api = _async_apis.pop(asyncio.get_running_loop(), None)
+    if api is not None:
+        await api.session.close()
+
+
+async def _check_cluster_reachable_async(api: _AsyncApi) -> bool:
+    """The non-blocking equivalent of `_check_cluster_reachable`, sharing its cached state and breaker."""
+    global _reachable_until
+    if time.monotonic() < _reachable_until or _informers_vouch_for_cluster():
+        return True
+
+    async with api.probe_lock:
+        if time.monotonic() < _reachable_until:
+            return True
+        if not _breaker.allow_request():
+            return False
+        try:
+            await api.request("GET", "/api/v1/")
+        except ApiException as e:
+            _LOGGER.warning("Kubernetes cluster is not reachable: %s", e)
+            _breaker.record_failure()
+            return False
+        except BaseException:
+            # Cancelled, or failed for a reason of its own: the next probe decides instead
+            _breaker.release_probe()
+            raise
+        _breaker.record_success()
+        _reachable_until = time.monotonic() + cfg.K8S_REACHABILITY_TTL_SECONDS
+        return True
+
+
+async def create_route_resources_async(
+    route_data: RouteData, snapshot: Optional[BatchSnapshot] = None
+) -> Tuple[Resource, ...]:
+    """
+    The asyncio equivalent of `create_route_resources`, which applies the ConfigMap and Integration Route
+    without blocking a thread.
+
+    At most 'K8S_ASYNC_MAX_CONCURRENCY' routes are deployed at once across all requests; the rest wait
+    for a slot.
+
+    Raises:
+        ApiException: If the Kubernetes cluster is unreachable or if there is an error during API calls.
+    """
+    api = _get_async_api()
+    with span("reachability"):
+        reachable = api is not None and await _check_cluster_reachable_async(api)
+    if not reachable:
+        raise _unreachable_error()
+
+    configmaps = _route_configmap_bodies(route_data)
+    path_params = {"namespace": route_data.namespace}
+    route_cms = []
+    try:
+        state = None
+        if snapshot is not None:
+            state = await snapshot.namespace_async(api, route_data.namespace)
+            _require_namespace(state, route_data.namespace)
+        async with api.limiter:
+            with span("configmap"):
+                for body in configmaps:
+                    configmap_name = body["metadata"]["name"]
+                    cm_status = await api.apply_if_changed(
+                        "ConfigMap",
+                        CONFIGMAP_PATH.format(**path_params, name=configmap_name),
+                        body,
+                        state,
+                    )
+                    _LOGGER.info(
+                        "Route ConfigMap '%s' was %s", configmap_name, cm_status.value
+                    )
+                    route_cms.append(Resource(status=cm_status, name=configmap_name))
+            with span("integrationroute"):
+                route_status = await api.apply_if_changed(
+                    "IntegrationRoute",
+                    INTEGRATION_ROUTE_PATH.format(
+                        **path_params, name=route_data.route_name
+                    ),
+                    _integration_route_body(
+                        route_data,
+                        route_cms[0].name,
+                        _chunk_configmaps(configmaps),
+                    ),
+                    state,
+                )
+    except ApiException as e:
+        _record_api_failure(e)
+        raise
+
+    return (*route_cms, Resource(status=route_status, name=route_data.route_name))
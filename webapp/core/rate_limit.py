@@ -0,0 +1,367 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from core import metrics
+
+_CONCURRENCY_IN_FLIGHT = metrics.gauge(
+    "keip_concurrency_in_flight",
+    "Operations currently holding a concurrency limiter slot",
+    ("limiter",),
+)
+_CONCURRENCY_LIMIT = metrics.gauge(
+    "keip_concurrency_limit", "Slots available to a concurrency limiter", ("limiter",)
+)
+_CONCURRENCY_WAIT = metrics.histogram(
+    "keip_concurrency_wait_seconds",
+    "Time spent waiting for a concurrency limiter slot",
+    ("limiter",),
+)
+_RATE_LIMIT_WAIT = metrics.histogram(
+    "keip_rate_limit_wait_seconds",
+    "Time operations waited for rate limiter tokens",
+    ("limiter",),
+)
+_RATE_LIMIT_WAITING = metrics.gauge(
+    "keip_rate_limit_waiting",
+    "Operations waiting in a rate limiter's fair queue",
+    ("limiter",),
+)
+_RATE_LIMIT_REJECTED = metrics.counter(
+    "keip_rate_limit_rejected_total",
+    "Operations rejected by a rate limiter, by the scope whose tokens ran out",
+    ("limiter", "scope"),
+)
+_RATE_LIMIT_TOKENS = metrics.gauge(
+    "keip_rate_limit_tokens",
+    "Tokens available in a rate limiter's global bucket (negative while operations wait for them)",
+    ("limiter",),
+)
+_RATE_LIMIT_KEYS = metrics.gauge(
+    "keip_rate_limit_keys",
+    "Namespaces and clients a rate limiter tracks a bucket for",
+    ("limiter", "scope"),
+)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket allowing `rate` operations per second with bursts of up to `burst`.
+
+    Callers reserve a token and then wait until it is due, so concurrent callers are spaced out in
+    arrival order instead of all retrying when a token frees up. A rate of 0 disables throttling.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            float(self.burst), self._tokens + (now - self._last) * self.rate
+        )
+        self._last = now
+
+    def delay(self, tokens: int = 1) -> float:
+        """Seconds until `tokens` tokens are available, without taking any."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def available(self) -> float:
+        """Tokens available now, or negative if callers are already waiting for tokens."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def reserve(self) -> float:
+        """Take a token, returning how many seconds the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available, returning the time waited."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Wait without blocking the event loop until a token is available, returning the time waited."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class ConcurrencyLimiter:
+    """
+    Limits how many coroutines run a block at once, e.g. `async with limiter: ...`.
+
+    asyncio primitives are bound to the event loop they are first used on, so a semaphore is kept per
+    loop. The number of operations in flight, the limit and the time spent waiting for a slot are
+    exported as metrics labelled with the limiter's name.
+    """
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.limit = max(limit, 1)
+        self._semaphores: (
+            "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+        ) = weakref.WeakKeyDictionary()
+        _CONCURRENCY_LIMIT.set(self.limit, limiter=name)
+        _CONCURRENCY_IN_FLIGHT.inc(0, limiter=name)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+    async def __aenter__(self) -> None:
+        start = time.perf_counter()
+        await self._semaphore().acquire()
+        _CONCURRENCY_WAIT.observe(time.perf_counter() - start, limiter=self.name)
+        _CONCURRENCY_IN_FLIGHT.inc(limiter=self.name)
+
+    async def __aexit__(self, *exc_info) -> None:
+        _CONCURRENCY_IN_FLIGHT.dec(limiter=self.name)
+        self._semaphore().release()
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parse comma-separated 'key=weight' pairs, e.g. 'team-a=2,team-b=0.5'."""
+    weights = {}
+    for pair in filter(None, (p.strip() for p in value.split(","))):
+        key, sep, weight = pair.partition("=")
+        if not sep or float(weight) <= 0:
+            raise ValueError(
+                f"Invalid weight '{pair}', expected 'key=<positive number>'"
+            )
+        weights[key.strip()] = float(weight)
+    return weights
+
+
+class RateLimitedError(Exception):
+    """Raised when an operation would wait longer for a rate limiter than its caller allows."""
+
+    def __init__(self, scope: str, retry_after: float) -> None:
+        super().__init__(
+            f"{scope.capitalize()} rate limit exceeded, retry after {retry_after:.1f}s"
+        )
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class _FairQueue:
+    """
+    Grants tokens of the global bucket to waiting operations in order of their virtual finish time, so that
+    each key with operations waiting gets a share of the rate in proportion to its weight, however many
+    operations other keys queued ahead of it.
+    """
+
+    def __init__(self, limiter: "FairRateLimiter") -> None:
+        self._limiter = limiter
+        self._bucket = limiter.bucket
+        self._heap: List[Tuple[float, int, asyncio.Future]] = []
+        self._finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _tag(self, key: str) -> float:
+        start = max(self._virtual_time, self._finish.get(key, 0.0))
+        return start + 1 / self._limiter.weight(key)
+
+    def delay(self, key: str) -> float:
+        """Seconds until an operation of `key` would be granted a token, were it queued now."""
+        tag = self._tag(key)
+        ahead = sum(
+            not future.done() and entry_tag <= tag
+            for entry_tag, _, future in self._heap
+        )
+        return self._bucket.delay(ahead + 1)
+
+    async def take(self, key: str) -> None:
+        tag = self._finish[key] = self._tag(key)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (tag, next(self._order), future))
+        _RATE_LIMIT_WAITING.inc(limiter=self._limiter.name)
+        try:
+            if self._timer is None:
+                self._grant()
+            await future
+        finally:
+            _RATE_LIMIT_WAITING.dec(limiter=self._limiter.name)
+            # A cancelled operation is dropped from the queue when it reaches the front
+            future.cancel()
+
+    def _grant(self) -> None:
+        self._timer = None
+        while self._heap:
+            tag, _, future = self._heap[0]
+            if future.done():
+                heapq.heappop(self._heap)
+                continue
+            wait = self._bucket.delay()
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._grant)
+                return
+            heapq.heappop(self._heap)
+            self._bucket.reserve()
+            self._virtual_time = tag
+            future.set_result(None)
+        # Finish times behind the virtual time no longer hold a key back
+        self._finish = {k: t for k, t in self._finish.items() if t > self._virtual_time}
+
+
+class FairRateLimiter:
+    """
+    Token-bucket rate limiting of operations keyed by e.g. namespace: each operation takes a token from its
+    key's bucket, its client's bucket, and a global bucket. Operations waiting for the global bucket are
+    served weighted-fair across keys rather than first come, first served, so a key queueing a large batch
+    delays other keys by at most its share of the rate. A rate of 0 disables that bucket.
+
+    Callers give the longest they are willing to wait: an operation that would wait longer is rejected
+    upfront with the time after which it is expected to get through, instead of queueing.
+
+    Like `ConcurrencyLimiter`, the fair queue is kept per event loop. Idle key and client buckets (those
+    refilled to their burst) are dropped once more than `max_keys` are tracked.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        key_rate: float = 0.0,
+        key_burst: int = 1,
+        client_rate: float = 0.0,
+        client_burst: int = 1,
+        weights: Optional[Mapping[str, float]] = None,
+        max_keys: int = 10_000,
+    ) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.weights = dict(weights or {})
+        self.max_keys = max_keys
+        self._limits = {
+            "namespace": (key_rate, key_burst),
+            "client": (client_rate, client_burst),
+        }
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {
+            scope: {} for scope in self._limits
+        }
+        self._lock = threading.Lock()
+        self._queues: (
+            "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _FairQueue]"
+        ) = weakref.WeakKeyDictionary()
+        metrics.REGISTRY.register_collector(self._collect_metrics)
+
+    def weight(self, key: str) -> float:
+        return self.weights.get(key, 1.0)
+
+    def _queue(self) -> _FairQueue:
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = _FairQueue(self)
+        return queue
+
+    def _bucket(self, scope: str, key: str) -> Optional[TokenBucket]:
+        rate, burst = self._limits[scope]
+        if rate <= 0:
+            return None
+        with self._lock:
+            buckets = self._buckets[scope]
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys:
+                    # Buckets refilled to their burst behave like new ones
+                    idle = [k for k, b in buckets.items() if b.delay(b.burst) == 0]
+                    for idle_key in idle:
+                        del buckets[idle_key]
+                bucket = buckets[key] = TokenBucket(rate, burst)
+            return bucket
+
+    def _check(
+        self, buckets: Dict[str, TokenBucket], global_delay: float, max_wait: float
+    ) -> None:
+        delays = {scope: bucket.delay() for scope, bucket in buckets.items()}
+        delays["global"] = global_delay
+        scope = max(delays, key=delays.get)
+        if delays[scope] > max_wait:
+            _RATE_LIMIT_REJECTED.inc(limiter=self.name, scope=scope)
+            raise RateLimitedError(scope, delays[scope])
+
+    def check(self, client: str, max_wait: float) -> None:
+        """
+        Reject a client upfront if its next operation would wait longer than `max_wait` seconds.
+
+        Raises:
+            RateLimitedError: If the client's bucket, or the global queue, is backed up for longer.
+        """
+        bucket = self._bucket("client", client)
+        buckets = {"client": bucket} if bucket is not None else {}
+        self._check(buckets, self._queue().delay(""), max_wait)
+
+    async def acquire(
+        self, key: str, client: str = "", max_wait: Optional[float] = None
+    ) -> float:
+        """
+        Wait for a token for an operation of `key` (e.g. a namespace) from `client`, returning the time
+        waited.
+
+        Raises:
+            RateLimitedError: If the operation would wait longer than `max_wait` seconds.
+        """
+        start = time.perf_counter()
+        queue = self._queue()
+        buckets = {
+            scope: bucket
+            for scope, bucket in (
+                ("namespace", self._bucket("namespace", key)),
+                ("client", self._bucket("client", client)),
+            )
+            if bucket is not None
+        }
+        if max_wait is not None:
+            self._check(buckets, queue.delay(key), max_wait)
+
+        delay = max((bucket.reserve() for bucket in buckets.values()), default=0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.bucket.rate > 0:
+            await queue.take(key)
+        waited = time.perf_counter() - start
+        _RATE_LIMIT_WAIT.observe(waited, limiter=self.name)
+        return waited
+
+    def _collect_metrics(self) -> None:
+        _RATE_LIMIT_TOKENS.set(self.bucket.available(), limiter=self.name)
+        with self._lock:
+            for scope, buckets in self._buckets.items():
+                _RATE_LIMIT_KEYS.set(len(buckets), limiter=self.name, scope=scope)
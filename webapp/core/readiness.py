@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from core import metrics
+from core.informer import Informer
+
+_LOGGER = logging.getLogger(__name__)
+
+_WAITERS = metrics.gauge(
+    "keip_route_waiters", "Requests waiting for their IntegrationRoutes to become ready"
+)
+_WAITS = metrics.counter(
+    "keip_route_waits_total",
+    "Finished waits for IntegrationRoutes to become ready, by outcome",
+    ("outcome",),
+)
+
+# The condition `core.sync` sets on an IntegrationRoute once all of its replicas are ready
+READY_CONDITION = "Ready"
+
+_Key = Tuple[str, str]
+
+
+def _ready_condition(obj: Mapping) -> Mapping:
+    conditions = (obj.get("status") or {}).get("conditions") or []
+    return next((c for c in conditions if c.get("type") == READY_CONDITION), {})
+
+
+def is_ready(obj: Mapping) -> bool:
+    """Whether an IntegrationRoute's 'Ready' condition is true for its current generation."""
+    condition = _ready_condition(obj)
+    generation = obj["metadata"].get("generation")
+    return (
+        condition.get("status") == "True"
+        and condition.get("observedGeneration") == generation
+    )
+
+
+def route_status(obj: Mapping) -> dict:
+    """An IntegrationRoute's replicas and 'Ready' condition, as reported to the clients waiting on it."""
+    metadata = obj["metadata"]
+    status = obj.get("status") or {}
+    condition = _ready_condition(obj)
+    return {
+        "name": metadata["name"],
+        "namespace": metadata.get("namespace", ""),
+        "expectedReplicas": status.get("expectedReplicas"),
+        "readyReplicas": status.get("readyReplicas", 0),
+        "runningReplicas": status.get("runningReplicas", 0),
+        "ready": is_ready(obj),
+        "reason": condition.get("reason"),
+        "message": condition.get("message"),
+    }
+
+
+class ReadinessWaiter:
+    """
+    Waits for IntegrationRoutes to become ready off an informer, so that any number of waiters share its
+    watch instead of polling the API server.
+
+    A route is `track`ed before it is written and `expect`ed once it was. A route that was written only
+    counts once the informer holds a newer version of it than it did before the write, so that the status
+    of the version it replaced isn't mistaken for its own. The waiter must be used as a context manager,
+    on the event loop it is waited on.
+    """
+
+    def __init__(self, informer: Informer) -> None:
+        self._informer = informer
+        self._loop = asyncio.get_running_loop()
+        self._changed: asyncio.Queue = asyncio.Queue()
+        # The resourceVersion held before each route was written, and the one its status can't come from
+        self._before: Dict[_Key, Optional[str]] = {}
+        self._expected: Dict[_Key, Optional[str]] = {}
+        self._reported: Dict[_Key, dict] = {}
+
+    def __enter__(self) -> "ReadinessWaiter":
+        self._informer.add_listener(self._on_change)
+        _WAITERS.inc()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._informer.remove_listener(self._on_change)
+        _WAITERS.dec()
+
+    def _on_change(self, event_type: str, obj: dict) -> None:
+        # Called on the informer's thread
+        metadata = obj["metadata"]
+        key = (metadata.get("namespace", ""), metadata["name"])
+        if key in self._before:
+            self._loop.call_soon_threadsafe(self._changed.put_nowait, key)
+
+    def _version(self, key: _Key) -> Optional[str]:
+        obj = self._informer.store.get(*key)
+        return obj["metadata"].get("resourceVersion") if obj else None
+
+    def track(self, namespace: str, name: str) -> None:
+        """Note the version of a route held before it is written."""
+        key = (namespace, name)
+        self._before[key] = self._version(key)
+
+    def expect(self, namespace: str, name: str, written: bool) -> None:
+        """Wait for a route that was deployed, `written` unless its IntegrationRoute was unchanged."""
+        key = (namespace, name)
+        self._expected[key] = self._before.get(key) if written else None
+
+    @property
+    def ready(self) -> List[_Key]:
+        return [
+            key
+            for key in self._expected
+            if self._reported.get(key, {}).get("ready", False)
+        ]
+
+    @property
+    def done(self) -> bool:
+        return len(self.ready) == len(self._expected)
+
+    def _status(self, key: _Key) -> Optional[dict]:
+        if key not in self._expected:
+            return None
+        obj = self._informer.store.get(*key)
+        if obj is None or obj["metadata"].get("resourceVersion") == self._expected[key]:
+            return None
+        return route_status(obj)
+
+    async def transitions(self, timeout: float) -> AsyncIterator[dict]:
+        """
+        Yield the status of each expected route, starting with its current one, whenever its replicas or
+        readiness change, until every expected route is ready or `timeout` seconds have passed.
+        """
+        deadline = time.monotonic() + timeout
+        for key in self._expected:
+            self._changed.put_nowait(key)
+        while not self.done:
+            try:
+                key = await asyncio.wait_for(
+                    self._changed.get(), deadline - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                break
+            status = self._status(key)
+            if status is not None and status != self._reported.get(key):
+                self._reported[key] = status
+                yield status
+        outcome = "ready" if self.done else "timed_out"
+        _WAITS.inc(outcome=outcome)
+        if not self.done:
+            _LOGGER.info(
+                "Timed out waiting for %d of %d route(s) to become ready",
+                len(self._expected) - len(self.ready),
+                len(self._expected),
+            )
+
+    def summary(self) -> dict:
+        ready = set(self.ready)
+        return {
+            "total": len(self._expected),
+            "ready": len(ready),
+            "not_ready": [
+                {"name": name, "namespace": namespace}
+                for namespace, name in self._expected
+                if (namespace, name) not in ready
+            ],
+            "timed_out": not self.done,
+        }
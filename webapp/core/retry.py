@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from core import metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRIES = metrics.counter(
+    "keip_retries_total",
+    "Failed calls that were retried, by operation and the reason they failed",
+    ("operation", "reason"),
+)
+_EXHAUSTED = metrics.counter(
+    "keip_retries_exhausted_total",
+    "Calls that kept failing with retryable errors until their attempts or deadline ran out",
+    ("operation",),
+)
+
+# The deadline of the retried call in progress, so that its requests can cap their own timeouts
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "retry_deadline", default=None
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Up to `max_attempts` attempts of a call, all within `deadline` seconds of the first. Retries are spaced
+    by exponential backoff from `base_delay` up to `max_delay`, with full jitter so that callers failing
+    together don't retry together.
+    """
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    deadline: float
+
+    def backoff(self, retry: int) -> float:
+        """A random delay before the `retry`-th retry (starting at 1)."""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        )
+
+
+@dataclass(frozen=True)
+class Attempt:
+    """An attempt of a retried call: its number (starting at 1) and the error the previous attempt raised."""
+
+    number: int
+    error: Optional[Exception] = None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """The delay a 'Retry-After' header asks for, given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline of the retried call in progress, if any."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _start(policy: RetryPolicy) -> contextvars.Token:
+    deadline = time.monotonic() + policy.deadline
+    outer = _deadline.get()
+    # A retried call within another can't outlive it
+    return _deadline.set(deadline if outer is None else min(outer, deadline))
+
+
+def _next_delay(
+    policy: RetryPolicy,
+    operation: str,
+    attempt: Attempt,
+    error: Exception,
+    classify: Callable[[Exception], Optional[str]],
+    retry_after: Callable[[Exception], Optional[float]],
+) -> Optional[float]:
+    """How long to wait before retrying after `error`, or None if it must be raised."""
+    reason = classify(error)
+    if reason is None:
+        return None
+    delay = retry_after(error)
+    if delay is None:
+        delay = policy.backoff(attempt.number)
+    if attempt.number >= policy.max_attempts or delay >= remaining():
+        if policy.max_attempts > 1:
+            _EXHAUSTED.inc(operation=operation)
+        return None
+    _RETRIES.inc(operation=operation, reason=reason)
+    _LOGGER.warning(
+        "Attempt %d of '%s' failed (%s), retrying in %.2fs: %s",
+        attempt.number,
+        operation,
+        reason,
+        delay,
+        error,
+    )
+    return delay
+
+
+def call(
+    func: Callable[[Attempt], T],
+    policy: RetryPolicy,
+    operation: str,
+    classify: Callable[[Exception], Optional[str]],
+    retry_after: Callable[[Exception], Optional[float]] = lambda _: None,
+) -> T:
+    """
+    Call `func` until it succeeds, retrying errors for which `classify` returns a reason (used to label the
+    retry metrics) as long as the policy's attempts and deadline allow. A delay given by `retry_after` (e.g.
+    from a 'Retry-After' header) replaces the backoff, unless it would overrun the deadline.
+
+    Raises:
+        Exception: The last error `func` raised, once it is not retried.
+    """
+    token = _start(policy)
+    try:
+        attempt = Attempt(1)
+        while True:
+            try:
+                return func(attempt)
+            except Exception as e:
+                delay = _next_delay(
+                    policy, operation, attempt, e, classify, retry_after
+                )
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt = Attempt(attempt.number + 1, e)
+    finally:
+        _deadline.reset(token)
+
+
+async def call_async(
+    func: Callable[[Attempt], Awaitable[T]],
+    policy: RetryPolicy,
+    operation: str,
+    classify: Callable[[Exception], Optional[str]],
+    retry_after: Callable[[Exception], Optional[float]] = lambda _: None,
+) -> T:
+    """The asyncio equivalent of `call`."""
+    token = _start(policy)
+    try:
+        attempt = Attempt(1)
+        while True:
+            try:
+                return await func(attempt)
+            except Exception as e:
+                delay = _next_delay(
+                    policy, operation, attempt, e, classify, retry_after
+                )
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt = Attempt(attempt.number + 1, e)
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,65 @@
+import base64
+import gzip
+import re
+from typing import Dict, List
+
+ROUTE_FILE = "integrationRoute.xml"
+GZIP_ENCODING = "gzip"
+
+_XML_TOKENS = re.compile(
+    r"<!\[CDATA\[.*?\]\]>"
+    r"|<!--.*?-->"
+    r"|<\?.*?\?>"
+    r"|<!DOCTYPE(?:[^\[>]|\[[^\]]*\])*>"
+    r"|<[^>]*>"
+    r"|[^<]+",
+    re.S,
+)
+
+
+def minify_xml(xml: str) -> str:
+    """
+    Strip comments and indentation (whitespace-only text containing a line break) from an XML document.
+
+    CDATA sections, processing instructions and whitespace on a single line, which may be significant
+    (e.g. `<value> </value>`), are kept as is.
+    """
+    kept = []
+    for token in _XML_TOKENS.findall(xml):
+        if token.startswith("<!--"):
+            continue
+        if not token.startswith("<") and not token.strip() and "\n" in token:
+            continue
+        kept.append(token)
+    return "".join(kept)
+
+
+def chunk_key(index: int) -> str:
+    """The `binaryData` key of a chunk. Keys sort in chunk order, so a shell glob reassembles them."""
+    return f"{ROUTE_FILE}.gz.{index:03d}"
+
+
+def compress_route(xml: str, chunk_bytes: int) -> List[Dict[str, str]]:
+    """
+    Minify and gzip a route, splitting the compressed stream into chunks of at most `chunk_bytes`.
+
+    Returns:
+        List[Dict[str, str]]: The `binaryData` of each ConfigMap holding a chunk, base64 encoded. The
+            output is deterministic, so content digests of unchanged routes stay the same.
+    """
+    compressed = gzip.compress(minify_xml(xml).encode(), compresslevel=9, mtime=0)
+    chunk_bytes = max(chunk_bytes, 1)
+    return [
+        {
+            chunk_key(i): base64.b64encode(
+                compressed[start : start + chunk_bytes]
+            ).decode()
+        }
+        for i, start in enumerate(range(0, len(compressed), chunk_bytes))
+    ]
+
+
+def decompress_route(chunks: List[Dict[str, str]]) -> str:
+    """Reassemble a route from its chunks, as the integration pod's init container does."""
+    parts = sorted((k, v) for chunk in chunks for k, v in chunk.items())
+    return gzip.decompress(b"".join(base64.b64decode(v) for _, v in parts)).decode()
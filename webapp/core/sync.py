@@ -4,6 +4,8 @@ from pathlib import PurePosixPath
 from typing import List, Mapping, Optional, Any
 
 import config as cfg
+from core.route_payload import GZIP_ENCODING, ROUTE_FILE
+from core.tracing import span
 
 SECRETS_ROOT = "/etc/secrets"
 
@@ -11,6 +13,10 @@ TRUSTSTORE_PATH = "/etc/cabundle"
 
 KEYSTORE_PATH = "/etc/keystore"
 
+ROUTE_XML_PATH = "/var/spring/xml"
+
+ROUTE_CHUNKS_PATH = "/var/spring/xml-chunks"
+
 HTTPS_PORT = 8443
 
 HTTP_PORT = 8080
@@ -38,6 +44,8 @@ class VolumeConfig:
         - annotations
         - labels
         - routeConfigMap
+        - routeEncoding
+        - routeConfigMapChunks
         - propSources
         - secretSources
         - configMaps
@@ -50,11 +58,14 @@ class VolumeConfig:
     """
 
     _route_vol_name = "integration-route-config"
+    _route_chunks_vol_name = "integration-route-chunks"
     _tls_truststore_name = "truststore"
     _tls_keystore_name = "keystore"
 
     def __init__(self, parent_spec) -> None:
         self._route_config = parent_spec["routeConfigMap"]
+        self._route_compressed = parent_spec.get("routeEncoding") == GZIP_ENCODING
+        self._route_chunks = parent_spec.get("routeConfigMapChunks", [])
         self._secret_srcs = _normalize_secret_sources(
             parent_spec.get("secretSources", [])
         )
@@ -62,16 +73,57 @@ class VolumeConfig:
         self._config_maps = parent_spec.get("configMaps", [])
         self._tls_config = parent_spec.get("tls")
 
-    def get_volumes(self) -> List[Mapping]:
-        volumes = [
+    def _get_route_volumes(self) -> List[Mapping]:
+        if not self._route_compressed:
+            return [
+                {
+                    "name": self._route_vol_name,
+                    "configMap": {
+                        "name": self._route_config,
+                    },
+                }
+            ]
+
+        # The chunks are projected into a single directory and reassembled into an emptyDir by an init
+        # container, which the integration container mounts in place of the route ConfigMap.
+        return [
+            {"name": self._route_vol_name, "emptyDir": {}},
             {
-                "name": self._route_vol_name,
-                "configMap": {
-                    "name": self._route_config,
+                "name": self._route_chunks_vol_name,
+                "projected": {
+                    "sources": [
+                        {"configMap": {"name": name}}
+                        for name in [self._route_config, *self._route_chunks]
+                    ]
                 },
+            },
+        ]
+
+    def get_init_containers(self) -> List[Mapping]:
+        if not self._route_compressed:
+            return []
+
+        route_file = str(PurePosixPath(ROUTE_XML_PATH, ROUTE_FILE))
+        chunks = str(PurePosixPath(ROUTE_CHUNKS_PATH, f"{ROUTE_FILE}.gz.*"))
+        return [
+            {
+                "name": "route-assembler",
+                "image": cfg.ROUTE_INIT_CONTAINER_IMAGE,
+                "command": ["sh", "-c", f"cat {chunks} | gunzip > {route_file}"],
+                "volumeMounts": [
+                    {
+                        "name": self._route_chunks_vol_name,
+                        "readOnly": True,
+                        "mountPath": ROUTE_CHUNKS_PATH,
+                    },
+                    {"name": self._route_vol_name, "mountPath": ROUTE_XML_PATH},
+                ],
             }
         ]
 
+    def get_volumes(self) -> List[Mapping]:
+        volumes = self._get_route_volumes()
+
         for secret in self._secret_srcs:
             secret_name = secret["name"]
             volumes.append(
@@ -134,7 +186,7 @@ class VolumeConfig:
         volume_mounts = [
             {
                 "name": self._route_vol_name,
-                "mountPath": "/var/spring/xml",
+                "mountPath": ROUTE_XML_PATH,
             }
         ]
 
@@ -383,6 +435,10 @@ def _create_pod_template(parent, labels, integration_image) -> Mapping[str, Any]
         },
     }
 
+    init_containers = vol_config.get_init_containers()
+    if init_containers:
+        pod_template["spec"]["initContainers"] = init_containers
+
     annotations = parent["spec"].get("annotations")
     if annotations:
         pod_template["metadata"]["annotations"] = annotations
@@ -583,8 +639,12 @@ def sync(body) -> Mapping:
     parent = body["parent"]
     curr_children = body["children"]
     # Status can be filled in with useful about the state of managed children
+    with span("status"):
+        status = _compute_status(parent, curr_children)
+    with span("children"):
+        children = _gen_children(parent)
     desired_state = {
-        "status": _compute_status(parent, curr_children),
-        "children": _gen_children(parent),
+        "status": status,
+        "children": children,
     }
     return desired_state
@@ -0,0 +1,926 @@
+"""
+An in-process stand-in for the Kubernetes API server, serving ConfigMaps and keip IntegrationRoutes over
+real HTTP so `core.k8s_client` can be exercised (and benchmarked) end to end without a cluster.
+
+Supports get, list (field/label selectors and pagination), create, replace, patch (merge, JSON patch and
+server-side apply), delete, deletecollection and watch (with bookmarks), plus configurable latency,
+error injection and client throttling.
+"""
+
+import base64
+import copy
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+ROUTE_GROUP = "keip.codice.org"
+
+
+@dataclass(frozen=True)
+class _Kind:
+    plural: str
+    kind: str
+    api_version: str
+
+
+_CONFIGMAP = _Kind("configmaps", "ConfigMap", "v1")
+_ROUTE = _Kind("integrationroutes", "IntegrationRoute", f"{ROUTE_GROUP}/v1alpha2")
+
+_CORE_PATH = re.compile(
+    r"^/api/v1(?:/namespaces/(?P<ns>[^/]+))?/(?P<plural>configmaps)(?:/(?P<name>[^/]+))?$"
+)
+_ROUTE_PATH = re.compile(
+    rf"^/apis/{re.escape(ROUTE_GROUP)}/(?P<version>[^/]+)(?:/namespaces/(?P<ns>[^/]+))?/(?P<plural>integrationroutes)(?:/(?P<name>[^/]+))?$"
+)
+_NAMESPACE_PATH = re.compile(r"^/api/v1/namespaces/(?P<name>[^/]+)$")
+
+_KINDS = {k.plural: k for k in (_CONFIGMAP, _ROUTE)}
+
+# Number of watch events retained; older resourceVersions get '410 Gone'.
+_EVENT_HISTORY = 10_000
+
+
+class ApiError(Exception):
+    def __init__(
+        self,
+        code: int,
+        reason: str,
+        message: str = "",
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        super().__init__(message or reason)
+        self.code = code
+        self.reason = reason
+        self.message = message or reason
+        self.headers = dict(headers or {})
+
+    def status(self) -> dict:
+        return {
+            "kind": "Status",
+            "apiVersion": "v1",
+            "metadata": {},
+            "status": "Failure",
+            "message": self.message,
+            "reason": self.reason,
+            "code": self.code,
+        }
+
+
+@dataclass
+class InjectedFailure:
+    code: int
+    retry_after: Optional[int] = None
+    methods: Optional[Tuple[str, ...]] = None
+
+
+@dataclass
+class _StoredObject:
+    obj: dict
+    # Server-side apply field ownership: leaf path -> field manager
+    owners: Dict[Tuple[str, ...], str] = field(default_factory=dict)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _split_selector(selector: str) -> List[str]:
+    """Split a selector on commas that are not inside an 'in (...)' set."""
+    parts, depth, current = [], 0, ""
+    for ch in selector:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def label_selector_matches(selector: Optional[str], labels: Mapping[str, str]) -> bool:
+    if not selector:
+        return True
+    for req in _split_selector(selector):
+        if m := re.match(r"^(\S+)\s+(in|notin)\s+\((.*)\)$", req):
+            key, op, values = (
+                m.group(1),
+                m.group(2),
+                {v.strip() for v in m.group(3).split(",")},
+            )
+            matched = labels.get(key) in values
+            if (op == "in") != matched:
+                return False
+        elif "!=" in req:
+            key, value = req.split("!=", 1)
+            if labels.get(key.strip()) == value.strip():
+                return False
+        elif "=" in req:
+            key, value = re.split(r"==?", req, maxsplit=1)
+            if labels.get(key.strip()) != value.strip():
+                return False
+        elif req.startswith("!"):
+            if req[1:].strip() in labels:
+                return False
+        elif req not in labels:
+            return False
+    return True
+
+
+def field_selector_matches(selector: Optional[str], obj: Mapping) -> bool:
+    if not selector:
+        return True
+    for req in _split_selector(selector):
+        negate = "!=" in req
+        key, value = re.split(r"!=|==?", req, maxsplit=1)
+        actual: Any = obj
+        for part in key.strip().split("."):
+            actual = actual.get(part) if isinstance(actual, Mapping) else None
+        if (actual == value.strip()) == negate:
+            return False
+    return True
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """RFC 7386 JSON merge patch. Strategic merge patches are treated the same way."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def _json_pointer(path: str) -> List[str]:
+    return [p.replace("~1", "/").replace("~0", "~") for p in path.split("/")[1:]]
+
+
+def json_patch(target: dict, ops: List[Mapping]) -> dict:
+    """RFC 6902 JSON patch, supporting the add/replace/remove/test operations."""
+    result = copy.deepcopy(target)
+    for op in ops:
+        *parents, last = _json_pointer(op["path"])
+        node = result
+        for p in parents:
+            node = node[int(p)] if isinstance(node, list) else node.setdefault(p, {})
+        if op["op"] == "test":
+            current = node[int(last)] if isinstance(node, list) else node.get(last)
+            if current != op["value"]:
+                raise ApiError(422, "Invalid", f"test operation failed at {op['path']}")
+        elif op["op"] == "remove":
+            if isinstance(node, list):
+                node.pop(int(last))
+            else:
+                node.pop(last)
+        elif op["op"] in ("add", "replace"):
+            if isinstance(node, list):
+                if last == "-":
+                    node.append(op["value"])
+                elif op["op"] == "add":
+                    node.insert(int(last), op["value"])
+                else:
+                    node[int(last)] = op["value"]
+            else:
+                node[last] = op["value"]
+        else:
+            raise ApiError(422, "Invalid", f"Unsupported JSON patch op: {op['op']}")
+    return result
+
+
+def _leaf_paths(value: Any, prefix: Tuple[str, ...] = ()) -> Dict[Tuple[str, ...], Any]:
+    if isinstance(value, dict) and value:
+        leaves = {}
+        for k, v in value.items():
+            leaves.update(_leaf_paths(v, prefix + (k,)))
+        return leaves
+    return {prefix: value}
+
+
+def _get_path(obj: Any, path: Tuple[str, ...]) -> Any:
+    for p in path:
+        if not isinstance(obj, dict) or p not in obj:
+            return None
+        obj = obj[p]
+    return obj
+
+
+class _HttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops connections when many clients connect at once
+    request_queue_size = 256
+
+
+class FakeApiServer:
+    """
+    Serves a subset of the Kubernetes REST API from an in-memory store on a background thread.
+
+    Fault injection knobs can be changed while the server is running:
+        latency:        seconds added before handling every request (plus up to `latency_jitter`)
+        error_rates:    {status code: probability} of failing a mutating request with that status
+        max_qps/burst:  client-side throttling, excess requests get '429' with an accurate Retry-After
+        fail_next():    script the next N responses to fail with a given status
+    """
+
+    def __init__(
+        self,
+        namespaces: Tuple[str, ...] = ("default",),
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rates: Optional[Mapping[int, float]] = None,
+        max_qps: float = 0.0,
+        burst: int = 1,
+        bookmark_interval: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        self.namespaces = set(namespaces)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rates = dict(error_rates or {})
+        self.max_qps = max_qps
+        self.burst = burst
+        self.bookmark_interval = bookmark_interval
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Condition()
+        self._store: Dict[Tuple[str, str, str], _StoredObject] = {}
+        self._rv = 0
+        self._events: List[Tuple[int, str, str, dict]] = []
+        self._failures: List[InjectedFailure] = []
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._closed = False
+
+        self.request_log: List[Tuple[str, str]] = []
+
+        self._httpd = _HttpServer(("127.0.0.1", 0), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    # -- lifecycle --------------------------------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeApiServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="fake-apiserver",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeApiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def write_kubeconfig(self, path: str) -> str:
+        kubeconfig = {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [{"name": "fake", "cluster": {"server": self.url}}],
+            "users": [{"name": "fake", "user": {"token": "fake-token"}}],
+            "contexts": [
+                {"name": "fake", "context": {"cluster": "fake", "user": "fake"}}
+            ],
+            "current-context": "fake",
+        }
+        with open(path, "w") as f:
+            yaml.safe_dump(kubeconfig, f)
+        return path
+
+    # -- test helpers -----------------------------------------------------------------------------
+
+    def fail_next(
+        self,
+        code: int,
+        times: int = 1,
+        retry_after: Optional[int] = None,
+        methods: Optional[Tuple[str, ...]] = None,
+    ) -> None:
+        with self._lock:
+            self._failures.extend(
+                InjectedFailure(code, retry_after, methods) for _ in range(times)
+            )
+
+    def request_count(self, method: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for m, _ in self.request_log if method in (None, m))
+
+    def reset_request_log(self) -> None:
+        with self._lock:
+            self.request_log.clear()
+
+    def get_object(self, plural: str, namespace: str, name: str) -> Optional[dict]:
+        with self._lock:
+            stored = self._store.get((plural, namespace, name))
+            return copy.deepcopy(stored.obj) if stored else None
+
+    def objects(self, plural: str) -> List[dict]:
+        with self._lock:
+            return [
+                copy.deepcopy(s.obj)
+                for (p, _, _), s in self._store.items()
+                if p == plural
+            ]
+
+    def set_status(self, plural: str, namespace: str, name: str, status: dict) -> dict:
+        """Update an object's status as a controller would, emitting a MODIFIED watch event."""
+        with self._lock:
+            stored = self._store[(plural, namespace, name)]
+            stored.obj["status"] = copy.deepcopy(status)
+            return self._commit(plural, "MODIFIED", stored.obj)
+
+    # -- store ------------------------------------------------------------------------------------
+
+    def _commit(self, plural: str, event_type: str, obj: dict) -> dict:
+        """Bump the resourceVersion and record a watch event. Caller must hold the lock."""
+        self._rv += 1
+        obj["metadata"]["resourceVersion"] = str(self._rv)
+        self._events.append((self._rv, plural, event_type, copy.deepcopy(obj)))
+        if len(self._events) > _EVENT_HISTORY:
+            del self._events[: len(self._events) - _EVENT_HISTORY]
+        self._lock.notify_all()
+        return copy.deepcopy(obj)
+
+    def _require_namespace(self, namespace: str) -> None:
+        if namespace not in self.namespaces:
+            raise ApiError(404, "NotFound", f'namespaces "{namespace}" not found')
+
+    def _new_object(self, kind: _Kind, namespace: str, body: dict) -> dict:
+        obj = copy.deepcopy(body)
+        obj["apiVersion"] = obj.get("apiVersion", kind.api_version)
+        obj["kind"] = kind.kind
+        metadata = obj.setdefault("metadata", {})
+        metadata["namespace"] = namespace
+        metadata.pop("resourceVersion", None)
+        metadata["uid"] = str(uuid.uuid4())
+        metadata["creationTimestamp"] = _now()
+        metadata["generation"] = 1
+        return obj
+
+    def _apply_update(self, stored: _StoredObject, updated: dict) -> dict:
+        """Replace a stored object's content, keeping server-managed metadata."""
+        current = stored.obj
+        metadata = updated.setdefault("metadata", {})
+        for key in ("uid", "creationTimestamp", "namespace", "name"):
+            metadata[key] = current["metadata"][key]
+        metadata["generation"] = current["metadata"]["generation"] + (
+            1 if updated.get("spec") != current.get("spec") else 0
+        )
+        if "status" in current and "status" not in updated:
+            updated["status"] = current["status"]
+        updated["kind"] = current["kind"]
+        updated["apiVersion"] = current["apiVersion"]
+        stored.obj = updated
+        return updated
+
+    def _check_precondition(self, stored: _StoredObject, body: Mapping) -> None:
+        expected = body.get("metadata", {}).get("resourceVersion")
+        if expected and expected != stored.obj["metadata"]["resourceVersion"]:
+            raise ApiError(
+                409,
+                "Conflict",
+                f'Operation cannot be fulfilled on {stored.obj["kind"]} "{stored.obj["metadata"]["name"]}": '
+                "the object has been modified; please apply your changes to the latest version and try again",
+            )
+
+    def get(
+        self, kind: _Kind, namespace: str, name: str, metadata_only: bool = False
+    ) -> dict:
+        """With `metadata_only`, returns the object's metadata like a PartialObjectMetadata."""
+        with self._lock:
+            stored = self._store.get((kind.plural, namespace, name))
+            if not stored:
+                raise ApiError(404, "NotFound", f'{kind.plural} "{name}" not found')
+            if metadata_only:
+                return {
+                    "apiVersion": "meta.k8s.io/v1",
+                    "kind": "PartialObjectMetadata",
+                    "metadata": copy.deepcopy(stored.obj["metadata"]),
+                }
+            return copy.deepcopy(stored.obj)
+
+    def list(
+        self,
+        kind: _Kind,
+        namespace: Optional[str],
+        query: Mapping[str, str],
+        metadata_only: bool = False,
+    ) -> dict:
+        """With `metadata_only`, lists the items' metadata like a PartialObjectMetadataList."""
+        limit = int(query.get("limit", 0) or 0)
+        after: Optional[List[str]] = None
+        if token := query.get("continue"):
+            try:
+                after = json.loads(base64.urlsafe_b64decode(token))["after"]
+            except (ValueError, KeyError):
+                raise ApiError(400, "BadRequest", "invalid continue token")
+
+        with self._lock:
+            items = sorted(
+                (
+                    s.obj
+                    for (p, ns, _), s in self._store.items()
+                    if p == kind.plural
+                    and namespace in (None, ns)
+                    and label_selector_matches(
+                        query.get("labelSelector"),
+                        s.obj["metadata"].get("labels") or {},
+                    )
+                    and field_selector_matches(query.get("fieldSelector"), s.obj)
+                ),
+                key=lambda o: (o["metadata"]["namespace"], o["metadata"]["name"]),
+            )
+            if after is not None:
+                items = [
+                    o
+                    for o in items
+                    if [o["metadata"]["namespace"], o["metadata"]["name"]] > after
+                ]
+            metadata: Dict[str, Any] = {"resourceVersion": str(self._rv)}
+            if limit and len(items) > limit:
+                last = items[limit - 1]["metadata"]
+                metadata["continue"] = base64.urlsafe_b64encode(
+                    json.dumps({"after": [last["namespace"], last["name"]]}).encode()
+                ).decode()
+                metadata["remainingItemCount"] = len(items) - limit
+                items = items[:limit]
+
+            if metadata_only:
+                return {
+                    "apiVersion": "meta.k8s.io/v1",
+                    "kind": "PartialObjectMetadataList",
+                    "metadata": metadata,
+                    "items": [
+                        {
+                            "apiVersion": "meta.k8s.io/v1",
+                            "kind": "PartialObjectMetadata",
+                            "metadata": copy.deepcopy(o["metadata"]),
+                        }
+                        for o in items
+                    ],
+                }
+            return {
+                "apiVersion": kind.api_version,
+                "kind": f"{kind.kind}List",
+                "metadata": metadata,
+                "items": copy.deepcopy(items),
+            }
+
+    def create(self, kind: _Kind, namespace: str, body: dict) -> dict:
+        name = body.get("metadata", {}).get("name")
+        if not name:
+            raise ApiError(422, "Invalid", "metadata.name: Required value")
+        with self._lock:
+            self._require_namespace(namespace)
+            key = (kind.plural, namespace, name)
+            if key in self._store:
+                raise ApiError(
+                    409, "AlreadyExists", f'{kind.plural} "{name}" already exists'
+                )
+            obj = self._new_object(kind, namespace, body)
+            self._store[key] = _StoredObject(obj)
+            return self._commit(kind.plural, "ADDED", obj)
+
+    def replace(self, kind: _Kind, namespace: str, name: str, body: dict) -> dict:
+        with self._lock:
+            stored = self._store.get((kind.plural, namespace, name))
+            if not stored:
+                raise ApiError(404, "NotFound", f'{kind.plural} "{name}" not found')
+            self._check_precondition(stored, body)
+            updated = self._apply_update(stored, copy.deepcopy(body))
+            return self._commit(kind.plural, "MODIFIED", updated)
+
+    def patch(
+        self,
+        kind: _Kind,
+        namespace: str,
+        name: str,
+        body: Any,
+        content_type: str,
+        query: Mapping[str, str],
+    ) -> Tuple[int, dict]:
+        if content_type == "application/apply-patch+yaml":
+            return self._server_side_apply(kind, namespace, name, body, query)
+
+        with self._lock:
+            stored = self._store.get((kind.plural, namespace, name))
+            if not stored:
+                raise ApiError(404, "NotFound", f'{kind.plural} "{name}" not found')
+            if content_type == "application/json-patch+json":
+                updated = json_patch(stored.obj, body)
+            else:
+                self._check_precondition(stored, body)
+                updated = merge_patch(stored.obj, body)
+            if updated == stored.obj:
+                return 200, copy.deepcopy(stored.obj)
+            updated = self._apply_update(stored, updated)
+            return 200, self._commit(kind.plural, "MODIFIED", updated)
+
+    def _server_side_apply(
+        self,
+        kind: _Kind,
+        namespace: str,
+        name: str,
+        body: dict,
+        query: Mapping[str, str],
+    ) -> Tuple[int, dict]:
+        manager = query.get("fieldManager")
+        if not manager:
+            raise ApiError(
+                422,
+                "Invalid",
+                "PATCH requests with apply content type require fieldManager",
+            )
+        force = str(query.get("force")).lower() == "true"
+        applied = {k: v for k, v in body.items() if k not in ("apiVersion", "kind")}
+        applied.get("metadata", {}).pop("resourceVersion", None)
+        leaves = {
+            path: value
+            for path, value in _leaf_paths(applied).items()
+            if path[:2] != ("metadata", "name")
+        }
+
+        with self._lock:
+            key = (kind.plural, namespace, name)
+            stored = self._store.get(key)
+            if stored is None:
+                self._require_namespace(namespace)
+                obj = self._new_object(kind, namespace, body)
+                obj["metadata"]["name"] = name
+                self._store[key] = _StoredObject(obj, {p: manager for p in leaves})
+                return 201, self._commit(kind.plural, "ADDED", obj)
+
+            self._check_precondition(stored, body)
+            conflicts = [
+                (path, owner)
+                for path, value in leaves.items()
+                if (owner := stored.owners.get(path)) not in (None, manager)
+                and _get_path(stored.obj, path) != value
+            ]
+            if conflicts and not force:
+                details = ", ".join(
+                    f'conflict with "{owner}": .{".".join(path)}'
+                    for path, owner in conflicts
+                )
+                raise ApiError(
+                    409,
+                    "Conflict",
+                    f"Apply failed with {len(conflicts)} conflict(s): {details}",
+                )
+
+            # Fields previously applied by this manager but absent from this apply are removed.
+            updated = copy.deepcopy(stored.obj)
+            for path, owner in list(stored.owners.items()):
+                if owner == manager and path not in leaves:
+                    parent = _get_path(updated, path[:-1])
+                    if isinstance(parent, dict):
+                        parent.pop(path[-1], None)
+                    del stored.owners[path]
+            updated = merge_patch(updated, applied)
+            for path in leaves:
+                stored.owners[path] = manager
+
+            if updated == stored.obj:
+                return 200, copy.deepcopy(stored.obj)
+            updated = self._apply_update(stored, updated)
+            return 200, self._commit(kind.plural, "MODIFIED", updated)
+
+    def delete(self, kind: _Kind, namespace: str, name: str) -> dict:
+        with self._lock:
+            stored = self._store.pop((kind.plural, namespace, name), None)
+            if not stored:
+                raise ApiError(404, "NotFound", f'{kind.plural} "{name}" not found')
+            self._commit(kind.plural, "DELETED", stored.obj)
+            return {"kind": "Status", "apiVersion": "v1", "status": "Success"}
+
+    def delete_collection(
+        self, kind: _Kind, namespace: Optional[str], query: Mapping[str, str]
+    ) -> dict:
+        with self._lock:
+            for item in self.list(kind, namespace, query)["items"]:
+                meta = item["metadata"]
+                stored = self._store.pop((kind.plural, meta["namespace"], meta["name"]))
+                self._commit(kind.plural, "DELETED", stored.obj)
+            return {"kind": "Status", "apiVersion": "v1", "status": "Success"}
+
+    def watch_events(
+        self,
+        kind: _Kind,
+        namespace: Optional[str],
+        query: Mapping[str, str],
+    ):
+        """Yield watch events (as dicts) until the timeout expires or the server stops."""
+        timeout = float(query.get("timeoutSeconds") or 300)
+        bookmarks = str(query.get("allowWatchBookmarks")).lower() == "true"
+        deadline = time.monotonic() + timeout
+        next_bookmark = time.monotonic() + self.bookmark_interval
+
+        with self._lock:
+            since = int(query.get("resourceVersion") or self._rv)
+            if self._events and since < self._events[0][0] - 1:
+                yield {
+                    "type": "ERROR",
+                    "object": ApiError(
+                        410, "Expired", f"too old resource version: {since}"
+                    ).status(),
+                }
+                return
+
+        while True:
+            with self._lock:
+                pending = [
+                    e
+                    for e in self._events
+                    if e[0] > since
+                    and e[1] == kind.plural
+                    and namespace in (None, e[3]["metadata"]["namespace"])
+                    and label_selector_matches(
+                        query.get("labelSelector"), e[3]["metadata"].get("labels") or {}
+                    )
+                    and field_selector_matches(query.get("fieldSelector"), e[3])
+                ]
+                if not pending:
+                    now = time.monotonic()
+                    wait = min(deadline, next_bookmark if bookmarks else deadline) - now
+                    if wait > 0 and not self._closed:
+                        self._lock.wait(wait)
+                    current_rv = self._rv
+                else:
+                    current_rv = pending[-1][0]
+                closed = self._closed
+
+            if closed:
+                return
+            for rv, _, event_type, obj in pending:
+                since = rv
+                yield {"type": event_type, "object": obj}
+            if time.monotonic() >= deadline:
+                return
+            if bookmarks and time.monotonic() >= next_bookmark:
+                since = max(since, current_rv)
+                next_bookmark = time.monotonic() + self.bookmark_interval
+                yield {
+                    "type": "BOOKMARK",
+                    "object": {
+                        "kind": kind.kind,
+                        "apiVersion": kind.api_version,
+                        "metadata": {"resourceVersion": str(since)},
+                    },
+                }
+
+    # -- fault injection --------------------------------------------------------------------------
+
+    def _maybe_fail(self, method: str) -> None:
+        with self._lock:
+            for i, failure in enumerate(self._failures):
+                if failure.methods is None or method in failure.methods:
+                    del self._failures[i]
+                    headers = (
+                        {"Retry-After": str(failure.retry_after)}
+                        if failure.retry_after is not None
+                        else {}
+                    )
+                    raise ApiError(
+                        failure.code,
+                        HTTPStatus(failure.code).phrase.replace(" ", ""),
+                        "injected failure",
+                        headers,
+                    )
+
+            if self.max_qps > 0:
+                now = time.monotonic()
+                self._tokens = min(
+                    float(self.burst),
+                    self._tokens + (now - self._last_refill) * self.max_qps,
+                )
+                self._last_refill = now
+                if self._tokens < 1:
+                    retry_after = math.ceil((1 - self._tokens) / self.max_qps)
+                    raise ApiError(
+                        429,
+                        "TooManyRequests",
+                        "client rate limit exceeded",
+                        {"Retry-After": str(retry_after)},
+                    )
+                self._tokens -= 1
+
+            if method != "GET":
+                for code, rate in self.error_rates.items():
+                    if self._rng.random() < rate:
+                        raise ApiError(
+                            code,
+                            HTTPStatus(code).phrase.replace(" ", ""),
+                            "injected failure",
+                            {"Retry-After": "1"} if code == 429 else {},
+                        )
+
+    def _delay(self) -> None:
+        delay = self.latency
+        if self.latency_jitter:
+            with self._lock:
+                delay += self._rng.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    # -- HTTP -------------------------------------------------------------------------------------
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                self._handle("GET")
+
+            def do_POST(self) -> None:
+                self._handle("POST")
+
+            def do_PUT(self) -> None:
+                self._handle("PUT")
+
+            def do_PATCH(self) -> None:
+                self._handle("PATCH")
+
+            def do_DELETE(self) -> None:
+                self._handle("DELETE")
+
+            def _send_json(
+                self, code: int, body: Any, headers: Optional[Mapping] = None
+            ) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_body(self) -> Any:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if not raw:
+                    return None
+                content_type = self.headers.get("Content-Type", "")
+                try:
+                    return json.loads(raw)
+                except ValueError:
+                    # Apply patches are YAML, though clients (keip included) usually send them as JSON
+                    if "yaml" not in content_type:
+                        raise
+                return yaml.safe_load(raw)
+
+            def _stream_watch(self, events) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for event in events:
+                        line = json.dumps(event).encode() + b"\n"
+                        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+            def _handle(self, method: str) -> None:
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                with server._lock:
+                    server.request_log.append((method, url.path))
+                try:
+                    body = self._read_body()
+                    server._delay()
+                    server._maybe_fail(method)
+                    result = self._route(method, url.path, query, body)
+                except ApiError as e:
+                    self._send_json(e.code, e.status(), e.headers)
+                    return
+                if result is not None:
+                    self._send_json(*result)
+
+            def _route(self, method, path, query, body):
+                if path in ("/api/v1", "/api/v1/") and method == "GET":
+                    return 200, {
+                        "kind": "APIResourceList",
+                        "groupVersion": "v1",
+                        "resources": [
+                            {
+                                "name": "configmaps",
+                                "namespaced": True,
+                                "kind": "ConfigMap",
+                                "singularName": "configmap",
+                                "verbs": [
+                                    "create",
+                                    "delete",
+                                    "deletecollection",
+                                    "get",
+                                    "list",
+                                    "patch",
+                                    "update",
+                                    "watch",
+                                ],
+                            },
+                            {
+                                "name": "namespaces",
+                                "namespaced": False,
+                                "kind": "Namespace",
+                                "singularName": "namespace",
+                                "verbs": ["get", "list"],
+                            },
+                        ],
+                    }
+
+                if (m := _NAMESPACE_PATH.match(path)) and method == "GET":
+                    name = m.group("name")
+                    if name not in server.namespaces:
+                        raise ApiError(
+                            404, "NotFound", f'namespaces "{name}" not found'
+                        )
+                    return 200, {
+                        "apiVersion": "v1",
+                        "kind": "Namespace",
+                        "metadata": {"name": name},
+                        "status": {"phase": "Active"},
+                    }
+
+                m = _CORE_PATH.match(path) or _ROUTE_PATH.match(path)
+                if not m:
+                    raise ApiError(404, "NotFound", f"the server could not find {path}")
+                kind = _KINDS[m.group("plural")]
+                namespace, name = m.group("ns"), m.group("name")
+
+                if method == "GET" and name:
+                    accept = self.headers.get("Accept", "")
+                    return 200, server.get(
+                        kind,
+                        namespace,
+                        name,
+                        metadata_only="as=PartialObjectMetadata;" in accept,
+                    )
+                if method == "GET" and str(query.get("watch")).lower() in ("true", "1"):
+                    self._stream_watch(server.watch_events(kind, namespace, query))
+                    return None
+                if method == "GET":
+                    accept = self.headers.get("Accept", "")
+                    return 200, server.list(
+                        kind,
+                        namespace,
+                        query,
+                        metadata_only="as=PartialObjectMetadataList" in accept,
+                    )
+                if method == "POST" and namespace and not name:
+                    return 201, server.create(kind, namespace, body or {})
+                if method == "PUT" and name:
+                    return 200, server.replace(kind, namespace, name, body or {})
+                if method == "PATCH" and name:
+                    content_type = self.headers.get("Content-Type", "").split(";")[0]
+                    return server.patch(
+                        kind, namespace, name, body, content_type, query
+                    )
+                if method == "DELETE" and name:
+                    return 200, server.delete(kind, namespace, name)
+                if method == "DELETE":
+                    return 200, server.delete_collection(kind, namespace, query)
+                raise ApiError(405, "MethodNotAllowed", f"{method} {path}")
+
+        return Handler
@@ -0,0 +1,191 @@
+import gzip
+import io
+import tarfile
+import tracemalloc
+import zipfile
+
+import pytest
+
+from core.archive_stream import (
+    ArchiveStream,
+    ArchiveStreamError,
+    EntryTooLargeError,
+    InflatedTooLargeError,
+)
+
+FILES = {
+    "default/a.xml": b"<beans/>",
+    "other/b.xml": b"<beans>" + b"<bean/>" * 20000 + b"</beans>",
+    "README.md": b"not a route",
+    # Split between the name and prefix fields of a ustar header, or in a GNU or pax header of its own
+    "long-" * 28 + "namespace/route.xml": b"<beans></beans>",
+}
+ROUTES = {path: data for path, data in FILES.items() if path.endswith(".xml")}
+
+
+def _tar(files=FILES, fmt=tarfile.PAX_FORMAT, mode="w"):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode, format=fmt) as tar:
+        for path, data in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class _Unseekable(io.RawIOBase):
+    """Makes zipfile write data descriptors after each entry, as streaming archivers do."""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+
+def _zip(files=FILES, compression=zipfile.ZIP_DEFLATED, streamed=False):
+    out = _Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=compression) as archive:
+        for path, data in files.items():
+            with archive.open(path, "w") as entry:
+                entry.write(data)
+    return (out.buf if streamed else out).getvalue()
+
+
+def _extract(data, chunk_size, max_entry_bytes=1024 * 1024):
+    stream = ArchiveStream(max_entry_bytes, lambda path: path.endswith(".xml"))
+    entries = {}
+    for start in range(0, len(data), chunk_size):
+        for entry in stream.feed(data[start : start + chunk_size]):
+            entries[entry.path] = entry.data
+    stream.close()
+    return entries
+
+
+ARCHIVES = {
+    "ustar": _tar(fmt=tarfile.USTAR_FORMAT),
+    "gnu": _tar(fmt=tarfile.GNU_FORMAT),
+    "pax": _tar(),
+    "tar.gz": _tar(mode="w:gz"),
+    "zip-stored": _zip(compression=zipfile.ZIP_STORED),
+    "zip": _zip(),
+    "zip-streamed": _zip(streamed=True),
+    "zip.gz": gzip.compress(_zip()),
+    # Concatenated gzip members make one stream
+    "tar.gz-members": (
+        lambda tar: gzip.compress(tar[:1000]) + gzip.compress(tar[1000:])
+    )(_tar()),
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 512, 4096, 1 << 20])
+@pytest.mark.parametrize("kind", ARCHIVES)
+def test_extracts_files_across_chunk_boundaries(kind, chunk_size):
+    data = ARCHIVES[kind]
+    if chunk_size == 1 and len(data) > 20000:
+        pytest.skip("Too slow byte by byte")
+
+    assert _extract(data, chunk_size) == ROUTES
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        _tar({"default/a.xml": b"x" * 2048}),
+        _zip({"default/a.xml": b"x" * 2048}),
+        _zip({"default/a.xml": b"x" * 2048}, streamed=True),
+    ],
+    ids=["tar", "zip", "zip-streamed"],
+)
+def test_rejects_selected_files_too_large(data):
+    with pytest.raises(EntryTooLargeError):
+        _extract(data, 4096, max_entry_bytes=1024)
+
+
+def test_skips_other_files_whatever_their_size():
+    files = {"big.bin": b"x" * 4096, "default/a.xml": b"<beans/>"}
+
+    for data in (_tar(files), _zip(files), _zip(files, streamed=True)):
+        assert _extract(data, 512, max_entry_bytes=1024) == {
+            "default/a.xml": b"<beans/>"
+        }
+
+
+def test_memory_is_bounded_by_a_file():
+    # 64 MiB of routes inflated out of a single small chunk
+    route = b"<beans>" + b" " * (1024 * 1024) + b"</beans>"
+    data = gzip.compress(_tar({f"default/r{i}.xml": route for i in range(64)}))
+    stream = ArchiveStream(2 * len(route))
+
+    tracemalloc.start()
+    try:
+        count = 0
+        for entry in stream.feed(data):
+            count += 1
+            del entry
+        stream.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert count == 64
+    assert peak < 8 * len(route)
+
+
+BOMB = {"big.bin": b"\0" * (1024 * 1024), "default/a.xml": b"<beans/>"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [_tar(BOMB, mode="w:gz"), _zip(BOMB), _zip(BOMB, streamed=True)],
+    ids=["tar.gz", "zip", "zip-streamed"],
+)
+def test_rejects_archives_inflating_too_much(data):
+    # Whether or not the inflated files are selected
+    stream = ArchiveStream(1024, lambda path: path.endswith(".xml"), 512 * 1024)
+
+    with pytest.raises(InflatedTooLargeError):
+        for _ in stream.feed(data):
+            pass
+
+
+def test_counts_inflated_bytes_across_layers():
+    data = gzip.compress(_zip({"default/a.xml": b" " * 4096}))
+    inflated = len(_zip({"default/a.xml": b" " * 4096})) + 4096
+
+    stream = ArchiveStream(8192, max_inflated_bytes=inflated)
+    assert [e.path for e in stream.feed(data)] == ["default/a.xml"]
+    stream.close()
+
+    with pytest.raises(InflatedTooLargeError):
+        list(ArchiveStream(8192, max_inflated_bytes=inflated - 1).feed(data))
+
+
+def _truncated(data):
+    return data[: len(data) // 2]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        _truncated(_tar()),
+        _truncated(_zip()),
+        _truncated(gzip.compress(_tar())),
+        b"<beans/>" * 100,
+        b"PK\x03",
+        _zip(compression=zipfile.ZIP_STORED).replace(b"<beans/>", b"<BEANS/>", 1),
+    ],
+    ids=["truncated-tar", "truncated-zip", "truncated-gzip", "xml", "short", "crc"],
+)
+def test_rejects_malformed_archives(data):
+    with pytest.raises(ArchiveStreamError):
+        _extract(data, 512)
+
+
+def test_empty_archives():
+    assert _extract(_tar({}), 512) == {}
+    assert _extract(_zip({}), 512) == {}
+    assert _extract(b"", 512) == {}
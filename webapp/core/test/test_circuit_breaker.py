@@ -0,0 +1,89 @@
+import pytest
+
+from core.circuit_breaker import CircuitBreaker, CircuitState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=10.0, clock=clock)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_half_open_allows_single_probe(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 10.0
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes_circuit(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_circuit(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitState.OPEN
+    clock.now = 19.0
+    assert not breaker.allow_request()
+    clock.now = 20.0
+    assert breaker.allow_request()
+
+
+def test_released_probe_lets_another_through(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow_request()
+
+    breaker.release_probe()
+
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
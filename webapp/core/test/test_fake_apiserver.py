@@ -0,0 +1,705 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+import core.k8s_client as k8s_client
+from core.metrics import REGISTRY
+from core.rate_limit import TokenBucket
+from core.route_payload import decompress_route, minify_xml
+from core.test.fake_apiserver import label_selector_matches
+from models import RouteData, Status
+
+ROUTE_ARGS = dict(
+    group="keip.codice.org", version="v1alpha2", plural="integrationroutes"
+)
+
+
+def _route_data(name="my-route", namespace="default", xml="<beans/>"):
+    return RouteData(route_name=name, namespace=namespace, route_xml=xml)
+
+
+def _api():
+    k8s_client._ensure_configured()
+    return k8s_client.v1, k8s_client.routeApi
+
+
+def test_create_route_resources_against_fake_api(fake_api):
+    cm, route = k8s_client.create_route_resources(_route_data())
+
+    assert (cm.status, route.status) == (Status.CREATED, Status.CREATED)
+    stored_cm = fake_api.get_object("configmaps", "default", "my-route-cm")
+    assert stored_cm["data"] == {"integrationRoute.xml": "<beans/>"}
+    stored_route = fake_api.get_object("integrationroutes", "default", "my-route")
+    assert stored_route["spec"] == {"routeConfigMap": "my-route-cm"}
+
+    cm, route = k8s_client.create_route_resources(_route_data(xml="<beans></beans>"))
+
+    # The IntegrationRoute's spec did not change, so it is not written again
+    assert (cm.status, route.status) == (Status.UPDATED, Status.UNCHANGED)
+    stored_cm = fake_api.get_object("configmaps", "default", "my-route-cm")
+    assert stored_cm["data"] == {"integrationRoute.xml": "<beans></beans>"}
+
+
+def test_create_in_missing_namespace_fails(fake_api):
+    with pytest.raises(ApiException) as e:
+        k8s_client.create_route_resources(_route_data(namespace="missing"))
+
+    assert e.value.status == 404
+
+
+def test_list_selectors_and_pagination(fake_api):
+    v1, _ = _api()
+    for i in range(5):
+        v1.create_namespaced_config_map(
+            "default",
+            {
+                "metadata": {
+                    "name": f"cm-{i}",
+                    "labels": {"app": "keip" if i % 2 == 0 else "other"},
+                }
+            },
+        )
+    v1.create_namespaced_config_map("other", {"metadata": {"name": "cm-0"}})
+
+    by_name = v1.list_namespaced_config_map(
+        "default", field_selector="metadata.name=cm-3"
+    )
+    assert [c.metadata.name for c in by_name.items] == ["cm-3"]
+
+    by_label = v1.list_namespaced_config_map("default", label_selector="app=keip")
+    assert [c.metadata.name for c in by_label.items] == ["cm-0", "cm-2", "cm-4"]
+
+    all_ns = v1.list_config_map_for_all_namespaces(field_selector="metadata.name=cm-0")
+    assert sorted(c.metadata.namespace for c in all_ns.items) == ["default", "other"]
+
+    names, token = [], None
+    while True:
+        page = v1.list_namespaced_config_map("default", limit=2, _continue=token)
+        names += [c.metadata.name for c in page.items]
+        token = page.metadata._continue
+        if not token:
+            break
+    assert names == [f"cm-{i}" for i in range(5)]
+
+
+def test_list_metadata_only(fake_api):
+    v1, _ = _api()
+    v1.create_namespaced_config_map(
+        "default", {"metadata": {"name": "cm"}, "data": {"a": "1"}}
+    )
+
+    page = v1.api_client.call_api(
+        "/api/v1/namespaces/default/configmaps",
+        "GET",
+        header_params={"Accept": k8s_client.METADATA_LIST_ACCEPT},
+        response_type="object",
+        _return_http_data_only=True,
+    )
+
+    assert page["kind"] == "PartialObjectMetadataList"
+    [item] = page["items"]
+    assert item["metadata"]["name"] == "cm"
+    assert "data" not in item
+
+
+def test_get_metadata_only(fake_api):
+    v1, _ = _api()
+    v1.create_namespaced_config_map(
+        "default", {"metadata": {"name": "cm"}, "data": {"a": "1"}}
+    )
+
+    obj = v1.api_client.call_api(
+        "/api/v1/namespaces/default/configmaps/cm",
+        "GET",
+        header_params={"Accept": k8s_client.METADATA_ACCEPT},
+        response_type="object",
+        _return_http_data_only=True,
+    )
+
+    assert obj["kind"] == "PartialObjectMetadata"
+    assert obj["metadata"]["name"] == "cm"
+    assert "data" not in obj
+
+
+def test_replace_with_stale_resource_version_conflicts(fake_api):
+    v1, _ = _api()
+    created = v1.create_namespaced_config_map("default", {"metadata": {"name": "cm"}})
+    v1.replace_namespaced_config_map(
+        "cm", "default", {"metadata": {"name": "cm"}, "data": {"a": "1"}}
+    )
+
+    stale = {
+        "metadata": {
+            "name": "cm",
+            "resourceVersion": created.metadata.resource_version,
+        },
+        "data": {"a": "2"},
+    }
+    with pytest.raises(ApiException) as e:
+        v1.replace_namespaced_config_map("cm", "default", stale)
+
+    assert e.value.status == 409
+
+
+def test_patch_custom_object(fake_api):
+    _, route_api = _api()
+    route_api.create_namespaced_custom_object(
+        namespace="default",
+        body={"metadata": {"name": "r"}, "spec": {"routeConfigMap": "a"}},
+        **ROUTE_ARGS,
+    )
+
+    patched = route_api.patch_namespaced_custom_object(
+        namespace="default", name="r", body={"spec": {"replicas": 2}}, **ROUTE_ARGS
+    )
+
+    assert patched["spec"] == {"routeConfigMap": "a", "replicas": 2}
+    assert patched["metadata"]["generation"] == 2
+
+
+def test_server_side_apply(fake_api):
+    k8s_client._ensure_configured()
+    api_client = client.ApiClient()
+
+    def apply(manager, data, force=False):
+        return api_client.call_api(
+            "/api/v1/namespaces/default/configmaps/cm",
+            "PATCH",
+            query_params=[("fieldManager", manager), ("force", str(force).lower())],
+            header_params={"Content-Type": "application/apply-patch+yaml"},
+            body={
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "metadata": {"name": "cm"},
+                "data": data,
+            },
+            response_type="object",
+            _return_http_data_only=False,
+        )
+
+    _, status, _ = apply("keip", {"a": "1"})
+    assert status == 201
+    _, status, _ = apply("keip", {"a": "2"})
+    assert status == 200
+
+    with pytest.raises(ApiException) as e:
+        apply("other", {"a": "3"})
+    assert e.value.status == 409
+
+    body, status, _ = apply("other", {"a": "3"}, force=True)
+    assert status == 200
+    assert body["data"] == {"a": "3"}
+
+
+def test_delete_collection_by_label(fake_api):
+    v1, _ = _api()
+    v1.create_namespaced_config_map(
+        "default", {"metadata": {"name": "a", "labels": {"x": "1"}}}
+    )
+    v1.create_namespaced_config_map("default", {"metadata": {"name": "b"}})
+
+    v1.delete_collection_namespaced_config_map("default", label_selector="x=1")
+
+    assert [o["metadata"]["name"] for o in fake_api.objects("configmaps")] == ["b"]
+
+
+def test_watch_streams_events_and_bookmarks(fake_api):
+    v1, _ = _api()
+    fake_api.bookmark_interval = 0.05
+    rv = v1.list_namespaced_config_map("default").metadata.resource_version
+    events = []
+
+    def consume():
+        w = watch.Watch()
+        for event in w.stream(
+            v1.list_namespaced_config_map,
+            "default",
+            resource_version=rv,
+            allow_watch_bookmarks=True,
+            timeout_seconds=1,
+        ):
+            events.append(event["type"])
+            if event["type"] == "DELETED":
+                w.stop()
+
+    t = threading.Thread(target=consume)
+    t.start()
+    v1.create_namespaced_config_map("default", {"metadata": {"name": "a"}})
+    v1.replace_namespaced_config_map(
+        "a", "default", {"metadata": {"name": "a"}, "data": {"k": "v"}}
+    )
+    v1.delete_namespaced_config_map("a", "default")
+    t.join(timeout=5)
+
+    assert [e for e in events if e != "BOOKMARK"] == ["ADDED", "MODIFIED", "DELETED"]
+
+
+def test_injected_failures_and_throttling(fake_api):
+    # Writes are used here since urllib3 transparently retries idempotent requests that carry Retry-After.
+    v1, _ = _api()
+    fake_api.fail_next(503, retry_after=2)
+
+    with pytest.raises(ApiException) as e:
+        v1.create_namespaced_config_map("default", {"metadata": {"name": "a"}})
+    assert e.value.status == 503
+    assert e.value.headers["Retry-After"] == "2"
+
+    fake_api.max_qps, fake_api.burst = 1, 1
+    fake_api._tokens = 1
+    v1.create_namespaced_config_map("default", {"metadata": {"name": "a"}})
+    with pytest.raises(ApiException) as e:
+        v1.create_namespaced_config_map("default", {"metadata": {"name": "b"}})
+    assert e.value.status == 429
+    assert e.value.headers["Retry-After"] == "1"
+
+
+def test_error_rates_only_affect_writes(fake_api):
+    v1, _ = _api()
+    fake_api.error_rates = {500: 1.0}
+
+    v1.list_namespaced_config_map("default")
+    with pytest.raises(ApiException) as e:
+        v1.create_namespaced_config_map("default", {"metadata": {"name": "a"}})
+    assert e.value.status == 500
+
+
+@pytest.mark.parametrize(
+    "selector, expected",
+    [
+        ("app=keip", True),
+        ("app==keip", True),
+        ("app!=keip", False),
+        ("app", True),
+        ("!app", False),
+        ("app in (keip, other)", True),
+        ("app notin (keip)", False),
+        ("app=keip,tier=web", False),
+    ],
+)
+def test_label_selector_matches(selector, expected):
+    assert label_selector_matches(selector, {"app": "keip"}) == expected
+
+
+def test_create_route_resources_round_trips(fake_api):
+    k8s_client.create_route_resources(_route_data())
+    fake_api.reset_request_log()
+
+    k8s_client.create_route_resources(_route_data(xml="<beans></beans>"))
+
+    # The reachability probe is cached, leaving a digest read per resource and an apply for the changed
+    # ConfigMap only.
+    assert [m for m, _ in fake_api.request_log] == ["GET", "PATCH", "GET"]
+
+
+def test_create_route_resources_skips_unchanged(fake_api):
+    k8s_client.create_route_resources(_route_data())
+    fake_api.reset_request_log()
+
+    cm, route = k8s_client.create_route_resources(_route_data())
+
+    assert (cm.status, route.status) == (Status.UNCHANGED, Status.UNCHANGED)
+    assert fake_api.request_count("PATCH") == 0
+    stored = fake_api.get_object("configmaps", "default", "my-route-cm")
+    assert stored["metadata"]["annotations"][k8s_client.DIGEST_ANNOTATION]
+
+
+def test_create_route_resources_reads_digests_from_informers(fake_api, monkeypatch):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_ENABLED", True)
+    k8s_client._ensure_configured()
+    for informer in k8s_client._informers.values():
+        assert informer.wait_for_sync(5)
+    fake_api.reset_request_log()
+
+    cm, route = k8s_client.create_route_resources(_route_data())
+    deadline = time.monotonic() + 5
+    while (
+        k8s_client.cached_object("IntegrationRoute", "default", "my-route")[1] is None
+    ):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    cm, route = k8s_client.create_route_resources(_route_data())
+
+    assert (cm.status, route.status) == (Status.UNCHANGED, Status.UNCHANGED)
+    assert [m for m, p in fake_api.request_log if "/namespaces/" in p] == [
+        "PATCH",
+        "PATCH",
+    ]
+
+
+def _deploy_batch(routes, use_async):
+    """Deploy routes sharing a snapshot, returning each one's resources or error."""
+    snapshot = k8s_client.BatchSnapshot()
+    if not use_async:
+        results = []
+        for r in routes:
+            try:
+                results.append(k8s_client.create_route_resources(r, snapshot))
+            except ApiException as e:
+                results.append(e)
+        return results
+
+    async def _run():
+        try:
+            return await asyncio.gather(
+                *[k8s_client.create_route_resources_async(r, snapshot) for r in routes],
+                return_exceptions=True,
+            )
+        finally:
+            await k8s_client.close_async_client()
+
+    return asyncio.run(_run())
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_batch_reads_each_namespace_once(fake_api, monkeypatch, use_async):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_PAGE_SIZE", 2)
+    monkeypatch.setattr(k8s_client.cfg, "K8S_BATCH_LIST_MIN_ROUTES", 1)
+    fake_api.namespaces.add("other")
+    routes = [_route_data(name=f"route-{i}") for i in range(4)]
+    routes.append(_route_data(name="route-other", namespace="other"))
+    _deploy_batch(routes, use_async)
+    fake_api.reset_request_log()
+
+    results = _deploy_batch(routes, use_async)
+
+    assert {r.status for result in results for r in result} == {Status.UNCHANGED}
+    # Per namespace: the namespace, then a list per kind in pages of 2 of the 4 routes' resources
+    reads = sorted(p for m, p in fake_api.request_log if m == "GET")
+    assert reads == sorted(
+        [
+            "/api/v1/namespaces/default",
+            *["/api/v1/namespaces/default/configmaps"] * 2,
+            *["/apis/keip.codice.org/v1alpha2/namespaces/default/integrationroutes"]
+            * 2,
+            "/api/v1/namespaces/other",
+            "/api/v1/namespaces/other/configmaps",
+            "/apis/keip.codice.org/v1alpha2/namespaces/other/integrationroutes",
+        ]
+    )
+    assert fake_api.request_count("PATCH") == 0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_batch_lists_namespace_after_enough_routes(fake_api, monkeypatch, use_async):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_BATCH_LIST_MIN_ROUTES", 3)
+    routes = [_route_data(name=f"route-{i}") for i in range(4)]
+    _deploy_batch(routes, use_async)
+    fake_api.reset_request_log()
+
+    results = _deploy_batch(routes, use_async)
+
+    assert {r.status for result in results for r in result} == {Status.UNCHANGED}
+    # The first two routes read their own resources, the third lists the namespace for itself and the fourth
+    reads = sorted(p for m, p in fake_api.request_log if m == "GET")
+    assert reads == sorted(
+        [
+            "/api/v1/namespaces/default",
+            *[f"/api/v1/namespaces/default/configmaps/route-{i}-cm" for i in range(2)],
+            *[
+                f"/apis/keip.codice.org/v1alpha2/namespaces/default/integrationroutes/route-{i}"
+                for i in range(2)
+            ],
+            "/api/v1/namespaces/default/configmaps",
+            "/apis/keip.codice.org/v1alpha2/namespaces/default/integrationroutes",
+        ]
+    )
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_batch_reads_are_retried_by_operation(fake_api, monkeypatch, mocker, use_async):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_BATCH_LIST_MIN_ROUTES", 1)
+    spy = mocker.spy(k8s_client, "_with_retry_async" if use_async else "_with_retry")
+
+    _deploy_batch([_route_data()], use_async)
+
+    operations = [c.args[0] for c in spy.call_args_list]
+    assert operations.count("load_namespace") == 1
+    # One page of ConfigMaps and one of IntegrationRoutes
+    assert operations.count("list_digests") == 2
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_batch_of_one_route_does_not_list(fake_api, use_async):
+    _deploy_batch([_route_data()], use_async)
+    fake_api.reset_request_log()
+
+    _deploy_batch([_route_data()], use_async)
+
+    reads = [p for m, p in fake_api.request_log if m == "GET"]
+    assert sorted(reads) == [
+        "/api/v1/namespaces/default",
+        "/api/v1/namespaces/default/configmaps/my-route-cm",
+        "/apis/keip.codice.org/v1alpha2/namespaces/default/integrationroutes/my-route",
+    ]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_batch_fails_routes_in_missing_namespace(fake_api, use_async):
+    routes = [_route_data(name=f"route-{i}", namespace="missing") for i in range(3)]
+    routes.append(_route_data())
+
+    *failed, (cm, route) = _deploy_batch(routes, use_async)
+
+    assert (cm.status, route.status) == (Status.CREATED, Status.CREATED)
+    for e in failed:
+        assert isinstance(e, ApiException) and e.status == 404
+    assert ("GET", "/api/v1/namespaces/missing") in fake_api.request_log
+    assert not [p for _, p in fake_api.request_log if "namespaces/missing/" in p]
+
+
+def test_create_route_resources_takes_ownership_on_conflict(fake_api):
+    k8s_client._ensure_configured()
+    client.ApiClient().call_api(
+        "/api/v1/namespaces/default/configmaps/my-route-cm",
+        "PATCH",
+        query_params=[("fieldManager", "kubectl")],
+        header_params={"Content-Type": "application/apply-patch+yaml"},
+        body={
+            "apiVersion": "v1",
+            "kind": "ConfigMap",
+            "metadata": {"name": "my-route-cm"},
+            "data": {"integrationRoute.xml": "<old/>"},
+        },
+        auth_settings=["BearerToken"],
+    )
+
+    cm, _ = k8s_client.create_route_resources(_route_data())
+
+    assert cm.status == Status.UPDATED
+    stored = fake_api.get_object("configmaps", "default", "my-route-cm")
+    assert stored["data"] == {"integrationRoute.xml": "<beans/>"}
+
+
+def _deploy_async(*routes):
+    async def _run():
+        try:
+            return await asyncio.gather(
+                *[k8s_client.create_route_resources_async(r) for r in routes],
+                return_exceptions=True,
+            )
+        finally:
+            await k8s_client.close_async_client()
+
+    return asyncio.run(_run())
+
+
+def test_create_route_resources_async_against_fake_api(fake_api):
+    [(cm, route)] = _deploy_async(_route_data())
+
+    assert (cm.status, route.status) == (Status.CREATED, Status.CREATED)
+    assert cm.name == "my-route-cm"
+    stored = fake_api.get_object("integrationroutes", "default", "my-route")
+    assert stored["spec"] == {"routeConfigMap": "my-route-cm"}
+    assert fake_api.request_log[-1][1].startswith(
+        "/apis/keip.codice.org/v1alpha2/namespaces/default/integrationroutes/my-route"
+    )
+
+    [(cm, route)] = _deploy_async(_route_data(xml="<beans></beans>"))
+
+    assert (cm.status, route.status) == (Status.UPDATED, Status.UNCHANGED)
+    stored = fake_api.get_object("configmaps", "default", "my-route-cm")
+    assert stored["data"] == {"integrationRoute.xml": "<beans></beans>"}
+
+
+def test_create_route_resources_async_shares_reachability(fake_api):
+    results = _deploy_async(*[_route_data(name=f"route-{i}") for i in range(5)])
+
+    assert all(not isinstance(r, Exception) for r in results)
+    assert fake_api.request_log.count(("GET", "/api/v1/")) == 1
+    assert fake_api.request_count("PATCH") == 10
+
+
+def test_create_route_resources_async_limits_concurrency(fake_api, monkeypatch):
+    monkeypatch.setattr("config.K8S_ASYNC_MAX_CONCURRENCY", 2)
+    in_flight = 0
+    peak = 0
+    apply = k8s_client._AsyncApi.apply
+
+    async def _tracking_apply(self, path, body):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await apply(self, path, body)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(k8s_client._AsyncApi, "apply", _tracking_apply)
+
+    results = _deploy_async(*[_route_data(name=f"route-{i}") for i in range(6)])
+
+    assert all(not isinstance(r, Exception) for r in results)
+    assert peak == 2
+
+
+def test_create_route_resources_async_raises_api_errors(fake_api):
+    fake_api.fail_next(422, methods=("PATCH",))
+
+    [error] = _deploy_async(_route_data())
+
+    assert isinstance(error, ApiException)
+    assert error.status == 422
+    assert k8s_client._breaker.state == k8s_client.CircuitState.CLOSED
+
+
+def test_create_route_resources_async_unreachable(fake_api):
+    fake_api.fail_next(503, times=3, methods=("GET",))
+
+    errors = [_deploy_async(_route_data())[0] for _ in range(4)]
+
+    assert [e.status for e in errors] == [500, 500, 503, 503]
+    assert fake_api.request_count("PATCH") == 0
+
+
+def test_blocking_client_pool_is_configured(fake_api, monkeypatch):
+    monkeypatch.setattr("config.K8S_POOL_MAXSIZE", 7)
+
+    k8s_client.create_route_resources(_route_data())
+    k8s_client._collect_pool_metrics()
+
+    assert k8s_client.v1.api_client.configuration.connection_pool_maxsize == 7
+    assert k8s_client._POOL_MAX_CONNECTIONS.value() == 7
+    assert k8s_client._POOL_CONNECTIONS.value(state="in_use") == 0
+    assert k8s_client._POOL_CONNECTIONS.value(state="idle") == 1
+
+
+@pytest.mark.parametrize("async_client", [False, True])
+def test_create_route_resources_is_throttled(fake_api, monkeypatch, async_client):
+    monkeypatch.setattr(
+        k8s_client, "_throttle", TokenBucket(rate=1000, burst=1, clock=lambda: 0.0)
+    )
+    client_name = "async" if async_client else "thread"
+    throttled = k8s_client._THROTTLED_REQUESTS.value(client=client_name)
+
+    if async_client:
+        _deploy_async(_route_data())
+    else:
+        k8s_client.create_route_resources(_route_data())
+
+    # The reachability probe uses the burst, both digest reads and applies wait for a token
+    assert k8s_client._THROTTLED_REQUESTS.value(client=client_name) == throttled + 4
+
+
+@pytest.mark.parametrize("async_client", [False, True])
+def test_digest_reads_fetch_only_metadata(fake_api, mocker, async_client):
+    k8s_client.create_route_resources(_route_data())
+    get = mocker.spy(fake_api, "get")
+
+    if async_client:
+        _deploy_async(_route_data())
+    else:
+        k8s_client.create_route_resources(_route_data())
+
+    # One read of each resource's digest, without its route XML or spec
+    assert get.call_count == 2
+    assert all(call.kwargs["metadata_only"] for call in get.call_args_list)
+
+
+@pytest.mark.parametrize("async_client", [False, True])
+def test_create_route_resources_compresses_large_routes(
+    fake_api, monkeypatch, async_client
+):
+    monkeypatch.setattr("config.ROUTE_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr("config.ROUTE_COMPRESSION_MIN_BYTES", 1024)
+    monkeypatch.setattr("config.ROUTE_CHUNK_BYTES", 256)
+    xml = (
+        "<beans>\n"
+        + "".join(
+            f'    <bean id="b{i}" class="C{i * 7919 % 1000}"/>\n' for i in range(200)
+        )
+        + "</beans>"
+    )
+
+    deploy = (
+        (lambda r: _deploy_async(r)[0])
+        if async_client
+        else k8s_client.create_route_resources
+    )
+    k8s_client.create_route_resources(_route_data(xml="<beans/>"))
+    *cms, route = deploy(_route_data(xml=xml))
+
+    names = [cm.name for cm in cms]
+    assert names[:2] == ["my-route-cm", "my-route-cm-1"] and len(names) > 2
+    stored = [fake_api.get_object("configmaps", "default", n) for n in names]
+    assert not any(cm.get("data") for cm in stored)
+    assert decompress_route([cm["binaryData"] for cm in stored]) == minify_xml(xml)
+    spec = fake_api.get_object("integrationroutes", "default", "my-route")["spec"]
+    assert spec == {
+        "routeConfigMap": "my-route-cm",
+        "routeEncoding": "gzip",
+        "routeConfigMapChunks": names[1:],
+    }
+
+    # Small routes are still stored as plain text
+    cm, route = k8s_client.create_route_resources(_route_data(xml="<beans/>"))
+
+    assert fake_api.get_object("configmaps", "default", "my-route-cm")["data"]
+    spec = fake_api.get_object("integrationroutes", "default", "my-route")["spec"]
+    assert spec == {"routeConfigMap": "my-route-cm"}
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr("config.K8S_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr("config.K8S_RETRY_MAX_SECONDS", 0.001)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_transient_api_errors_are_retried(fake_api, fast_retries, use_async):
+    retries = REGISTRY.get("keip_retries_total")
+    before = retries.value(operation="k8s_apply", reason="503")
+    fake_api.fail_next(503, times=2, methods=("PATCH",))
+    # A Retry-After of 0 is honored instead of the backoff
+    fake_api.fail_next(429, retry_after=0, methods=("PATCH",))
+
+    [result] = _deploy_batch([_route_data()], use_async)
+
+    assert [r.status for r in result] == [Status.CREATED, Status.CREATED]
+    assert fake_api.request_count("PATCH") == 5
+    assert retries.value(operation="k8s_apply", reason="503") == before + 2
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_retries_give_up_on_persistent_errors(
+    fake_api, fast_retries, monkeypatch, use_async
+):
+    monkeypatch.setattr("config.K8S_RETRY_MAX_ATTEMPTS", 2)
+    fake_api.fail_next(500, times=3, methods=("PATCH",))
+
+    [error] = _deploy_batch([_route_data()], use_async)
+
+    assert error.status == 500
+    assert fake_api.request_count("PATCH") == 2
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_conflicts_are_retried_against_the_current_state(
+    fake_api, fast_retries, use_async
+):
+    # Both the apply and the forced apply conflict, as if the ConfigMap changed in between
+    fake_api.fail_next(409, times=2, methods=("PATCH",))
+
+    [result] = _deploy_batch([_route_data()], use_async)
+
+    assert [r.status for r in result] == [Status.CREATED, Status.CREATED]
+    # The batch listed the namespace, but the ConfigMap is read again after the conflict
+    assert ("GET", "/api/v1/namespaces/default/configmaps/my-route-cm") in (
+        fake_api.request_log
+    )
+
+
+def test_conflicts_are_not_retried_without_taking_ownership(
+    fake_api, fast_retries, monkeypatch
+):
+    monkeypatch.setattr("config.K8S_APPLY_FORCE_CONFLICTS", False)
+    fake_api.fail_next(409, methods=("PATCH",))
+
+    [error] = _deploy_batch([_route_data()], use_async=False)
+
+    assert error.status == 409
+    assert fake_api.request_count("PATCH") == 1
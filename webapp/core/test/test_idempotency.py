@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from core import metrics
+from core.idempotency import ResultCache
+
+
+def _counting(result="done", delay=0.0):
+    calls = []
+
+    async def _func():
+        calls.append(result)
+        await asyncio.sleep(delay)
+        return result
+
+    return _func, calls
+
+
+def _hits(source):
+    return metrics.REGISTRY.get("keip_idempotency_hits_total").value(
+        cache="test", source=source
+    )
+
+
+def test_completed_results_are_reused():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    func, calls = _counting()
+    before = _hits("cached")
+
+    async def _run():
+        assert await cache.get_or_run("key", func, tag="a") == ("done", False)
+        assert await cache.get_or_run("key", func, tag="a") == ("done", True)
+
+    asyncio.run(_run())
+
+    assert calls == ["done"]
+    assert _hits("cached") == before + 1
+
+
+def test_concurrent_duplicates_share_the_execution():
+    cache = ResultCache("test", ttl=0, max_entries=10)
+    func, calls = _counting(delay=0.01)
+    before = _hits("in_flight")
+
+    async def _run():
+        return await asyncio.gather(
+            *[cache.get_or_run("key", func, tag="a") for _ in range(3)]
+        )
+
+    results = asyncio.run(_run())
+
+    assert calls == ["done"]
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert _hits("in_flight") == before + 2
+    # With no TTL, nothing is kept once the execution finishes
+    assert len(cache) == 0
+
+
+def test_other_tags_run_after_the_execution_in_flight():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    order = []
+
+    def _func(tag):
+        async def _run():
+            order.append(f"start {tag}")
+            await asyncio.sleep(0.01)
+            order.append(f"end {tag}")
+            return tag
+
+        return _run
+
+    async def _run():
+        return await asyncio.gather(
+            cache.get_or_run("key", _func("a"), tag="a"),
+            cache.get_or_run("key", _func("b"), tag="b"),
+        )
+
+    assert asyncio.run(_run()) == [("a", False), ("b", False)]
+    assert order == ["start a", "end a", "start b", "end b"]
+
+    # The newer result replaced the older one
+    async def _again():
+        return await cache.get_or_run("key", _func("a"), tag="a")
+
+    assert asyncio.run(_again()) == ("a", False)
+
+
+def test_failures_are_shared_but_not_cached():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    calls = []
+
+    async def _fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def _run():
+        return await asyncio.gather(
+            cache.get_or_run("key", _fail),
+            cache.get_or_run("key", _fail),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(_run())
+
+    assert [str(e) for e in results] == ["boom", "boom"]
+    assert calls == [1]
+    assert len(cache) == 0
+
+
+def test_results_are_cached_as_transformed():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    func, calls = _counting()
+
+    async def _run():
+        first = await cache.get_or_run("key", func, cached_as=str.upper)
+        second = await cache.get_or_run("key", func, cached_as=str.upper)
+        return first, second
+
+    assert asyncio.run(_run()) == (("done", False), ("DONE", True))
+    assert calls == ["done"]
+
+
+def test_uncacheable_results_are_not_kept():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    func, calls = _counting(result=500)
+
+    async def _run():
+        for _ in range(2):
+            await cache.get_or_run("key", func, cacheable=lambda r: r < 500)
+
+    asyncio.run(_run())
+
+    assert len(calls) == 2
+
+
+def test_cancelled_execution_is_run_again_by_waiters():
+    cache = ResultCache("test", ttl=60, max_entries=10)
+    func, calls = _counting(delay=0.01)
+
+    async def _run():
+        first = asyncio.ensure_future(cache.get_or_run("key", func))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_run("key", func))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(_run()) == ("done", False)
+    assert len(calls) == 2
+
+
+def test_entries_expire_and_are_bounded(mocker):
+    now = mocker.patch("core.idempotency.time.monotonic", return_value=0.0)
+    cache = ResultCache("test", ttl=10, max_entries=2)
+    func, calls = _counting()
+
+    async def _run(key):
+        return await cache.get_or_run(key, func)
+
+    for key in ("a", "b", "c"):
+        asyncio.run(_run(key))
+    assert len(cache) == 2
+    # "a" was dropped as the oldest
+    assert asyncio.run(_run("a")) == ("done", False)
+    assert asyncio.run(_run("c")) == ("done", True)
+
+    now.return_value = 10.0
+    assert asyncio.run(_run("c")) == ("done", False)
+    assert len(calls) == 5
+
+
+@pytest.mark.parametrize("ttl", [0, 60])
+def test_clear(ttl):
+    cache = ResultCache("test", ttl=ttl, max_entries=10)
+    func, calls = _counting()
+
+    async def _run():
+        await cache.get_or_run("key", func)
+        cache.clear()
+        await cache.get_or_run("key", func)
+
+    asyncio.run(_run())
+
+    assert len(calls) == 2
@@ -0,0 +1,256 @@
+import time
+
+import pytest
+
+import core.k8s_client as k8s_client
+import core.test.fake_apiserver as fake_apiserver
+from core import metrics
+from core.informer import Informer, Store, parse_label_selector
+
+SELECTOR = "app.kubernetes.io/created-by=keip"
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for condition"
+        time.sleep(0.01)
+
+
+def _configmap(name, namespace="default", labels=None, **fields):
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "labels": (
+                {"app.kubernetes.io/created-by": "keip"} if labels is None else labels
+            ),
+        },
+        **fields,
+    }
+
+
+@pytest.fixture
+def configmaps(fake_api):
+    k8s_client._ensure_configured()
+    informers = []
+
+    def _start(**kwargs):
+        informer = Informer(
+            "test-configmaps",
+            k8s_client.v1.api_client,
+            "/api/v1/configmaps",
+            label_selector=SELECTOR,
+            **kwargs,
+        )
+        informers.append(informer)
+        informer.start()
+        return informer
+
+    yield _start
+    for informer in informers:
+        informer.stop()
+
+
+def test_store():
+    store = Store()
+    store.replace([_configmap("a"), _configmap("b", namespace="other")])
+    store.upsert(_configmap("c", data={"k": "v"}))
+
+    assert len(store) == 3
+    assert store.get("default", "c")["data"] == {"k": "v"}
+    assert [o["metadata"]["name"] for o in store.list("default")] == ["a", "c"]
+
+    store.delete(_configmap("b", namespace="other"))
+
+    assert store.get("other", "b") is None
+    assert store.list("other") == []
+    assert len(store.list()) == 2
+
+
+@pytest.mark.parametrize(
+    "selector, expected",
+    [
+        ("", True),
+        ("app=keip", True),
+        ("app==keip,team=blue", True),
+        ("app!=keip", False),
+        ("team in (red, blue)", True),
+        ("team notin (blue),app=keip", False),
+        ("team", True),
+        ("!owner", True),
+        ("owner", False),
+    ],
+)
+def test_parse_label_selector(selector, expected):
+    matches = parse_label_selector(selector)
+
+    assert matches({"app": "keip", "team": "blue"}) == expected
+
+
+@pytest.mark.parametrize("selector", ["app keip", "team in (blue", "a=(b)"])
+def test_parse_invalid_label_selector(selector):
+    with pytest.raises(ValueError):
+        parse_label_selector(selector)
+
+
+def test_informer_lists_in_pages_and_follows_changes(fake_api, configmaps):
+    v1 = k8s_client.v1
+    for name in ("a", "b", "c"):
+        v1.create_namespaced_config_map("default", _configmap(name))
+    v1.create_namespaced_config_map("other", _configmap("unlabelled", labels={}))
+
+    informer = configmaps(page_size=2)
+
+    assert informer.wait_for_sync(5)
+    assert sorted(o["metadata"]["name"] for o in informer.store.list()) == [
+        "a",
+        "b",
+        "c",
+    ]
+
+    v1.create_namespaced_config_map("other", _configmap("d"))
+    v1.patch_namespaced_config_map("a", "default", {"data": {"k": "v"}})
+    v1.delete_namespaced_config_map("b", "default")
+
+    _wait_for(lambda: informer.store.get("default", "b") is None)
+    assert informer.store.get("other", "d") is not None
+    assert informer.store.get("default", "a")["data"] == {"k": "v"}
+    assert "managedFields" not in informer.store.get("default", "a")["metadata"]
+    assert informer.resource_version == str(fake_api._rv)
+
+
+def test_informer_resumes_from_bookmarks(fake_api, configmaps):
+    fake_api.bookmark_interval = 0.05
+    informer = configmaps(watch_timeout=1)
+    assert informer.wait_for_sync(5)
+    # Changes to unwatched objects only reach the informer through bookmarks
+    k8s_client.v1.create_namespaced_config_map("default", _configmap("x", labels={}))
+    relists = metrics.REGISTRY.get("keip_informer_relists_total")
+    before = relists.value(informer="test-configmaps")
+
+    _wait_for(lambda: informer.resource_version == str(fake_api._rv))
+    time.sleep(1.2)
+
+    assert relists.value(informer="test-configmaps") == before
+    assert informer.synced
+
+
+def test_informer_relists_when_watch_expires(fake_api, configmaps, monkeypatch):
+    monkeypatch.setattr(fake_apiserver, "_EVENT_HISTORY", 2)
+    for name in ("a", "b", "c", "d"):
+        k8s_client.v1.create_namespaced_config_map("default", _configmap(name))
+    list_once = Informer._list
+    calls = []
+
+    def stale_list(self):
+        calls.append(list_once(self))
+        return "1" if len(calls) == 1 else calls[-1]
+
+    monkeypatch.setattr(Informer, "_list", stale_list)
+    events = metrics.REGISTRY.get("keip_informer_events_total")
+    before = events.value(informer="test-configmaps", type="ERROR")
+
+    informer = configmaps()
+
+    _wait_for(lambda: len(calls) == 2 and informer.synced)
+    assert events.value(informer="test-configmaps", type="ERROR") == before + 1
+    assert len(informer.store) == 4
+
+
+def test_informer_backs_off_and_recovers_from_errors(fake_api, configmaps):
+    k8s_client.v1.create_namespaced_config_map("default", _configmap("a"))
+    fake_api.fail_next(500, times=2, methods=("GET",))
+
+    informer = configmaps(max_backoff=0.05)
+
+    assert informer.wait_for_sync(5)
+    assert informer.store.get("default", "a") is not None
+
+
+def test_k8s_client_informers(fake_api, monkeypatch):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_ENABLED", True)
+    k8s_client._ensure_configured()
+    for informer in k8s_client._informers.values():
+        assert informer.wait_for_sync(5)
+
+    assert k8s_client.cached_object("ConfigMap", "default", "my-route-cm") == (
+        True,
+        None,
+    )
+
+    fake_api.reset_request_log()
+    k8s_client.create_route_resources(
+        k8s_client.RouteData(
+            route_name="my-route", namespace="default", route_xml="<beans/>"
+        )
+    )
+
+    # Synced informers stand in for the reachability probe
+    assert ("GET", "/api/v1/") not in fake_api.request_log
+    assert fake_api.request_count("PATCH") == 2
+    _wait_for(
+        lambda: k8s_client.cached_object("IntegrationRoute", "default", "my-route")[1]
+    )
+    cached, cm = k8s_client.cached_object("ConfigMap", "default", "my-route-cm")
+    assert cached
+    assert "data" not in cm
+
+    k8s_client.stop_informers()
+
+    assert k8s_client.cached_object("ConfigMap", "default", "my-route-cm") == (
+        False,
+        None,
+    )
+
+
+def test_informer_listeners(fake_api, configmaps):
+    k8s_client._ensure_configured()
+    k8s_client.v1.create_namespaced_config_map("default", _configmap("a"))
+    events = []
+
+    def _failing(event_type, obj):
+        raise RuntimeError("listener failed")
+
+    def _record(event_type, obj):
+        events.append((event_type, obj["metadata"]["name"]))
+
+    informer = configmaps()
+    informer.add_listener(_failing)
+    informer.add_listener(_record)
+    assert informer.wait_for_sync(5)
+
+    k8s_client.v1.create_namespaced_config_map("default", _configmap("b"))
+    k8s_client.v1.delete_namespaced_config_map("a", "default")
+
+    _wait_for(lambda: len(events) == 3)
+    assert events == [("ADDED", "a"), ("ADDED", "b"), ("DELETED", "a")]
+
+    informer.remove_listener(_failing)
+
+    assert informer._listeners == (_record,)
+
+
+def test_watch_integration_routes_is_shared(fake_api):
+    relists = metrics.REGISTRY.get("keip_informer_relists_total")
+    before = relists.value(informer="integrationroutes-watch")
+
+    with k8s_client.watch_integration_routes() as first:
+        with k8s_client.watch_integration_routes() as second:
+            assert first is second
+            assert first.wait_for_sync(5)
+        assert k8s_client._route_watchers == 1
+
+    assert k8s_client._route_watch is None
+    assert not first.synced
+    assert relists.value(informer="integrationroutes-watch") == before + 1
+
+
+def test_watch_integration_routes_uses_informers(fake_api, monkeypatch):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_ENABLED", True)
+
+    with k8s_client.watch_integration_routes() as informer:
+        assert informer is k8s_client._informers["IntegrationRoute"]
+
+    assert k8s_client._route_watch is None
+    assert informer.wait_for_sync(5)
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from core.jobs import Job, JobManager, JobStatus, QueueFullError
+
+
+def _manager(**kwargs):
+    options = dict(workers=1, max_queued=10, retention_count=10, retention_seconds=60)
+    return JobManager(**(options | kwargs))
+
+
+async def _wait_done(manager, job_id):
+    for _ in range(200):
+        job = manager.get(job_id)
+        if job.done:
+            return job
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_runs_and_records_results():
+    manager = _manager()
+
+    async def _func(job: Job):
+        for i in range(job.total):
+            job.record({"item": i}, failed=False)
+
+    async def _run():
+        job = manager.submit(3, _func)
+        assert job.status == JobStatus.QUEUED
+        return await _wait_done(manager, job.id)
+
+    job = asyncio.run(_run())
+
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.completed == 3
+    assert job.to_dict()["results"] == [{"item": 0}, {"item": 1}, {"item": 2}]
+    assert job.started_at is not None and job.finished_at >= job.started_at
+
+
+def test_job_with_failed_items_fails():
+    manager = _manager()
+
+    async def _func(job: Job):
+        job.record("ok", item="first")
+        job.record("bad", failed=True, item="second")
+
+    async def _run():
+        return await _wait_done(manager, manager.submit(2, _func).id)
+
+    job = asyncio.run(_run())
+
+    assert job.status == JobStatus.FAILED
+    assert (job.completed, job.failed) == (2, 1)
+    # Only the failed items are kept for retrying, and they are not reported
+    assert job.failed_items == ["second"]
+    assert "failed_items" not in job.to_dict()
+
+
+def test_job_raising_fails_without_leaking_details():
+    manager = _manager()
+
+    async def _func(job: Job):
+        raise RuntimeError("secret")
+
+    async def _run():
+        return await _wait_done(manager, manager.submit(1, _func).id)
+
+    job = asyncio.run(_run())
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "Internal server error"
+
+
+def test_cancel_running_and_queued_jobs():
+    manager = _manager()
+    started = []
+
+    async def _func(job: Job):
+        started.append(job.id)
+        await asyncio.sleep(10)
+
+    async def _run():
+        running = manager.submit(1, _func)
+        queued = manager.submit(1, _func)
+        await asyncio.sleep(0.01)
+
+        manager.cancel(queued.id)
+        manager.cancel(running.id)
+        running = await _wait_done(manager, running.id)
+
+        # The worker moves on and skips the cancelled job
+        after = manager.submit(1, lambda job: asyncio.sleep(0))
+        await _wait_done(manager, after.id)
+        return running, manager.get(queued.id), manager.get(after.id)
+
+    running, queued, after = asyncio.run(_run())
+
+    assert running.status == JobStatus.CANCELLED
+    assert queued.status == JobStatus.CANCELLED
+    assert after.status == JobStatus.SUCCEEDED
+    assert started == [running.id]
+
+
+def test_submit_rejects_when_queue_is_full():
+    manager = _manager(max_queued=1)
+
+    async def _run():
+        manager.submit(1, lambda job: asyncio.sleep(0))
+        with pytest.raises(QueueFullError):
+            manager.submit(1, lambda job: asyncio.sleep(0))
+        await manager.shutdown()
+
+    asyncio.run(_run())
+
+
+def test_finished_jobs_are_pruned():
+    manager = _manager(retention_count=2)
+
+    async def _run():
+        ids = []
+        for _ in range(3):
+            job = manager.submit(0, lambda job: asyncio.sleep(0))
+            await _wait_done(manager, job.id)
+            ids.append(job.id)
+        return ids
+
+    first, second, third = asyncio.run(_run())
+
+    assert manager.get(first) is None
+    assert manager.get(second) is not None
+    assert manager.get(third) is not None
+
+    manager.retention_seconds = -1
+    assert manager.get(third) is None
+
+
+def test_shutdown_cancels_running_jobs():
+    manager = _manager()
+
+    async def _run():
+        job = manager.submit(1, lambda job: asyncio.sleep(10))
+        await asyncio.sleep(0.01)
+        await manager.shutdown()
+        return job
+
+    job = asyncio.run(_run())
+
+    assert job.status == JobStatus.CANCELLED
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from core.json_stream import ItemTooLargeError, JsonArrayStream, JsonStreamError
+
+DOCUMENT = json.dumps(
+    {
+        "kind": "routes",
+        "escaped": 'slashes \\\\" and "quotes\\',
+        "nested": {"routes": [0]},
+        "routes": [
+            {"name": 'quoted " ] }', "xml": "<a>\\</a>"},
+            {"name": "ends in a slash \\", "xml": '\\"\\\\"'},
+            "text",
+            1,
+            [2, {"three": 3}],
+        ],
+        "after": True,
+    }
+).encode()
+
+
+def _parse(document, chunk_size, max_item_bytes=1024):
+    parser = JsonArrayStream("routes", max_item_bytes)
+    items = []
+    for start in range(0, len(document), chunk_size):
+        items += parser.feed(document[start : start + chunk_size])
+    parser.close()
+    return parser, [json.loads(item) for item in items]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_yields_elements_across_chunk_boundaries(chunk_size):
+    parser, items = _parse(DOCUMENT, chunk_size)
+
+    assert items == json.loads(DOCUMENT)["routes"]
+    assert parser.found
+
+
+def test_buffers_only_the_current_element():
+    parser = JsonArrayStream("routes", 64)
+    parser.feed(b'{"routes": [')
+    for _ in range(1000):
+        assert parser.feed(b'{"name": "route"},') == [b'{"name": "route"}']
+        assert len(parser._buf) < 64
+
+
+@pytest.mark.parametrize(
+    "document, key_seen, found",
+    [
+        (b"{}", False, False),
+        (b'{"routes": []}', True, True),
+        (b'{"routes": {"a": []}}', True, False),
+        (b'{"other": "routes", "list": [1]}', False, False),
+    ],
+)
+def test_reports_missing_routes(document, key_seen, found):
+    parser, items = _parse(document, 4)
+
+    assert items == []
+    assert (parser.key_seen, parser.found) == (key_seen, found)
+
+
+def test_rejects_large_elements_before_they_complete():
+    parser = JsonArrayStream("routes", 16)
+    parser.feed(b'{"routes": [{"xml": "')
+
+    with pytest.raises(ItemTooLargeError):
+        parser.feed(b"x" * 32)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'["routes"]',
+        b'{"routes": [1,]}',
+        b'{"routes": [,1]}',
+        b'{"routes": [1}',
+        b'{"routes": [1]',
+        b'{"routes": []} {}',
+    ],
+)
+def test_rejects_malformed_documents(document):
+    with pytest.raises(JsonStreamError):
+        _parse(document, 3)
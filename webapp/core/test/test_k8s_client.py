@@ -1,6 +1,16 @@
+import asyncio
+
 import pytest
-from kubernetes import client
-from core.k8s_client import _create_integration_route, _create_route_configmap, create_route_resources
+from kubernetes import config
+
+import core.k8s_client as k8s_client
+from core.circuit_breaker import CircuitBreaker, CircuitState
+from core.k8s_client import (
+    APPLY_CONTENT_TYPE,
+    _create_integration_route,
+    _create_route_configmaps,
+    create_route_resources,
+)
 from models import RouteData, Resource, Status
 from kubernetes.client.rest import ApiException
 
@@ -16,63 +26,141 @@ def route_data():
 
 @pytest.fixture
 def mock_api(mocker):
-    """Patch the global `v1` and `routeApi` objects used by k8s_client."""
+    """
+    Patch the global `v1` and `routeApi` objects used by k8s_client. Resources are reported as not
+    existing yet by the digest lookup, so every resource is applied.
+    """
     mocker.patch("core.k8s_client._ensure_configured")
     v1 = mocker.patch("core.k8s_client.v1")
     route_api = mocker.patch("core.k8s_client.routeApi")
-    return {"v1": v1, "route_api": route_api}
+    current_digest = mocker.patch("core.k8s_client._current_digest", return_value=None)
+    return {"v1": v1, "route_api": route_api, "current_digest": current_digest}
+
+
+def _apply_calls(mock_api):
+    return mock_api["v1"].api_client.call_api.call_args_list
 
 
 def test_create_route_configmap_creates_new(route_data, mock_api):
-    """When no ConfigMap exists the function should call create_namespaced_config_map."""
-    cm_list = client.V1ConfigMapList(items=[])
-    mock_api["v1"].list_namespaced_config_map.return_value = cm_list
+    """A ConfigMap created by the server-side apply is reported as CREATED."""
+    mock_api["v1"].api_client.call_api.return_value = (None, 201, {})
 
-    res: Resource = _create_route_configmap(route_data)
+    [res] = _create_route_configmaps(route_data)
 
     # Verify that the correct name is returned
     assert res.name == f"{route_data.route_name}-cm"
     assert res.status == Status.CREATED
+    [apply_call] = _apply_calls(mock_api)
+    assert apply_call.args[1] == "PATCH"
+    assert apply_call.kwargs["header_params"]["Content-Type"] == APPLY_CONTENT_TYPE
+    assert ("fieldManager", "keip") in apply_call.kwargs["query_params"]
+    assert apply_call.kwargs["body"]["data"] == {
+        "integrationRoute.xml": route_data.route_xml
+    }
+    assert apply_call.kwargs["_request_timeout"] == (5.0, 30.0)
 
 
 def test_create_route_configmap_updates_existing(route_data, mock_api):
-    """When a ConfigMap already exists the function should replace it."""
-    cm_name = f"{route_data.route_name}-cm"
-    existing_cm = client.V1ConfigMap(
-        metadata=client.V1ObjectMeta(name=cm_name, namespace="default"),
-        data={"integrationRoute.xml": "<old/>"},
-    )
-    cm_list = client.V1ConfigMapList(items=[existing_cm])
-    mock_api["v1"].list_namespaced_config_map.return_value = cm_list
+    """A ConfigMap updated by the server-side apply is reported as UPDATED."""
+    mock_api["v1"].api_client.call_api.return_value = (None, 200, {})
 
-    res: Resource = _create_route_configmap(route_data)
+    [res] = _create_route_configmaps(route_data)
 
-    assert res.name == cm_name
+    assert res.name == f"{route_data.route_name}-cm"
     assert res.status == Status.UPDATED
+    mock_api["v1"].list_namespaced_config_map.assert_not_called()
 
 
 def test_create_integration_route_creates_new(route_data, mock_api):
-    """When no IntegrationRoute exists the function should call create."""
-    mock_api["route_api"].list_namespaced_custom_object.return_value = {"items": []}
+    """An IntegrationRoute created by the server-side apply is reported as CREATED."""
+    mock_api["v1"].api_client.call_api.return_value = ({}, 201, {})
 
     res: Resource = _create_integration_route(route_data, f"{route_data.route_name}-cm")
 
     assert res.name == route_data.route_name
     assert res.status == Status.CREATED
+    [apply_call] = _apply_calls(mock_api)
+    assert apply_call.kwargs["body"]["spec"] == {
+        "routeConfigMap": f"{route_data.route_name}-cm"
+    }
+    assert apply_call.kwargs["path_params"] == {
+        "namespace": "default",
+        "name": "my-route",
+    }
 
 
 def test_create_integration_route_updates_existing(route_data, mock_api):
-    """When an IntegrationRoute exists the function should patch it."""
-    existing_ir = {"metadata": {"name": route_data.route_name}}
-    mock_api["route_api"].list_namespaced_custom_object.return_value = {
-        "items": [existing_ir]
-    }
+    """An IntegrationRoute updated by the server-side apply is reported as UPDATED."""
+    mock_api["v1"].api_client.call_api.return_value = ({}, 200, {})
 
     res: Resource = _create_integration_route(route_data, f"{route_data.route_name}-cm")
 
     assert res.name == route_data.route_name
     assert res.status == Status.UPDATED
-    mock_api["route_api"].patch_namespaced_custom_object.assert_called_once()
+    mock_api["route_api"].list_namespaced_custom_object.assert_not_called()
+
+
+def test_unchanged_configmap_is_not_written(route_data, mock_api):
+    """A ConfigMap whose stored content digest matches is reported as UNCHANGED without an apply."""
+    body = k8s_client._configmap_body(route_data, "my-route-cm")
+    mock_api["current_digest"].return_value = body["metadata"]["annotations"][
+        k8s_client.DIGEST_ANNOTATION
+    ]
+
+    [res] = _create_route_configmaps(route_data)
+
+    assert res.status == Status.UNCHANGED
+    assert _apply_calls(mock_api) == []
+    kind, _, path_params = mock_api["current_digest"].call_args.args
+    assert (kind, path_params) == (
+        "ConfigMap",
+        {"namespace": "default", "name": "my-route-cm"},
+    )
+
+
+def test_unchanged_check_can_be_disabled(route_data, mock_api, mocker):
+    mocker.patch("config.K8S_SKIP_UNCHANGED_WRITES", False)
+    mock_api["v1"].api_client.call_api.return_value = (None, 200, {})
+
+    [res] = _create_route_configmaps(route_data)
+
+    assert res.status == Status.UPDATED
+    mock_api["current_digest"].assert_not_called()
+
+
+def test_content_digest():
+    digest = k8s_client._content_digest({"a": "1", "b": "2"})
+
+    assert digest.startswith("sha256:")
+    assert digest == k8s_client._content_digest({"b": "2", "a": "1"})
+    assert digest != k8s_client._content_digest({"a": "1", "b": "3"})
+
+
+def test_apply_conflict_forces_ownership(route_data, mock_api):
+    """A field manager conflict is retried once with force=true."""
+    mock_api["v1"].api_client.call_api.side_effect = [
+        ApiException(status=409, reason="Conflict"),
+        (None, 200, {}),
+    ]
+
+    [res] = _create_route_configmaps(route_data)
+
+    assert res.status == Status.UPDATED
+    first, second = _apply_calls(mock_api)
+    assert ("force", "false") in first.kwargs["query_params"]
+    assert ("force", "true") in second.kwargs["query_params"]
+
+
+def test_apply_conflict_raises_when_force_disabled(route_data, mock_api, mocker):
+    mocker.patch("config.K8S_APPLY_FORCE_CONFLICTS", False)
+    mock_api["v1"].api_client.call_api.side_effect = ApiException(
+        status=409, reason="Conflict"
+    )
+
+    with pytest.raises(ApiException):
+        _create_route_configmaps(route_data)
+
+    assert len(_apply_calls(mock_api)) == 1
 
 
 def test_create_route_resources_cluster_not_reachable(route_data, mocker):
@@ -80,3 +168,151 @@ def test_create_route_resources_cluster_not_reachable(route_data, mocker):
     mocker.patch("core.k8s_client._check_cluster_reachable", return_value=False)
     with pytest.raises(ApiException):
         create_route_resources(route_data)
+
+
+@pytest.fixture
+def fresh_breaker(mocker):
+    """Give each test its own reachability cache and circuit breaker."""
+    mocker.patch("core.k8s_client._reachable_until", 0.0)
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60.0)
+    mocker.patch("core.k8s_client._breaker", breaker)
+    return breaker
+
+
+def test_cluster_reachability_is_cached(route_data, mock_api, fresh_breaker):
+    """Deploying several routes only probes the API server once within the TTL."""
+    mock_api["v1"].api_client.call_api.return_value = (None, 200, {})
+
+    create_route_resources(route_data)
+    create_route_resources(route_data)
+
+    mock_api["v1"].get_api_resources.assert_called_once()
+
+
+def test_server_failure_invalidates_reachability(route_data, mock_api, fresh_breaker):
+    mock_api["v1"].api_client.call_api.side_effect = ApiException(status=503)
+    with pytest.raises(ApiException):
+        create_route_resources(route_data)
+
+    mock_api["v1"].api_client.call_api.side_effect = None
+    mock_api["v1"].api_client.call_api.return_value = (None, 200, {})
+    create_route_resources(route_data)
+
+    assert mock_api["v1"].get_api_resources.call_count == 2
+
+
+def test_client_error_keeps_circuit_closed(route_data, mock_api, fresh_breaker):
+    mock_api["v1"].api_client.call_api.side_effect = ApiException(status=422)
+
+    for _ in range(3):
+        with pytest.raises(ApiException) as e:
+            create_route_resources(route_data)
+        assert e.value.status == 422
+
+    assert fresh_breaker.state == CircuitState.CLOSED
+    mock_api["v1"].get_api_resources.assert_called_once()
+
+
+def test_open_circuit_fails_fast(route_data, mock_api, fresh_breaker):
+    """Once the breaker opens, deployments fail with a 503 without calling the API server."""
+    mock_api["v1"].get_api_resources.side_effect = ApiException(status=0)
+
+    statuses = []
+    for _ in range(3):
+        with pytest.raises(ApiException) as e:
+            create_route_resources(route_data)
+        statuses.append(e.value.status)
+
+    assert statuses == [500, 503, 503]
+    assert mock_api["v1"].get_api_resources.call_count == 2
+    mock_api["v1"].api_client.call_api.assert_not_called()
+
+
+def test_half_open_probe_closes_circuit(route_data, mock_api, fresh_breaker, mocker):
+    mock_api["v1"].get_api_resources.side_effect = ApiException(status=0)
+    for _ in range(2):
+        with pytest.raises(ApiException):
+            create_route_resources(route_data)
+    assert fresh_breaker.state == CircuitState.OPEN
+
+    mocker.patch.object(fresh_breaker, "reset_timeout", 0.0)
+    mock_api["v1"].get_api_resources.side_effect = None
+    mock_api["v1"].api_client.call_api.return_value = (None, 201, {})
+
+    route_cm, route = create_route_resources(route_data)
+
+    assert route.status == Status.CREATED
+    assert fresh_breaker.state == CircuitState.CLOSED
+
+
+def _half_open(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.reset_timeout = 0.0
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_interrupted_probe_releases_circuit(route_data, mock_api, fresh_breaker):
+    _half_open(fresh_breaker)
+    mock_api["v1"].get_api_resources.side_effect = RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        create_route_resources(route_data)
+
+    assert fresh_breaker.state == CircuitState.HALF_OPEN
+    assert fresh_breaker.allow_request()
+
+
+def test_cancelled_async_probe_releases_circuit(fresh_breaker, mocker):
+    _half_open(fresh_breaker)
+    api = mocker.Mock(probe_lock=asyncio.Lock())
+
+    async def _request(method, path):
+        await asyncio.sleep(10)
+
+    api.request = _request
+
+    async def _run():
+        probe = asyncio.ensure_future(k8s_client._check_cluster_reachable_async(api))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(_run())
+
+    assert fresh_breaker.state == CircuitState.HALF_OPEN
+    assert fresh_breaker.allow_request()
+
+
+def test_config_load_retries_with_backoff(mocker, monkeypatch):
+    """A failed configuration load is retried after a backoff instead of latching."""
+    monkeypatch.delenv("KUBECONFIG", raising=False)
+    for name, value in [
+        ("_configured", False),
+        ("_config_attempts", 0),
+        ("_config_retry_at", 0.0),
+        ("v1", None),
+        ("routeApi", None),
+    ]:
+        monkeypatch.setattr(k8s_client, name, value)
+    load = mocker.patch(
+        "core.k8s_client.config.load_incluster_config",
+        side_effect=[config.ConfigException("no token"), None],
+    )
+    mocker.patch("core.k8s_client.client")
+    now = mocker.patch("core.k8s_client.time.monotonic", return_value=100.0)
+
+    k8s_client._ensure_configured()
+    assert not k8s_client._configured
+    assert k8s_client._config_retry_at == 101.0
+
+    k8s_client._ensure_configured()
+    assert load.call_count == 1
+
+    now.return_value = 101.0
+    k8s_client._ensure_configured()
+
+    assert load.call_count == 2
+    assert k8s_client._configured
+    assert k8s_client._config_attempts == 0
@@ -0,0 +1,84 @@
+import pytest
+
+from core.metrics import Counter, Gauge, Histogram, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter_renders_labelled_values(registry):
+    counter = registry.register(Counter("requests_total", "Requests", ("code",)))
+    counter.inc(code="200")
+    counter.inc(2, code="500")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{code="200"} 1',
+        'requests_total{code="500"} 2',
+    ]
+
+
+def test_counter_rejects_decrements():
+    with pytest.raises(ValueError):
+        Counter("c", "c").inc(-1)
+
+
+def test_labels_must_match():
+    counter = Counter("c", "c", ("code",))
+
+    with pytest.raises(ValueError):
+        counter.inc(method="GET")
+
+
+def test_gauge_goes_up_and_down():
+    gauge = Gauge("in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.value() == 1
+
+    gauge.set(0.5)
+    assert gauge.value() == 0.5
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    histogram = registry.register(
+        Histogram("wait_seconds", "Wait", ("pool",), buckets=(0.1, 1.0))
+    )
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, pool="a")
+
+    lines = registry.render().splitlines()
+
+    assert lines[2:] == [
+        'wait_seconds_bucket{pool="a",le="0.1"} 1',
+        'wait_seconds_bucket{pool="a",le="1"} 3',
+        'wait_seconds_bucket{pool="a",le="+Inf"} 4',
+        'wait_seconds_sum{pool="a"} 4.25',
+        'wait_seconds_count{pool="a"} 4',
+    ]
+    assert histogram.count(pool="a") == 4
+
+
+def test_register_returns_existing_metric(registry):
+    first = registry.register(Counter("c", "c"))
+
+    assert registry.register(Counter("c", "c")) is first
+    with pytest.raises(ValueError):
+        registry.register(Gauge("c", "c"))
+
+
+def test_collectors_run_before_render(registry):
+    gauge = registry.register(Gauge("pool_size", "Pool size"))
+    registry.register_collector(lambda: gauge.set(4))
+
+    assert "pool_size 4" in registry.render()
+
+
+def test_label_values_are_escaped(registry):
+    registry.register(Counter("c", "c", ("path",))).inc(path='a"b\\c')
+
+    assert 'c{path="a\\"b\\\\c"} 1' in registry.render()
@@ -0,0 +1,221 @@
+import asyncio
+
+import pytest
+
+from core.metrics import REGISTRY
+from core.rate_limit import (
+    ConcurrencyLimiter,
+    FairRateLimiter,
+    RateLimitedError,
+    TokenBucket,
+    parse_weights,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_spaces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits == pytest.approx([0.0, 0.0, 0.1, 0.2])
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    bucket.reserve()
+    bucket.reserve()
+
+    clock.now = 1.0
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1)
+
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket(rate=0, burst=1)
+
+    assert all(bucket.reserve() == 0.0 for _ in range(100))
+
+
+def test_token_bucket_acquire_async_waits(mocker):
+    bucket = TokenBucket(rate=10, burst=1)
+    sleep = mocker.patch("core.rate_limit.asyncio.sleep")
+
+    asyncio.run(bucket.acquire_async())
+    wait = asyncio.run(bucket.acquire_async())
+
+    assert wait > 0
+    sleep.assert_called_once_with(wait)
+
+
+def test_concurrency_limiter_bounds_in_flight():
+    limiter = ConcurrencyLimiter("test-bound", 2)
+    in_flight = 0
+    peak = 0
+
+    async def _work():
+        nonlocal in_flight, peak
+        async with limiter:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def _run():
+        await asyncio.gather(*[_work() for _ in range(6)])
+
+    asyncio.run(_run())
+    # A limiter can be reused from a new event loop
+    asyncio.run(_run())
+
+    assert peak == 2
+    assert (
+        REGISTRY.get("keip_concurrency_wait_seconds").count(limiter="test-bound") == 12
+    )
+    assert REGISTRY.get("keip_concurrency_in_flight").value(limiter="test-bound") == 0
+
+
+def test_token_bucket_delay_takes_no_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+
+    assert bucket.delay() == 0.0
+    assert bucket.delay(4) == pytest.approx(0.2)
+    bucket.reserve()
+    bucket.reserve()
+
+    assert bucket.delay() == pytest.approx(0.1)
+    assert bucket.available() == pytest.approx(0.0)
+
+
+def test_parse_weights():
+    assert parse_weights("") == {}
+    assert parse_weights("team-a=2, batch=0.5") == {"team-a": 2.0, "batch": 0.5}
+    with pytest.raises(ValueError):
+        parse_weights("team-a")
+    with pytest.raises(ValueError):
+        parse_weights("team-a=0")
+
+
+def _grant_order(limiter, batches):
+    """Queue each (key, count) batch in turn, returning the keys in the order they got their tokens."""
+    order = []
+
+    async def _op(key):
+        await limiter.acquire(key)
+        order.append(key)
+
+    async def _run():
+        tasks = []
+        for key, count in batches:
+            tasks += [asyncio.create_task(_op(key)) for _ in range(count)]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    return order
+
+
+def test_fair_rate_limiter_serves_keys_fairly():
+    limiter = FairRateLimiter("test-fair", rate=500, burst=1)
+
+    order = _grant_order(limiter, [("big", 20), ("small", 3)])
+
+    # The small batch doesn't wait for the big one queued ahead of it
+    assert order[:7].count("small") == 3
+
+
+def test_fair_rate_limiter_weights_keys():
+    limiter = FairRateLimiter("test-weights", rate=500, burst=1, weights={"heavy": 3})
+
+    order = _grant_order(limiter, [("light", 12), ("heavy", 12)])
+
+    # Three of every four tokens go to the heavier key while both have work waiting
+    assert order[:16].count("heavy") == 12
+
+
+def test_fair_rate_limiter_rejects_long_waits():
+    limiter = FairRateLimiter("test-reject", rate=1, burst=1)
+    rejected = REGISTRY.get("keip_rate_limit_rejected_total")
+
+    async def _run():
+        await limiter.acquire("a", max_wait=0.5)
+        with pytest.raises(RateLimitedError) as e:
+            await limiter.acquire("b", max_wait=0.5)
+        return e.value
+
+    error = asyncio.run(_run())
+
+    assert error.scope == "global"
+    assert error.retry_after == pytest.approx(1.0, abs=0.05)
+    assert rejected.value(limiter="test-reject", scope="global") == 1
+
+
+def test_fair_rate_limiter_limits_each_namespace_and_client():
+    limiter = FairRateLimiter(
+        "test-keys",
+        rate=0,
+        burst=1,
+        key_rate=1,
+        key_burst=1,
+        client_rate=1,
+        client_burst=2,
+    )
+
+    async def _run():
+        await limiter.acquire("a", "client-1", max_wait=0.5)
+        with pytest.raises(RateLimitedError, match="Namespace rate limit"):
+            await limiter.acquire("a", "client-2", max_wait=0.5)
+        await limiter.acquire("b", "client-1", max_wait=0.5)
+        with pytest.raises(RateLimitedError, match="Client rate limit"):
+            limiter.check("client-1", max_wait=0.5)
+        limiter.check("client-2", max_wait=0.5)
+
+    asyncio.run(_run())
+
+
+def test_fair_rate_limiter_skips_cancelled_waiters():
+    limiter = FairRateLimiter("test-cancel", rate=100, burst=1)
+
+    async def _run():
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("a"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(limiter.acquire("b"), timeout=1)
+
+    asyncio.run(_run())
+    assert REGISTRY.get("keip_rate_limit_waiting").value(limiter="test-cancel") == 0
+
+
+def test_fair_rate_limiter_drops_idle_buckets():
+    limiter = FairRateLimiter(
+        "test-idle", rate=0, burst=1, key_rate=1000, key_burst=1, max_keys=2
+    )
+
+    async def _run():
+        for key in ("a", "b"):
+            await limiter.acquire(key)
+        await asyncio.sleep(0.01)
+        await limiter.acquire("c")
+
+    asyncio.run(_run())
+    REGISTRY.render()
+
+    assert (
+        REGISTRY.get("keip_rate_limit_keys").value(
+            limiter="test-idle", scope="namespace"
+        )
+        == 1
+    )
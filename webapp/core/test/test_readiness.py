@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+import core.k8s_client as k8s_client
+from core.metrics import REGISTRY
+from core.readiness import ReadinessWaiter, is_ready, route_status
+from models import RouteData
+
+
+def _route(generation=1, status=None):
+    return {
+        "metadata": {
+            "name": "my-route",
+            "namespace": "default",
+            "generation": generation,
+        },
+        "status": status or {},
+    }
+
+
+def _status(ready, generation=1, replicas=1):
+    return {
+        "expectedReplicas": replicas,
+        "readyReplicas": replicas if ready else 0,
+        "runningReplicas": replicas,
+        "conditions": [
+            {"type": "Available", "status": "True"},
+            {
+                "type": "Ready",
+                "status": str(ready),
+                "observedGeneration": generation,
+                "reason": "ReplicasReady" if ready else "ReplicasNotReady",
+            },
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    "route, expected",
+    [
+        (_route(), False),
+        (_route(status=_status(False)), False),
+        (_route(status=_status(True)), True),
+        # Ready for a previous generation of the route
+        (_route(generation=2, status=_status(True)), False),
+    ],
+)
+def test_is_ready(route, expected):
+    assert is_ready(route) == expected
+
+
+def test_route_status():
+    assert route_status(_route(status=_status(False, replicas=2))) == {
+        "name": "my-route",
+        "namespace": "default",
+        "expectedReplicas": 2,
+        "readyReplicas": 0,
+        "runningReplicas": 2,
+        "ready": False,
+        "reason": "ReplicasNotReady",
+        "message": None,
+    }
+    assert route_status(_route())["readyReplicas"] == 0
+
+
+def _deploy(name="my-route", xml="<beans/>"):
+    return k8s_client.create_route_resources(
+        RouteData(route_name=name, namespace="default", route_xml=xml)
+    )
+
+
+def _scale(name, replicas):
+    k8s_client.routeApi.patch_namespaced_custom_object(
+        k8s_client.ROUTE_API_GROUP,
+        k8s_client.ROUTE_API_VERSION,
+        "default",
+        k8s_client.ROUTE_PLURAL,
+        name,
+        {"spec": {"replicas": replicas}},
+    )
+
+
+async def _wait(informer, writes, timeout=5.0, on_status=None):
+    """Write each route with its function, then wait for them, calling `on_status` on each status."""
+    statuses = []
+    with ReadinessWaiter(informer) as waiter:
+        for name, write in writes:
+            waiter.track("default", name)
+            written = await asyncio.to_thread(write, name)
+            waiter.expect("default", name, written)
+        async for status in waiter.transitions(timeout):
+            statuses.append(status)
+            if on_status is not None:
+                await asyncio.to_thread(on_status, status)
+    return statuses, waiter.summary()
+
+
+def _create(name):
+    _deploy(name)
+    return True
+
+
+def test_waiter_follows_routes_until_ready(fake_api):
+    def _set_ready(status):
+        if not status["ready"]:
+            fake_api.set_status(
+                "integrationroutes", "default", status["name"], _status(True)
+            )
+
+    with k8s_client.watch_integration_routes() as informer:
+        assert informer.wait_for_sync(5)
+        statuses, summary = asyncio.run(
+            _wait(informer, [("a", _create), ("b", _create)], on_status=_set_ready)
+        )
+
+    assert sorted((s["name"], s["ready"]) for s in statuses) == [
+        ("a", False),
+        ("a", True),
+        ("b", False),
+        ("b", True),
+    ]
+    assert summary == {"total": 2, "ready": 2, "not_ready": [], "timed_out": False}
+
+
+def test_waiter_ignores_the_version_replaced(fake_api):
+    _deploy()
+    fake_api.set_status("integrationroutes", "default", "my-route", _status(True))
+
+    def _scale_up(name):
+        # The new generation's status still reports the previous one as ready
+        _scale(name, 2)
+        return True
+
+    with k8s_client.watch_integration_routes() as informer:
+        assert informer.wait_for_sync(5)
+        statuses, summary = asyncio.run(
+            _wait(informer, [("my-route", _scale_up)], timeout=0.5)
+        )
+
+    assert [(s["ready"], s["reason"]) for s in statuses] == [(False, "ReplicasReady")]
+    assert summary["not_ready"] == [{"name": "my-route", "namespace": "default"}]
+    assert summary["timed_out"]
+
+
+def test_waiter_counts_unchanged_routes(fake_api):
+    _deploy()
+    fake_api.set_status("integrationroutes", "default", "my-route", _status(True))
+    waits = REGISTRY.get("keip_route_waits_total")
+    before = waits.value(outcome="ready")
+
+    with k8s_client.watch_integration_routes() as informer:
+        assert informer.wait_for_sync(5)
+        statuses, summary = asyncio.run(
+            _wait(informer, [("my-route", lambda name: False)])
+        )
+
+    assert [s["ready"] for s in statuses] == [True]
+    assert summary["ready"] == 1
+    assert waits.value(outcome="ready") == before + 1
+    assert REGISTRY.get("keip_route_waiters").value() == 0
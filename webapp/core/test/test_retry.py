@@ -0,0 +1,154 @@
+import asyncio
+from email.utils import formatdate
+
+import pytest
+
+from core import retry
+from core.metrics import REGISTRY
+from core.retry import Attempt, RetryPolicy
+
+POLICY = RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=1.0, deadline=60.0)
+
+
+class Transient(Exception):
+    pass
+
+
+def _classify(e):
+    return "transient" if isinstance(e, Transient) else None
+
+
+def _failing(times, error=Transient):
+    attempts = []
+
+    def _func(attempt):
+        attempts.append(attempt)
+        if len(attempts) <= times:
+            raise error("failed")
+        return "ok"
+
+    return _func, attempts
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch("core.retry.time.sleep")
+
+
+def _retries(operation):
+    return REGISTRY.get("keip_retries_total").value(
+        operation=operation, reason="transient"
+    )
+
+
+def test_retries_until_success(sleep):
+    func, attempts = _failing(2)
+
+    assert retry.call(func, POLICY, "test-success", _classify) == "ok"
+
+    assert [a.number for a in attempts] == [1, 2, 3]
+    assert attempts[0].error is None
+    assert isinstance(attempts[1].error, Transient)
+    assert sleep.call_count == 2
+    assert _retries("test-success") == 2
+
+
+def test_other_errors_are_not_retried(sleep):
+    func, attempts = _failing(1, error=KeyError)
+
+    with pytest.raises(KeyError):
+        retry.call(func, POLICY, "test-other", _classify)
+
+    assert len(attempts) == 1
+    sleep.assert_not_called()
+
+
+def test_gives_up_after_max_attempts(sleep):
+    func, attempts = _failing(10)
+    exhausted = REGISTRY.get("keip_retries_exhausted_total")
+
+    with pytest.raises(Transient):
+        retry.call(func, POLICY, "test-exhausted", _classify)
+
+    assert len(attempts) == 4
+    assert exhausted.value(operation="test-exhausted") == 1
+
+
+def test_backoff_is_exponential_with_full_jitter(mocker):
+    uniform = mocker.patch("core.retry.random.uniform", side_effect=lambda a, b: b)
+
+    delays = [POLICY.backoff(retry) for retry in range(1, 6)]
+
+    assert delays == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.0])
+    assert all(call.args[0] == 0 for call in uniform.call_args_list)
+
+
+def test_retry_after_replaces_backoff(sleep):
+    func, _ = _failing(1)
+
+    retry.call(func, POLICY, "test-retry-after", _classify, lambda e: 7.0)
+
+    sleep.assert_called_once_with(7.0)
+
+
+def test_gives_up_when_retry_after_overruns_deadline(sleep):
+    func, attempts = _failing(1)
+    policy = RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=1.0, deadline=5.0)
+
+    with pytest.raises(Transient):
+        retry.call(func, policy, "test-deadline", _classify, lambda e: 10.0)
+
+    assert len(attempts) == 1
+    sleep.assert_not_called()
+
+
+def test_remaining_is_bounded_by_enclosing_call():
+    seen = []
+
+    def _inner(attempt: Attempt):
+        seen.append(retry.remaining())
+
+    def _outer(attempt: Attempt):
+        seen.append(retry.remaining())
+        retry.call(_inner, POLICY, "test-inner", _classify)
+
+    outer = RetryPolicy(max_attempts=1, base_delay=0, max_delay=0, deadline=5.0)
+    retry.call(_outer, outer, "test-outer", _classify)
+
+    assert retry.remaining() is None
+    assert 4.9 < seen[0] <= 5.0
+    assert seen[1] <= seen[0]
+
+
+def test_call_async_retries(mocker):
+    sleep = mocker.patch("core.retry.asyncio.sleep")
+    func, attempts = _failing(2)
+
+    async def _func(attempt):
+        return func(attempt)
+
+    result = asyncio.run(retry.call_async(_func, POLICY, "test-async", _classify))
+
+    assert result == "ok"
+    assert len(attempts) == 3
+    assert sleep.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, None),
+        ("", None),
+        ("3", 3.0),
+        ("soon", None),
+        (formatdate(0, usegmt=True), 0.0),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert retry.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date(mocker):
+    mocker.patch("core.retry.time.time", return_value=0.0)
+
+    assert retry.parse_retry_after(formatdate(30, usegmt=True)) == pytest.approx(30)
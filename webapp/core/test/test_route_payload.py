@@ -0,0 +1,70 @@
+import base64
+import shutil
+import subprocess
+
+import pytest
+
+from core.route_payload import (
+    chunk_key,
+    compress_route,
+    decompress_route,
+    minify_xml,
+)
+
+ROUTE = """<?xml version="1.0" encoding="UTF-8"?>
+<!-- A route -->
+<beans xmlns="http://www.springframework.org/schema/beans">
+    <!-- with comments -->
+    <bean id="a" class="A">
+        <property name="padded"><value> x </value></property>
+        <property name="script"><value><![CDATA[
+            <!-- not a comment -->
+        ]]></value></property>
+    </bean>
+</beans>
+"""
+
+
+def test_minify_xml():
+    assert minify_xml(ROUTE) == (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<beans xmlns="http://www.springframework.org/schema/beans">'
+        '<bean id="a" class="A">'
+        '<property name="padded"><value> x </value></property>'
+        '<property name="script"><value><![CDATA[\n'
+        "            <!-- not a comment -->\n"
+        "        ]]></value></property>"
+        "</bean></beans>"
+    )
+
+
+def test_compress_route_round_trips_in_chunks():
+    xml = ROUTE.replace("x", "x" * 5000)
+
+    chunks = compress_route(xml, chunk_bytes=100)
+
+    assert len(chunks) > 1
+    assert [next(iter(c)) for c in chunks] == [chunk_key(i) for i in range(len(chunks))]
+    assert all(len(base64.b64decode(v)) <= 100 for c in chunks for v in c.values())
+    assert decompress_route(chunks) == minify_xml(xml)
+    # Unchanged routes compress to the same chunks, so their digests match
+    assert compress_route(xml, chunk_bytes=100) == chunks
+
+
+@pytest.mark.skipif(shutil.which("gunzip") is None, reason="gunzip not available")
+def test_chunks_reassemble_with_shell_tools(tmp_path):
+    chunks = compress_route(ROUTE, chunk_bytes=64)
+    for chunk in chunks:
+        for key, value in chunk.items():
+            (tmp_path / key).write_bytes(base64.b64decode(value))
+
+    subprocess.run(
+        [
+            "sh",
+            "-c",
+            f"cat {tmp_path}/integrationRoute.xml.gz.* | gunzip > {tmp_path}/out",
+        ],
+        check=True,
+    )
+
+    assert (tmp_path / "out").read_text() == minify_xml(ROUTE)
@@ -0,0 +1,101 @@
+import copy
+
+import pytest
+
+from conftest import assert_linear_scaling, measure_scaling
+from core.sync import VolumeConfig, _generate_container_env_vars, sync
+
+
+def _scale_list_field(spec: dict, field: str, n: int) -> None:
+    if field == "env":
+        spec["env"] = [
+            {"name": f"ENV_VAR_{i}", "value": f"value-{i}"} for i in range(n)
+        ]
+    elif field == "envFrom":
+        spec["envFrom"] = [{"configMapRef": {"name": f"config-{i}"}} for i in range(n)]
+    elif field == "secretSources":
+        spec["secretSources"] = [{"name": f"secret-{i}"} for i in range(n)]
+    elif field == "propSources":
+        spec["propSources"] = [{"name": f"props-{i}"} for i in range(n)]
+    elif field == "configMaps":
+        spec["configMaps"] = [
+            {"name": f"cm-{i}", "mountPath": f"/path/to/cm-{i}"} for i in range(n)
+        ]
+    elif field == "persistentVolumeClaims":
+        spec["persistentVolumeClaims"] = [
+            {"claimName": f"pvc-{i}", "mountPath": f"/path/to/pvc-{i}"}
+            for i in range(n)
+        ]
+    elif field == "labels":
+        spec["labels"] = {f"label-{i}": f"value-{i}" for i in range(n)}
+    elif field == "annotations":
+        spec["annotations"] = {f"annotation-{i}": f"value-{i}" for i in range(n)}
+    else:
+        raise ValueError(f"Unknown field: {field}")
+
+
+SCALED_FIELDS = [
+    "env",
+    "envFrom",
+    "secretSources",
+    "propSources",
+    "configMaps",
+    "persistentVolumeClaims",
+    "labels",
+    "annotations",
+]
+
+
+@pytest.fixture(scope="module")
+def route_generator(full_route_load):
+    def generate(field: str):
+        def make_route(n: int) -> dict:
+            route = copy.deepcopy(full_route_load)
+            _scale_list_field(route["parent"]["spec"], field, n)
+            return route
+
+        return make_route
+
+    return generate
+
+
+@pytest.mark.parametrize("field", SCALED_FIELDS)
+def test_sync_scales_linearly(route_generator, field):
+    samples = measure_scaling(sync, route_generator(field))
+
+    assert_linear_scaling(samples)
+
+
+def test_sync_scales_linearly_all_fields(full_route_load):
+    def make_route(n: int) -> dict:
+        route = copy.deepcopy(full_route_load)
+        for field in SCALED_FIELDS:
+            _scale_list_field(route["parent"]["spec"], field, n)
+        return route
+
+    samples = measure_scaling(sync, make_route)
+
+    assert_linear_scaling(samples)
+
+
+@pytest.mark.parametrize(
+    "field", ["secretSources", "configMaps", "persistentVolumeClaims"]
+)
+def test_volume_config_scales_linearly(route_generator, field):
+    def render_volumes(route):
+        vol_config = VolumeConfig(route["parent"]["spec"])
+        vol_config.get_volumes()
+        vol_config.get_mounts()
+
+    samples = measure_scaling(render_volumes, route_generator(field))
+
+    assert_linear_scaling(samples)
+
+
+def test_env_vars_scale_linearly(route_generator):
+    samples = measure_scaling(
+        lambda route: _generate_container_env_vars(route["parent"]),
+        route_generator("env"),
+    )
+
+    assert_linear_scaling(samples)
@@ -629,3 +629,44 @@ def test_per_route_image_default_when_absent(full_route):
     # Should use the default from config (INTEGRATION_CONTAINER_IMAGE)
     import config as cfg
     assert container["image"] == cfg.INTEGRATION_CONTAINER_IMAGE
+
+
+def test_compressed_route_is_reassembled_by_init_container(full_route):
+    spec = full_route["parent"]["spec"]
+    spec["routeEncoding"] = "gzip"
+    spec["routeConfigMapChunks"] = ["testroute-cm-1", "testroute-cm-2"]
+
+    deployment = _new_deployment(full_route["parent"])
+
+    pod_spec = deployment["spec"]["template"]["spec"]
+    volumes = {v["name"]: v for v in pod_spec["volumes"]}
+    assert volumes["integration-route-config"] == {
+        "name": "integration-route-config",
+        "emptyDir": {},
+    }
+    assert volumes["integration-route-chunks"]["projected"]["sources"] == [
+        {"configMap": {"name": spec["routeConfigMap"]}},
+        {"configMap": {"name": "testroute-cm-1"}},
+        {"configMap": {"name": "testroute-cm-2"}},
+    ]
+    [init_container] = pod_spec["initContainers"]
+    assert init_container["command"][-1] == (
+        "cat /var/spring/xml-chunks/integrationRoute.xml.gz.* | gunzip > "
+        "/var/spring/xml/integrationRoute.xml"
+    )
+    assert {m["name"] for m in init_container["volumeMounts"]} == {
+        "integration-route-config",
+        "integration-route-chunks",
+    }
+    assert {
+        "name": "integration-route-config",
+        "mountPath": "/var/spring/xml",
+    } in get_container(deployment)["volumeMounts"]
+
+
+def test_uncompressed_route_has_no_init_container(full_route):
+    deployment = _new_deployment(full_route["parent"])
+
+    pod_spec = deployment["spec"]["template"]["spec"]
+    assert "initContainers" not in pod_spec
+    check_volume_absent(deployment, "integration-route-chunks")
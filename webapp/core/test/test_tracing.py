@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core.tracing import (
+    RequestTrace,
+    ServerTimingMiddleware,
+    current_trace,
+    parse_request_start,
+    span,
+)
+
+
+async def _traced_endpoint(request):
+    with span("first"):
+        pass
+    with span("second"):
+        pass
+    with span("first"):
+        pass
+    return PlainTextResponse("ok")
+
+
+def _client(export_file: str = "") -> TestClient:
+    app = Starlette(routes=[Route("/traced", _traced_endpoint)])
+    return TestClient(ServerTimingMiddleware(app, export_file=export_file))
+
+
+def _parse_server_timing(header: str) -> dict:
+    metrics = {}
+    for metric in header.split(","):
+        name, dur = metric.strip().split(";dur=")
+        metrics[name] = float(dur)
+    return metrics
+
+
+def test_span_without_trace_is_noop():
+    assert current_trace() is None
+    with span("ignored"):
+        pass
+
+
+def test_server_timing_aggregates_spans_by_name():
+    trace = RequestTrace("test")
+    trace.add("configmap", 0, 1_000_000)
+    trace.add("integrationroute", 0, 2_000_000)
+    trace.add("configmap", 0, 3_000_000)
+
+    metrics = _parse_server_timing(trace.server_timing())
+
+    assert list(metrics) == ["configmap", "integrationroute", "total"]
+    assert metrics["configmap"] == 4.0
+    assert metrics["integrationroute"] == 2.0
+
+
+def test_middleware_adds_server_timing_header():
+    res = _client().get("/traced")
+
+    assert res.status_code == 200
+    metrics = _parse_server_timing(res.headers["Server-Timing"])
+    assert list(metrics) == ["first", "second", "total"]
+    assert "queue" not in metrics
+
+
+def test_middleware_reports_queue_time():
+    request_start_ms = int(time.time() * 1000) - 250
+
+    res = _client().get("/traced", headers={"X-Request-Start": f"t={request_start_ms}"})
+
+    metrics = _parse_server_timing(res.headers["Server-Timing"])
+    assert metrics["queue"] >= 250
+
+
+@pytest.mark.parametrize(
+    "value, expected_ns",
+    [
+        ("t=1700000000", 1_700_000_000_000_000_000),
+        ("1700000000.5", 1_700_000_000_500_000_000),
+        ("t=1700000000123", 1_700_000_000_123_000_000),
+        ("t=1700000000123456", 1_700_000_000_123_456_000),
+        ("not-a-timestamp", None),
+    ],
+)
+def test_parse_request_start(value, expected_ns):
+    assert parse_request_start(value) == expected_ns
+
+
+def test_middleware_exports_trace_events(tmp_path):
+    export_file = tmp_path / "trace.json"
+    client = _client(str(export_file))
+
+    client.get("/traced")
+    client.get("/traced")
+
+    # The trailing ']' is optional in the Trace Event format, close it to parse as plain JSON.
+    content = export_file.read_text().rstrip().rstrip(",") + "]"
+    events = json.loads(content)
+    assert [e["name"] for e in events] == [
+        "GET /traced",
+        "first",
+        "second",
+        "first",
+    ] * 2
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    assert len({e["args"]["trace_id"] for e in events}) == 2
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from core import metrics, xml_preflight
+from core.xml_preflight import XmlPreflightError, check_route_xml
+
+ROUTE = """<?xml version="1.0" encoding="UTF-8"?>
+<beans xmlns="http://www.springframework.org/schema/beans"
+       xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+       xmlns:int="http://www.springframework.org/schema/integration"
+       xsi:schemaLocation="http://www.springframework.org/schema/beans
+           https://www.springframework.org/schema/beans/spring-beans.xsd">
+    <!-- é -->
+    <bean id="greeter" class="org.example.Greeter"/>
+    <int:channel id="output"/>
+</beans>
+"""
+
+
+def test_accepts_spring_routes():
+    check_route_xml(ROUTE)
+    # Routes are fed to the parser in slices
+    check_route_xml(ROUTE.replace("<!-- é -->", f"<!-- {'x' * 200_000} -->"))
+    # A template bean, without a class of its own
+    check_route_xml(
+        ROUTE.replace(
+            "<!-- é -->",
+            '<bean id="base" abstract="true"><property name="a" value="b"/></bean>',
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "xml, message",
+    [
+        ("", "no element found"),
+        ("<beans", "unclosed token"),
+        (ROUTE.replace("</beans>", "</bean>"), "line 10, column 2: mismatched tag"),
+        ("<beans/>", "Root element must be <beans"),
+        ('<route xmlns="http://www.springframework.org/schema/beans"/>', "Root"),
+        (ROUTE.replace('<int:channel id="output"/>', "<x:channel/>"), "unbound prefix"),
+        (ROUTE.replace(' class="org.example.Greeter"', ""), "<bean> needs a 'class'"),
+        (
+            ROUTE.replace(' class="org.example.Greeter"', ' abstract="false"'),
+            "<bean> needs a 'class'",
+        ),
+        (
+            ROUTE.replace("spring-beans.xsd", "spring-beans.xsd extra"),
+            "schemaLocation",
+        ),
+        (
+            '<beans xmlns="http://www.springframework.org/schema/beans"></beans>',
+            "at least one bean",
+        ),
+        (
+            '<!DOCTYPE beans [<!ENTITY a "aaaa">]>'
+            '<beans xmlns="http://www.springframework.org/schema/beans">&a;</beans>',
+            "DOCTYPE declarations are not allowed",
+        ),
+    ],
+)
+def test_rejects_invalid_routes(xml, message):
+    rejected = metrics.REGISTRY.get("keip_route_xml_rejected_total")
+    before = rejected.value()
+
+    with pytest.raises(XmlPreflightError, match=message):
+        check_route_xml(xml)
+
+    assert rejected.value() == before + 1
+
+
+def test_checks_in_worker_pool():
+    async def _check():
+        await asyncio.gather(
+            *[xml_preflight.check_route_xml_async(ROUTE) for _ in range(8)]
+        )
+        with pytest.raises(XmlPreflightError):
+            await xml_preflight.check_route_xml_async("<beans/>")
+
+    try:
+        asyncio.run(_check())
+    finally:
+        xml_preflight.shutdown()
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+# Set by proxies (nginx, HAProxy, Heroku router) to the time the request was first seen.
+REQUEST_START_HEADER = "x-request-start"
+
+# Offset used to convert perf_counter timestamps into wall-clock timestamps for export.
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+
+
+class RequestTrace:
+    """
+    Collects the spans recorded while handling a single request.
+
+    Spans may be recorded from worker threads (e.g. k8s_client calls made through `asyncio.to_thread`),
+    so recording is guarded by a lock.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start_ns = time.perf_counter_ns()
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start_ns: int, duration_ns: int) -> None:
+        span = Span(name, start_ns, max(duration_ns, 0), threading.get_ident())
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def server_timing(self) -> str:
+        """
+        Render the recorded spans as a Server-Timing header value.
+
+        Spans sharing a name (e.g. one 'configmap' span per route in a batch) are summed into a single
+        metric, preserving the order in which each name was first recorded.
+        """
+        totals = {}
+        for s in self.spans:
+            totals[s.name] = totals.get(s.name, 0) + s.duration_ns
+        total = time.perf_counter_ns() - self.start_ns
+        metrics = [f"{name};dur={ns / 1e6:.3f}" for name, ns in totals.items()]
+        metrics.append(f"total;dur={total / 1e6:.3f}")
+        return ", ".join(metrics)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block and record it on the current request's trace, if any."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter_ns() - start)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def parse_request_start(value: str) -> Optional[int]:
+    """
+    Parse an X-Request-Start header into epoch nanoseconds.
+
+    Proxies disagree on the unit, so seconds, milliseconds and microseconds are all accepted,
+    optionally prefixed with 't='.
+    """
+    try:
+        ts = Decimal(value.strip().removeprefix("t="))
+    except InvalidOperation:
+        return None
+    if not ts.is_finite():
+        return None
+
+    if ts > 1e14:
+        return int(ts * 1_000)
+    if ts > 1e11:
+        return int(ts * 1_000_000)
+    return int(ts * 1_000_000_000)
+
+
+class TraceFileExporter:
+    """
+    Appends finished request traces to a file using the Chrome Trace Event format, which can be loaded
+    directly into Perfetto or chrome://tracing.
+
+    The format allows the closing ']' of the event array to be omitted, so events are appended as they
+    arrive and the file stays valid if the process is killed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def export(self, trace: RequestTrace) -> None:
+        events = [
+            self._event(
+                trace.name,
+                trace.start_ns,
+                time.perf_counter_ns() - trace.start_ns,
+                threading.get_ident(),
+                trace,
+            )
+        ]
+        events.extend(
+            self._event(s.name, s.start_ns, s.duration_ns, s.thread_id, trace)
+            for s in trace.spans
+        )
+        lines = "".join(f"{json.dumps(e)},\n" for e in events)
+
+        with self._lock:
+            try:
+                is_new = (
+                    not os.path.exists(self._path) or os.path.getsize(self._path) == 0
+                )
+                with open(self._path, "a") as f:
+                    if is_new:
+                        f.write("[\n")
+                    f.write(lines)
+            except OSError as e:
+                _LOGGER.warning("Failed to export trace to '%s': %s", self._path, e)
+
+    def _event(
+        self, name, start_ns, duration_ns, thread_id, trace: RequestTrace
+    ) -> dict:
+        return {
+            "name": name,
+            "cat": "keip",
+            "ph": "X",
+            "ts": (start_ns + _EPOCH_OFFSET_NS) / 1_000,
+            "dur": duration_ns / 1_000,
+            "pid": self._pid,
+            "tid": thread_id,
+            "args": {"trace_id": trace.trace_id, "request": trace.name},
+        }
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that starts a trace for every HTTP request and reports the recorded spans in a
+    Server-Timing response header.
+
+    If the request carries an X-Request-Start header, the time spent between the proxy receiving the
+    request and the app picking it up is reported as a 'queue' span.
+    """
+
+    def __init__(self, app: ASGIApp, export_file: str = "") -> None:
+        self.app = app
+        self.exporter = TraceFileExporter(export_file) if export_file else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(f"{scope['method']} {scope['path']}")
+        self._record_queue_time(scope, trace)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(SERVER_TIMING_HEADER, trace.server_timing())
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            if self.exporter:
+                self.exporter.export(trace)
+
+    @staticmethod
+    def _record_queue_time(scope: Scope, trace: RequestTrace) -> None:
+        for key, value in scope.get("headers", []):
+            if key.decode("latin-1").lower() == REQUEST_START_HEADER:
+                request_start_ns = parse_request_start(value.decode("latin-1"))
+                if request_start_ns is None:
+                    return
+                queued_ns = max(time.time_ns() - request_start_ns, 0)
+                trace.add("queue", trace.start_ns - queued_ns, queued_ns)
+                return
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from xml.parsers import expat
+
+import config as cfg
+from core import metrics
+
+BEANS_NS = "http://www.springframework.org/schema/beans"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+# Expat is fed the route in slices, so its buffers stay small however large the route
+_FEED_CHARS = 64 * 1024
+
+_REJECTED = metrics.counter(
+    "keip_route_xml_rejected_total", "Routes rejected by the XML pre-flight check"
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+class XmlPreflightError(ValueError):
+    def __init__(self, message: str, line: int = 0, column: int = 0) -> None:
+        if line:
+            message = f"line {line}, column {column}: {message}"
+        super().__init__(message)
+        self.line = line
+        self.column = column
+
+
+def _split(name: str) -> tuple:
+    uri, _, local = name.rpartition(" ")
+    return uri, local
+
+
+class _RouteChecker:
+    """
+    Checks a route's structure with expat's callbacks as it is parsed, without building a tree.
+
+    Expat parsers cannot be reset, so a (cheap) parser is created per route, but each worker thread keeps its
+    checker and its bound handlers.
+    """
+
+    def __init__(self) -> None:
+        self._parser = None
+        self._depth = 0
+        self._definitions = 0
+
+    def check(self, xml: str) -> None:
+        # The route has already been decoded, so its encoding declaration is ignored
+        parser = expat.ParserCreate(encoding="utf-8", namespace_separator=" ")
+        parser.StartDoctypeDeclHandler = self._doctype
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        self._parser = parser
+        self._depth = 0
+        self._definitions = 0
+        try:
+            for start in range(0, len(xml), _FEED_CHARS):
+                parser.Parse(xml[start : start + _FEED_CHARS], False)
+            parser.Parse("", True)
+        except expat.ExpatError as e:
+            raise XmlPreflightError(
+                expat.ErrorString(e.code), e.lineno, e.offset
+            ) from None
+        finally:
+            self._parser = None
+        if self._definitions == 0:
+            raise XmlPreflightError("Route must define at least one bean")
+
+    def _fail(self, message: str) -> None:
+        raise XmlPreflightError(
+            message,
+            self._parser.CurrentLineNumber,
+            self._parser.CurrentColumnNumber,
+        )
+
+    def _doctype(self, *args) -> None:
+        self._fail("DOCTYPE declarations are not allowed")
+
+    def _start(self, name: str, attrs: Dict[str, str]) -> None:
+        uri, local = _split(name)
+        if self._depth == 0:
+            if (uri, local) != (BEANS_NS, "beans"):
+                self._fail(f'Root element must be <beans xmlns="{BEANS_NS}">')
+            locations = attrs.get(f"{XSI_NS} schemaLocation", "").split()
+            if len(locations) % 2:
+                self._fail("xsi:schemaLocation must list namespace and location pairs")
+        elif self._depth == 1:
+            self._definitions += 1
+            # Abstract beans are templates for others, which can supply the class
+            if (
+                (uri, local) == (BEANS_NS, "bean")
+                and attrs.get("abstract") != "true"
+                and not (attrs.keys() & {"class", "parent", "factory-bean"})
+            ):
+                self._fail(
+                    "<bean> needs a 'class', 'parent' or 'factory-bean', or to be abstract"
+                )
+        self._depth += 1
+
+    def _end(self, name: str) -> None:
+        self._depth -= 1
+
+
+def check_route_xml(xml: str) -> None:
+    """
+    Check that a route is well-formed XML defining Spring beans: its root must be `<beans>` in the Spring
+    beans namespace with at least one definition in it, every prefix must be declared, and DOCTYPEs (and with
+    them entity expansion) are refused.
+
+    Raises:
+        XmlPreflightError: If the route fails the check, with the position of the first problem.
+    """
+    checker = getattr(_local, "checker", None)
+    if checker is None:
+        checker = _local.checker = _RouteChecker()
+    try:
+        checker.check(xml)
+    except XmlPreflightError:
+        _REJECTED.inc()
+        raise
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=cfg.ROUTE_XML_PREFLIGHT_WORKERS,
+                thread_name_prefix="xml-preflight",
+            )
+        return _executor
+
+
+async def check_route_xml_async(xml: str) -> None:
+    """Run `check_route_xml` in the pre-flight worker pool, keeping the event loop free while it parses."""
+    await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), check_route_xml, xml
+    )
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
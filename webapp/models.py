@@ -1,10 +1,12 @@
+import hashlib
 import re
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
+from functools import cached_property
 
 from pydantic import BaseModel, Field, field_validator
-from typing import List
+from typing import List, Optional
 
 
 class Status(str, Enum):
@@ -12,6 +14,7 @@ class Status(str, Enum):
     DELETED = "deleted"
     UPDATED = "updated"
     RECREATED = "recreated"
+    UNCHANGED = "unchanged"
 
 
 class Route(BaseModel):
@@ -35,6 +38,15 @@ class Route(BaseModel):
 
         return value
 
+    @cached_property
+    def digest(self) -> str:
+        """A digest of the route's content, hashed once however many times it is compared."""
+        content = hashlib.sha256()
+        for value in (self.name, self.namespace, self.xml):
+            content.update(value.encode())
+            content.update(b"\0")
+        return content.hexdigest()
+
 
 class RouteRequest(BaseModel):
     routes: List[Route] = Field(min_length=1)
@@ -51,3 +63,17 @@ class RouteData:
 class Resource:
     name: str
     status: Status
+
+
+@dataclass
+class RouteResult:
+    name: str
+    namespace: str
+    # The HTTP status the route would get if it had been deployed on its own
+    status: int = 200
+    resources: List[Resource] = field(default_factory=list)
+    error: Optional[str] = None
+    # Whether deploying the route again may succeed without changing it
+    retryable: bool = False
+    # Seconds until a route rejected by the rate limits is expected to get through
+    retry_after: Optional[int] = None
@@ -0,0 +1,127 @@
+import json
+import logging
+import random
+import re
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Mapping, Optional
+
+import config as cfg
+
+_LOGGER = logging.getLogger(__name__)
+
+REDACTED = "<redacted>"
+
+# Keys whose string values are treated as secrets, e.g. 'password', 'apiToken', 'client_secret'.
+_SENSITIVE_KEY = re.compile(
+    r"password|passwd|secret|token|credential|api[-_]?key|private[-_]?key",
+    re.IGNORECASE,
+)
+
+# Keys that match the pattern above but only reference a secret by name (e.g. 'secretName',
+# 'passwordSecretRef', 'secretSources'), which is useful for replay and safe to keep.
+_REFERENCE_KEY = re.compile(r"(Name|Ref|Refs|Sources?)$")
+
+
+def _is_sensitive_key(key: str) -> bool:
+    return bool(_SENSITIVE_KEY.search(key)) and not _REFERENCE_KEY.search(key)
+
+
+def redact(value: Any) -> Any:
+    """
+    Return a copy of a JSON value with secret-looking fields replaced by a placeholder.
+
+    Besides keys that look sensitive, the 'value' of name/value pairs such as container env vars
+    (e.g. {"name": "DB_PASSWORD", "value": "..."}) is redacted when the name looks sensitive.
+    The data of any embedded Secret object is always redacted.
+    """
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    is_secret_obj = value.get("kind") == "Secret"
+    name = value.get("name")
+    is_sensitive_pair = isinstance(name, str) and _is_sensitive_key(name)
+
+    redacted = {}
+    for k, v in value.items():
+        if isinstance(v, str) and (
+            _is_sensitive_key(k) or (is_sensitive_pair and k == "value")
+        ):
+            redacted[k] = REDACTED
+        elif is_secret_obj and k in ("data", "stringData") and isinstance(v, dict):
+            redacted[k] = {key: REDACTED for key in v}
+        else:
+            redacted[k] = redact(v)
+    return redacted
+
+
+class TrafficCapture:
+    """
+    Writes a sample of webhook requests and their responses to a size-rotated JSON-lines file.
+
+    Each record carries a wall-clock timestamp so a replay can reproduce the inter-arrival timing of
+    the captured traffic.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+    ) -> None:
+        self.path = path
+        self.sample_rate = sample_rate
+        self._logger = logging.getLogger(f"{__name__}.{path}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def should_sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(
+        self, path: str, request: Mapping, response: Mapping, status_code: int = 200
+    ) -> None:
+        record = {
+            "ts": time.time(),
+            "path": path,
+            "status": status_code,
+            "request": redact(request),
+            "response": redact(response),
+        }
+        try:
+            self._logger.info(json.dumps(record, separators=(",", ":")))
+        except (TypeError, ValueError) as e:
+            _LOGGER.warning("Failed to capture webhook request: %s", e)
+
+
+_configured_capture: Optional[TrafficCapture] = None
+
+
+def get_configured_capture() -> Optional[TrafficCapture]:
+    """Return the capture configured through 'WEBHOOK_CAPTURE_*' settings, or None if disabled."""
+    global _configured_capture
+    if not cfg.WEBHOOK_CAPTURE_FILE:
+        return None
+    if _configured_capture is None:
+        _LOGGER.warning(
+            "Capturing %.0f%% of webhook requests to '%s'",
+            cfg.WEBHOOK_CAPTURE_SAMPLE_RATE * 100,
+            cfg.WEBHOOK_CAPTURE_FILE,
+        )
+        _configured_capture = TrafficCapture(
+            cfg.WEBHOOK_CAPTURE_FILE,
+            sample_rate=cfg.WEBHOOK_CAPTURE_SAMPLE_RATE,
+            max_bytes=cfg.WEBHOOK_CAPTURE_MAX_BYTES,
+            backup_count=cfg.WEBHOOK_CAPTURE_BACKUP_COUNT,
+        )
+    return _configured_capture
@@ -0,0 +1,94 @@
+import hmac
+import logging
+
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_409_CONFLICT,
+)
+
+import config as cfg
+from core.diagnostics import MemoryProfiler, memory_report
+
+_LOGGER = logging.getLogger(__name__)
+
+_profiler = MemoryProfiler()
+
+
+def _authorize(request: Request) -> None:
+    """Require a matching bearer token when 'DEBUG_ENDPOINTS_TOKEN' is set."""
+    if not cfg.DEBUG_ENDPOINTS_TOKEN:
+        return
+
+    expected = f"Bearer {cfg.DEBUG_ENDPOINTS_TOKEN}"
+    actual = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(actual.encode(), expected.encode()):
+        raise HTTPException(status_code=HTTP_401_UNAUTHORIZED)
+
+
+def _int_param(request: Request, name: str, default: int) -> int:
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = -1
+    if parsed < 1:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Query parameter '{name}' must be a positive integer",
+        )
+    return parsed
+
+
+async def memory(request: Request):
+    """Report RSS, GC generation counts, in-process cache sizes and the tracemalloc state."""
+    _authorize(request)
+    return JSONResponse(memory_report() | {"tracemalloc": _profiler.status()})
+
+
+async def start_tracemalloc(request: Request):
+    _authorize(request)
+    frames = _int_param(request, "frames", 1)
+    _LOGGER.warning("Starting tracemalloc with %d frame(s)", frames)
+    return JSONResponse(_profiler.start(frames))
+
+
+async def stop_tracemalloc(request: Request):
+    _authorize(request)
+    _LOGGER.warning("Stopping tracemalloc")
+    return JSONResponse(_profiler.stop())
+
+
+async def snapshot(request: Request):
+    """
+    Take a tracemalloc snapshot and return the top allocation sites, along with the diff against the
+    previous snapshot if there is one.
+    """
+    _authorize(request)
+    limit = _int_param(request, "limit", 20)
+    group_by = request.query_params.get("groupBy", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="Query parameter 'groupBy' must be one of: lineno, filename, traceback",
+        )
+
+    try:
+        result = _profiler.snapshot(limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=HTTP_409_CONFLICT, detail=str(e))
+    return JSONResponse(result)
+
+
+routes = [
+    Route("/memory", memory, methods=["GET"]),
+    Route("/memory/tracemalloc/start", start_tracemalloc, methods=["POST"]),
+    Route("/memory/tracemalloc/stop", stop_tracemalloc, methods=["POST"]),
+    Route("/memory/snapshot", snapshot, methods=["POST"]),
+]
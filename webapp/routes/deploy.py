@@ -1,28 +1,883 @@
 import asyncio
+import hashlib
 import logging
 import json
+import math
 
-from dataclasses import asdict
+from contextlib import aclosing
+from dataclasses import asdict, dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from kubernetes.client.rest import ApiException
 
 from pydantic import ValidationError
 
 from starlette.exceptions import HTTPException
-from starlette.responses import JSONResponse
-from starlette.requests import Request
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
+    HTTP_207_MULTI_STATUS,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+    HTTP_413_CONTENT_TOO_LARGE,
+    HTTP_422_UNPROCESSABLE_CONTENT,
+    HTTP_424_FAILED_DEPENDENCY,
+    HTTP_429_TOO_MANY_REQUESTS,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect, Request
+from starlette.types import Receive, Scope, Send
 
-from models import RouteData, RouteRequest
-from core import k8s_client
+import config as cfg
+from models import Resource, Route, RouteData, RouteRequest, RouteResult, Status
+from core import k8s_client, xml_preflight
+from core.archive_stream import (
+    ArchiveEntry,
+    ArchiveStream,
+    ArchiveStreamError,
+    EntryTooLargeError,
+    InflatedTooLargeError,
+)
+from core.diagnostics import register_cache
+from core.idempotency import ResultCache
+from core.json_stream import ItemTooLargeError, JsonArrayStream, JsonStreamError
+from core.jobs import Job, JobManager, QueueFullError
+from core.readiness import ReadinessWaiter
+from core.rate_limit import (
+    ConcurrencyLimiter,
+    FairRateLimiter,
+    RateLimitedError,
+    parse_weights,
+)
+from core.tracing import span
 
 
 _LOGGER = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+WRITES_SKIPPED_HEADER = "X-Keip-Writes-Skipped"
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Content types of '/route' bodies read as archives of route files rather than JSON
+ARCHIVE_MEDIA_TYPES = frozenset(
+    {
+        "application/x-tar",
+        "application/zip",
+        "application/x-zip-compressed",
+        "application/gzip",
+        "application/x-gzip",
+        "application/x-gtar",
+        "application/x-compressed-tar",
+    }
+)
+
+_MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Longest a route status stream waits for its watch to list the routes before deploying them
+_WAIT_SYNC_SECONDS = 10.0
+# Failed routes that may deploy if they are sent again unchanged
+_RETRYABLE_STATUSES = k8s_client.RETRYABLE_STATUSES
+
+_deploy_limiter = ConcurrencyLimiter("deploy", cfg.DEPLOY_MAX_CONCURRENCY)
+_rate_limiter = FairRateLimiter(
+    "deploy",
+    cfg.DEPLOY_RATE_LIMIT_QPS,
+    cfg.DEPLOY_RATE_LIMIT_BURST,
+    key_rate=cfg.DEPLOY_NAMESPACE_QPS,
+    key_burst=cfg.DEPLOY_NAMESPACE_BURST,
+    client_rate=cfg.DEPLOY_CLIENT_QPS,
+    client_burst=cfg.DEPLOY_CLIENT_BURST,
+    weights=parse_weights(cfg.DEPLOY_NAMESPACE_WEIGHTS),
+)
+
+jobs = JobManager(
+    workers=cfg.DEPLOY_JOB_WORKERS,
+    max_queued=cfg.DEPLOY_JOB_MAX_QUEUED,
+    retention_count=cfg.DEPLOY_JOB_RETENTION_COUNT,
+    retention_seconds=cfg.DEPLOY_JOB_RETENTION_SECONDS,
+)
+register_cache("deploy_jobs", lambda: len(jobs))
+
+
+@dataclass
+class _StoredResponse:
+    """A response to a request with an 'Idempotency-Key', kept to be replayed to its retries."""
+
+    status_code: int
+    media_type: Optional[str]
+    headers: Dict[str, str]
+    streamed: bool
+    content: bytes = b""
+    body_digest: str = ""
+    # Whether any of its routes failed, for a streamed response, whose status can't tell
+    failed: bool = False
+
+    def to_response(self, replayed: bool = False) -> Response:
+        headers = dict(self.headers)
+        if replayed:
+            headers[REPLAYED_HEADER] = "true"
+        return Response(
+            self.content,
+            status_code=self.status_code,
+            headers=headers,
+            media_type=self.media_type,
+        )
+
+
+@dataclass
+class _StreamOutcome:
+    """Whether any route of a streamed response failed, known once the stream ends."""
+
+    failed: bool = False
+
+
+# Responses by idempotency key, and the resources deployed for each route, by namespace and name
+_responses: ResultCache[_StoredResponse] = ResultCache(
+    "idempotency_keys",
+    cfg.ROUTE_IDEMPOTENCY_TTL_SECONDS,
+    cfg.ROUTE_IDEMPOTENCY_MAX_ENTRIES,
+)
+_route_results: ResultCache[Tuple[Resource, ...]] = ResultCache(
+    "routes", cfg.ROUTE_DEDUPE_TTL_SECONDS, cfg.ROUTE_IDEMPOTENCY_MAX_ENTRIES
+)
+# Executions of requests with an 'Idempotency-Key', which outlive their request if it is abandoned
+_background: Set[asyncio.Task] = set()
+
+
+@dataclass
+class _InvalidRoute:
+    """A route in the request body that failed validation, with its errors located in the whole body."""
+
+    item: Any
+    errors: List[dict]
+
+
+@dataclass
+class _UncheckedRoute:
+    """A valid route whose XML is still to be pre-flight checked, with the location to report errors at."""
+
+    loc: List[Any]
+    route: Route
+
+
+# A route as read from the request body
+_ReadRoute = Union[Route, _UncheckedRoute, _InvalidRoute]
+
+
+@dataclass
+class _SkippedRoute:
+    """A valid route that was not deployed, as it came after an invalid one."""
+
+    name: str
+    namespace: str
+
+
+class _BodyStreamingResponse(StreamingResponse):
+    """
+    A streaming response sent while the request body is still being read. Starlette's would otherwise
+    listen for the client disconnecting by receiving messages, consuming the body from under the reader; a
+    disconnect surfaces while reading the body or sending the response instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+def _validate_route(index: int, raw: bytes) -> Union[Route, _InvalidRoute]:
+    # Validated straight from the body's bytes, so that a route's XML is decoded once, into the string the
+    # rest of the deployment refers to, without an intermediate dict
+    with span("validate"):
+        try:
+            return Route.model_validate_json(raw)
+        except ValidationError as e:
+            errors = [
+                dict(error, loc=["routes", index, *error["loc"]])
+                for error in json.loads(e.json())
+            ]
+    # Only invalid routes are decoded again, to report them (or to raise a malformed one)
+    with span("decode"):
+        item = json.loads(raw)
+    return _InvalidRoute(item, errors)
+
+
+async def _preflight(loc: List[Any], route: Route) -> Union[Route, _InvalidRoute]:
+    with span("preflight"):
+        try:
+            await xml_preflight.check_route_xml_async(route.xml)
+        except xml_preflight.XmlPreflightError as e:
+            error = {
+                "type": "xml_preflight",
+                "loc": [*loc, "xml"],
+                "msg": str(e),
+            }
+            return _InvalidRoute(
+                {"name": route.name, "namespace": route.namespace}, [error]
+            )
+    return route
+
+
+async def _checked(route: _ReadRoute) -> Union[Route, _InvalidRoute]:
+    if isinstance(route, _UncheckedRoute):
+        return await _preflight(route.loc, route.route)
+    return route
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=HTTP_413_CONTENT_TOO_LARGE, detail=detail)
+
+
+def _is_archive(request: Request) -> bool:
+    media_type = request.headers.get("content-type", "").split(";")[0]
+    return media_type.strip().lower() in ARCHIVE_MEDIA_TYPES
+
+
+def _is_route_entry(path: str) -> bool:
+    # Files other than routes, and the hidden files some archivers add, are skipped
+    parts = path.removeprefix("./").split("/")
+    return parts[-1].endswith(".xml") and not any(
+        part.startswith((".", "__MACOSX")) for part in parts
+    )
+
+
+def _validate_entry(entry: ArchiveEntry) -> Union[Route, _InvalidRoute]:
+    path = entry.path.removeprefix("./")
+    namespace, _, file_name = path.rpartition("/")
+    item = {"name": file_name.removesuffix(".xml"), "namespace": namespace}
+    with span("validate"):
+        if not namespace or "/" in namespace:
+            error = {
+                "type": "archive_path",
+                "loc": ["archive", path, "path"],
+                "msg": "Archive entries must be named 'namespace/name.xml'",
+            }
+            return _InvalidRoute(item, [error])
+        try:
+            xml = entry.data.decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            error = {
+                "type": "unicode_decode",
+                "loc": ["archive", path, "xml"],
+                "msg": f"Route XML must be UTF-8: {e}",
+            }
+            return _InvalidRoute(item, [error])
+        try:
+            return Route(**item, xml=xml)
+        except ValidationError as e:
+            errors = [
+                dict(error, loc=["archive", path, *error["loc"]])
+                for error in json.loads(e.json())
+            ]
+    return _InvalidRoute(item, errors)
+
+
+async def _body_chunks(request: Request) -> AsyncIterator[bytes]:
+    """
+    Raises:
+        HTTPException: If the body is too large (413).
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > cfg.ROUTE_MAX_BODY_BYTES:
+        raise _too_large(f"Request body exceeds {cfg.ROUTE_MAX_BODY_BYTES} bytes")
+
+    body_hash = getattr(request.state, "body_hash", None)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > cfg.ROUTE_MAX_BODY_BYTES:
+            raise _too_large(f"Request body exceeds {cfg.ROUTE_MAX_BODY_BYTES} bytes")
+        if body_hash is not None:
+            body_hash.update(chunk)
+        yield chunk
+
+
+async def _parse_json(request: Request) -> AsyncIterator[Union[Route, _InvalidRoute]]:
+    parser = JsonArrayStream("routes", cfg.ROUTE_MAX_ITEM_BYTES)
+    count = 0
+    try:
+        async for chunk in _body_chunks(request):
+            for raw in parser.feed(chunk):
+                yield _validate_route(count, raw)
+                count += 1
+        parser.close()
+    except ItemTooLargeError as e:
+        raise _too_large(f"Route exceeds {cfg.ROUTE_MAX_ITEM_BYTES} bytes") from e
+    except (JsonStreamError, json.JSONDecodeError) as e:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail=f"Malformed JSON body: {e}"
+        ) from e
+
+    if count == 0:
+        # Report a missing, empty or mistyped 'routes' the way the full request model does
+        if not parser.key_seen:
+            RouteRequest.model_validate({})
+        RouteRequest.model_validate({"routes": [] if parser.found else None})
+
+
+async def _parse_archive(
+    request: Request,
+) -> AsyncIterator[Union[Route, _InvalidRoute]]:
+    archive = ArchiveStream(
+        cfg.ROUTE_MAX_ITEM_BYTES, _is_route_entry, cfg.ROUTE_MAX_INFLATED_BYTES
+    )
+    count = 0
+    try:
+        async for chunk in _body_chunks(request):
+            # Entries are extracted one at a time, as each route is taken
+            for entry in archive.feed(chunk):
+                yield _validate_entry(entry)
+                count += 1
+        archive.close()
+    except (EntryTooLargeError, InflatedTooLargeError) as e:
+        raise _too_large(str(e)) from e
+    except ArchiveStreamError as e:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail=f"Malformed archive: {e}"
+        ) from e
+
+    if count == 0:
+        RouteRequest.model_validate({"routes": []})
+
+
+async def _read_routes(request: Request) -> AsyncIterator[_ReadRoute]:
+    """
+    Parse the routes out of the request body as it arrives, yielding each one as soon as it is complete.
+    Only the route being received is buffered, and the body is not read any further than its consumer.
+    Valid routes are yielded as `_UncheckedRoute`s if their XML is to be pre-flight checked, which is left
+    to the consumer so that checking a route doesn't hold up reading the next one.
+
+    The body is either JSON or, if its content type is one of ARCHIVE_MEDIA_TYPES, a tar or zip archive
+    (optionally gzip-compressed) of 'namespace/name.xml' files.
+
+    Raises:
+        HTTPException: If the body or a route is too large (413), or the body is malformed (400).
+        ValidationError: If the body has no routes.
+    """
+    archive = _is_archive(request)
+    parsed = _parse_archive(request) if archive else _parse_json(request)
+    seen = set()
+    index = 0
+    async with aclosing(parsed) as routes:
+        async for route in routes:
+            if isinstance(route, Route):
+                # Identical entries are deployed, and reported, once
+                key = (route.namespace, route.name, route.digest)
+                if key in seen:
+                    _LOGGER.info("Skipping duplicate of route '%s'", route.name)
+                    index += 1
+                    continue
+                seen.add(key)
+                if cfg.ROUTE_XML_PREFLIGHT_ENABLED:
+                    loc = (
+                        ["archive", f"{route.namespace}/{route.name}.xml"]
+                        if archive
+                        else ["routes", index]
+                    )
+                    route = _UncheckedRoute(loc, route)
+            index += 1
+            yield route
+
+
+async def _dispatch(
+    routes: AsyncIterator[_ReadRoute],
+    func: Callable[[Route], Awaitable[Any]],
+    stop_on_invalid: bool = False,
+) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Pre-flight check and run `func` on each route as soon as it is read, yielding `(index, result)` in
+    completion order. An exception raised by `func` is yielded as its result, and invalid routes are yielded
+    as they are read or fail their check. With `stop_on_invalid`, a route is only run once every route ahead
+    of it passed its check, and none are after the first invalid one: the valid routes after it are yielded
+    as `_SkippedRoute`s, and the rest are still read and checked to report their errors.
+
+    At most 'DEPLOY_MAX_CONCURRENCY' routes of a request are in flight, checks included, and reading pauses
+    while they are, so the memory held for a request is bounded by that many routes however many its body
+    carries. The routes in flight are checked in parallel, and reading goes on while they are.
+    """
+    slots = asyncio.Semaphore(cfg.DEPLOY_MAX_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: Set[asyncio.Task] = set()
+    # The routes being checked, by index
+    checking: Set[int] = set()
+    checked = asyncio.Condition()
+    first_invalid: Optional[int] = None
+
+    def _invalid(index: int) -> None:
+        nonlocal first_invalid
+        if first_invalid is None or index < first_invalid:
+            first_invalid = index
+
+    async def _check(index: int, route: _ReadRoute) -> Union[Route, _InvalidRoute]:
+        try:
+            route = await _checked(route)
+            if isinstance(route, _InvalidRoute):
+                _invalid(index)
+            return route
+        finally:
+            async with checked:
+                checking.discard(index)
+                checked.notify_all()
+
+    async def _run(index: int, route: _ReadRoute) -> None:
+        try:
+            route = await _check(index, route)
+            if isinstance(route, _InvalidRoute):
+                result = route
+            else:
+                if stop_on_invalid:
+                    async with checked:
+                        await checked.wait_for(
+                            lambda: min(checking, default=index) >= index
+                        )
+                if (
+                    stop_on_invalid
+                    and first_invalid is not None
+                    and first_invalid < index
+                ):
+                    result = _SkippedRoute(route.name, route.namespace)
+                else:
+                    result = await func(route)
+        except Exception as e:
+            result = e
+        finally:
+            slots.release()
+        results.put_nowait((index, result))
+
+    async def _read() -> int:
+        index = 0
+        async for route in routes:
+            if isinstance(route, _InvalidRoute):
+                _invalid(index)
+                results.put_nowait((index, route))
+            else:
+                await slots.acquire()
+                checking.add(index)
+                task = asyncio.create_task(_run(index, route))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            index += 1
+        return index
+
+    reader = asyncio.create_task(_read())
+    received = 0
+    try:
+        while True:
+            if reader.done():
+                # Raises the reader's error, if any
+                if received == reader.result():
+                    break
+                result = await results.get()
+            else:
+                getter = asyncio.ensure_future(results.get())
+                await asyncio.wait(
+                    (getter, reader), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                result = getter.result()
+            received += 1
+            yield result
+    finally:
+        # Stop reading and deploying the remaining routes if the consumer goes away
+        reader.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def _peek(
+    routes: AsyncIterator[_ReadRoute],
+) -> AsyncIterator[_ReadRoute]:
+    """Read the first route, so that an empty or malformed body is raised before a response is started."""
+    first = await routes.__anext__()
+
+    async def _routes() -> AsyncIterator[_ReadRoute]:
+        yield first
+        async for route in routes:
+            yield route
+
+    return _routes()
+
+
+async def _deploy(
+    route: Route,
+    snapshot: k8s_client.BatchSnapshot,
+    client: str = "",
+    max_wait: Optional[float] = None,
+) -> Tuple[Resource, ...]:
+    """
+    Deploy a route, unless an identical deployment of it is in flight, in which case its resources are
+    returned instead, or finished less than 'ROUTE_DEDUPE_TTL_SECONDS' ago, in which case its resources
+    are reported as unchanged. Deployments of different versions of a route are applied one after the
+    other, in the order they were requested.
+
+    Raises:
+        RateLimitedError: If the route would wait for the deployment rate limits longer than `max_wait`.
+    """
+    resources, _ = await _route_results.get_or_run(
+        (route.namespace, route.name),
+        lambda: _apply_route(route, snapshot, client, max_wait),
+        tag=route.digest,
+        cached_as=_as_unchanged,
+    )
+    return resources
+
+
+def _as_unchanged(resources: Tuple[Resource, ...]) -> Tuple[Resource, ...]:
+    return tuple(Resource(name=r.name, status=Status.UNCHANGED) for r in resources)
+
+
+async def _apply_route(
+    route: Route,
+    snapshot: k8s_client.BatchSnapshot,
+    client: str,
+    max_wait: Optional[float],
+) -> Tuple[Resource, ...]:
+    route_data = RouteData(
+        route_name=route.name,
+        route_xml=route.xml,
+        namespace=route.namespace,
+    )
+    # Routes waiting for the rate limits don't hold a concurrency slot
+    with span("rate_limit"):
+        await _rate_limiter.acquire(route.namespace, client, max_wait)
+    async with _deploy_limiter:
+        _LOGGER.info("Creating resources for route: %s", route_data.route_name)
+        if cfg.K8S_ASYNC_CLIENT_ENABLED:
+            return await k8s_client.create_route_resources_async(route_data, snapshot)
+        return await asyncio.to_thread(
+            k8s_client.create_route_resources, route_data, snapshot
+        )
+
+
+def _count_unchanged(resources: List[Resource]) -> int:
+    return sum(r.status == Status.UNCHANGED for r in resources)
+
+
+def _log_batch(routes: int, resources: int, skipped: int) -> None:
+    _LOGGER.info(
+        "Deployed %d route(s): %d of %d resource writes skipped as unchanged",
+        routes,
+        skipped,
+        resources,
+    )
+
+
+async def _deploy_result(
+    route: Route,
+    snapshot: k8s_client.BatchSnapshot,
+    client: str = "",
+    max_wait: Optional[float] = None,
+) -> RouteResult:
+    """
+    Deploy a single route, reporting a failure in the result instead of raising it. The result's status
+    is the one the route would get if it had been deployed on its own.
+    """
+    try:
+        resources = await _deploy(route, snapshot, client, max_wait)
+    except RateLimitedError as e:
+        _LOGGER.warning("Rejected route '%s': %s", route.name, e)
+        result = _failed(
+            route.name, route.namespace, HTTP_429_TOO_MANY_REQUESTS, str(e)
+        )
+        result.retry_after = _retry_after_seconds(e)
+        return result
+    except ApiException as e:
+        _LOGGER.error("Failed to deploy route '%s': %s", route.name, e)
+        return _failed(
+            route.name,
+            route.namespace,
+            e.status or HTTP_503_SERVICE_UNAVAILABLE,
+            f"Kubernetes API error: {e.status} {e.reason}",
+        )
+    except Exception as e:
+        _LOGGER.error("Failed to deploy route '%s': %s", route.name, e, exc_info=True)
+        result = _failed(
+            route.name,
+            route.namespace,
+            HTTP_500_INTERNAL_SERVER_ERROR,
+            "Internal server error",
+        )
+        # Unlike a 500 from the API server, a bug or bad data here fails the same way again
+        result.retryable = False
+        return result
+    created = any(r.status == Status.CREATED for r in resources)
+    return RouteResult(
+        name=route.name,
+        namespace=route.namespace,
+        status=HTTP_201_CREATED if created else HTTP_200_OK,
+        resources=list(resources),
+    )
+
+
+def _failed(name: str, namespace: str, status: int, error: str) -> RouteResult:
+    return RouteResult(
+        name=name,
+        namespace=namespace,
+        status=status,
+        error=error,
+        retryable=status in _RETRYABLE_STATUSES,
+    )
+
+
+def _invalid_result(route: _InvalidRoute) -> RouteResult:
+    item = route.item if isinstance(route.item, dict) else {}
+    messages = "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'][2:])}: {error['msg']}"
+        for error in route.errors
+    )
+    return _failed(
+        str(item.get("name", "")),
+        str(item.get("namespace", "default")),
+        HTTP_422_UNPROCESSABLE_CONTENT,
+        f"Validation failed: {messages}",
+    )
+
+
+def _skipped_result(route: _SkippedRoute) -> RouteResult:
+    return RouteResult(
+        name=route.name,
+        namespace=route.namespace,
+        status=HTTP_424_FAILED_DEPENDENCY,
+        error="Not deployed: an earlier route in the request failed validation",
+        retryable=True,
+    )
+
+
+def _summary(total: int, failed: int, skipped: int) -> dict:
+    return {
+        "total": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "writes_skipped": skipped,
+    }
+
+
+async def _stream_results(
+    routes: AsyncIterator[_ReadRoute],
+    client: str = "",
+    waiter: Optional[ReadinessWaiter] = None,
+    outcome: Optional[_StreamOutcome] = None,
+) -> AsyncIterator[str]:
+    """
+    Deploy routes as they are read, yielding one NDJSON line per route in completion order and a final
+    summary line. Invalid routes are reported in their own line without failing the rest. If the body
+    turns out to be too large or malformed after streaming started, an error line ends the response.
+
+    The routes that deploy are expected by `waiter`, if given, and any failure is recorded in `outcome`.
+    """
+    outcome = outcome or _StreamOutcome()
+    snapshot = k8s_client.BatchSnapshot()
+    total = failed = resources = skipped = 0
+
+    def _deploy_tracked(route: Route) -> Awaitable[RouteResult]:
+        if waiter is not None:
+            waiter.track(route.namespace, route.name)
+        return _deploy_result(
+            route, snapshot, client, cfg.DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS
+        )
+
+    try:
+        dispatched = _dispatch(routes, _deploy_tracked)
+        async with aclosing(dispatched) as results:
+            async for _, result in results:
+                if isinstance(result, _InvalidRoute):
+                    result = _invalid_result(result)
+                elif waiter is not None and result.error is None:
+                    # The IntegrationRoute is the last resource of a route
+                    waiter.expect(
+                        result.namespace,
+                        result.name,
+                        written=result.resources[-1].status != Status.UNCHANGED,
+                    )
+                total += 1
+                failed += result.error is not None
+                outcome.failed |= result.error is not None
+                resources += len(result.resources)
+                skipped += _count_unchanged(result.resources)
+                yield json.dumps(asdict(result)) + "\n"
+    except HTTPException as e:
+        _LOGGER.warning("Stopped reading deployment request: %s", e.detail)
+        outcome.failed = True
+        yield json.dumps({"error": e.detail}) + "\n"
+        return
+    _log_batch(total, resources, skipped)
+    yield json.dumps({"summary": _summary(total, failed, skipped)}) + "\n"
+
+
+async def _stream_and_wait(
+    routes: AsyncIterator[_ReadRoute],
+    client: str,
+    timeout: float,
+    outcome: Optional[_StreamOutcome] = None,
+) -> AsyncIterator[str]:
+    """
+    `_stream_results`, followed by a line whenever the replicas or readiness of a deployed route change,
+    until every deployed route is Ready or `timeout` seconds after they were deployed, and a final line
+    with the routes that are not Ready. Waiting requests share a single watch of the IntegrationRoutes.
+    """
+    with k8s_client.watch_integration_routes() as informer:
+        if informer is None:
+            async for line in _stream_results(routes, client, outcome=outcome):
+                yield line
+            yield json.dumps({"error": "Route status is unavailable"}) + "\n"
+            return
+        # Routes are only told apart from the versions they replace once the watch holds those
+        await asyncio.to_thread(
+            informer.wait_for_sync, min(timeout, _WAIT_SYNC_SECONDS)
+        )
+        with ReadinessWaiter(informer) as waiter:
+            async for line in _stream_results(routes, client, waiter, outcome):
+                yield line
+            with span("wait"):
+                async with aclosing(waiter.transitions(timeout)) as transitions:
+                    async for status in transitions:
+                        yield json.dumps({"route_status": status}) + "\n"
+            yield json.dumps({"wait": waiter.summary()}) + "\n"
+
+
+def _flag(request: Request, name: str) -> bool:
+    return request.query_params.get(name, "").lower() in ("true", "1")
+
+
+def _wants_stream(request: Request) -> bool:
+    return _flag(request, "stream") or NDJSON_MEDIA_TYPE in request.headers.get(
+        "accept", ""
+    )
+
+
+def _wait_timeout(request: Request) -> float:
+    value = request.query_params.get("timeout")
+    if value is None:
+        return cfg.ROUTE_WAIT_TIMEOUT_SECONDS
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = math.nan
+    if not timeout >= 0:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="timeout must be a non-negative number of seconds",
+        )
+    return min(timeout, cfg.ROUTE_WAIT_TIMEOUT_SECONDS)
+
+
+def _submit_job(routes: List[Route], client: str = "") -> JSONResponse:
+    async def _run(job: Job) -> None:
+        snapshot = k8s_client.BatchSnapshot()
+
+        async def _deploy_and_record(route: Route) -> None:
+            # Jobs have no client waiting on them, so they wait for the rate limits however long it takes
+            result = await _deploy_result(route, snapshot, client)
+            job.record(result, failed=result.error is not None, item=route)
+
+        await asyncio.gather(*[_deploy_and_record(route) for route in routes])
+        resources = [r for result in job.results for r in result.resources]
+        _log_batch(len(routes), len(resources), _count_unchanged(resources))
+
+    try:
+        job = jobs.submit(len(routes), _run)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Deployment queue is full: {e}",
+            headers={"Retry-After": str(cfg.DEPLOY_JOB_RETRY_AFTER_SECONDS)},
+        )
+    _LOGGER.info("Queued deployment job '%s' for %d route(s)", job.id, len(routes))
+    return JSONResponse(
+        job.to_dict(),
+        status_code=HTTP_202_ACCEPTED,
+        headers={"Location": f"/route/jobs/{job.id}"},
+    )
+
+
+def _validation_failed(errors: List[dict]) -> JSONResponse:
+    return JSONResponse(
+        {"status": "error", "message": "Validation failed", "errors": errors},
+        status_code=422,
+    )
+
+
+def _get_job_or_404(request: Request) -> Job:
+    job = jobs.get(request.path_params["job_id"])
+    if job is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+async def get_job(request: Request):
+    """Report a deployment job's status, progress and the results of the routes deployed so far."""
+    return JSONResponse(_get_job_or_404(request).to_dict())
+
+
+async def cancel_job(request: Request):
+    """
+    Cancel a queued or running deployment job. Routes that were already deployed are kept. Cancelling a
+    finished job has no effect.
+    """
+    job = jobs.cancel(_get_job_or_404(request).id)
+    return JSONResponse(job.to_dict())
+
+
+async def retry_job(request: Request):
+    """
+    Deploy the routes that failed in a finished deployment job again, as a new job, leaving the routes it
+    deployed alone. Retrying a job that is still running, or that has no failed routes, is a 409.
+    """
+    job = _get_job_or_404(request)
+    if not job.done:
+        raise HTTPException(
+            status_code=HTTP_409_CONFLICT, detail="Job has not finished yet"
+        )
+    if not job.failed_items:
+        raise HTTPException(
+            status_code=HTTP_409_CONFLICT, detail="Job has no failed routes to retry"
+        )
+    _LOGGER.info(
+        "Retrying %d failed route(s) of deployment job '%s'",
+        len(job.failed_items),
+        job.id,
+    )
+    return _submit_job(list(job.failed_items), _client_id(request))
+
 
 async def deploy_route(request: Request):
     """
     Handles the deployment of an integration route.
 
     The endpoint accepts a PUT request with a JSON payload containing the XML of multiple Integration Routes.
-    It creates Kubernetes resources for the route using the provided XML configuration.
+    It creates Kubernetes resources for the route using the provided XML configuration. At most
+    'DEPLOY_MAX_CONCURRENCY' routes are deployed at once across all requests.
+
+    Deployments are rate limited globally, per namespace and per client, sharing the global rate
+    weighted-fair across namespaces. Routes that would wait longer than 'DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS'
+    are rejected with a 429, with the seconds until they are expected to get through in their result's
+    `retry_after`. A request whose routes are all rejected is a 429, and one with only some of them
+    rejected a 207; both carry a 'Retry-After' header for the last of the rejected routes.
+
+    The body is parsed as it arrives and each route is deployed as soon as it has been read, so only the
+    routes in flight are held in memory. A body larger than 'ROUTE_MAX_BODY_BYTES', or a route larger than
+    'ROUTE_MAX_ITEM_BYTES', is rejected with a 413. Each route's XML is checked to be well-formed Spring
+    beans before anything is written to the cluster. Once a route fails validation no further routes are
+    deployed. If none had been deployed yet, a 422 lists every invalid route; otherwise, the 207 below
+    reports the routes ahead of it that were deployed, every invalid route with a 422, and the valid
+    routes that were not deployed with a 424.
 
     Args:
         request (Request): The incoming HTTP request.
@@ -38,47 +893,305 @@ async def deploy_route(request: Request):
             ]
         }
 
+    The body can also be a tar or zip archive, optionally gzip-compressed, of 'namespace/name.xml' route
+    files, sent with one of the ARCHIVE_MEDIA_TYPES content types (e.g. 'application/zip'). Files are
+    extracted and validated one at a time as the archive arrives, and deployed like the routes of a JSON
+    body, so only the routes in flight are held in memory however large the archive. Other files are
+    skipped, an entry whose path is not 'namespace/name.xml' fails validation, and validation errors are
+    located by entry path: `["archive", "namespace/name.xml", "xml"]`. A route file larger than
+    'ROUTE_MAX_ITEM_BYTES' is rejected with a 413, and a malformed archive with a 400.
+
+    A route failing to deploy doesn't fail the others. If any route failed, a 207 reports the outcome of
+    every route in the order of the body: the status it would have got on its own, its resources or
+    error, and whether sending it again unchanged may succeed. Only the failed routes need to be sent
+    again, while routes deployed moments ago are answered from the deduplicated results.
+        {
+            "results": [
+                {"name": "route-name", "namespace": "default", "status": 201, "resources": [...],
+                 "error": null, "retryable": false},
+                {"name": "other-route", "namespace": "default", "status": 503, "resources": [],
+                 "error": "Kubernetes API error: 503 Service Unavailable", "retryable": true}
+            ],
+            "summary": {"total": 2, "succeeded": 1, "failed": 1, "writes_skipped": 0}
+        }
+
+    If the request sets `Accept: application/x-ndjson` or `?stream=true`, the response is streamed
+    instead: one JSON line per route as soon as it is deployed, with the same outcome, followed by a
+    summary line.
+        {"name": "route-name", "namespace": "default", "status": 201, "resources": [...], ...}
+        ...
+        {"summary": {"total": 2, "succeeded": 1, "failed": 1, "writes_skipped": 0}}
+
+    With `?wait=true`, the stream goes on after the summary line to follow the deployed routes until they
+    are all Ready, for up to `?timeout=` seconds (at most, and by default, 'ROUTE_WAIT_TIMEOUT_SECONDS'):
+    a line whenever a route's replicas or 'Ready' condition change, then a line listing the routes that
+    are not Ready. All waiting requests share a single watch of the IntegrationRoutes.
+        {"route_status": {"name": "route-name", "namespace": "default", "expectedReplicas": 1,
+                          "readyReplicas": 1, "runningReplicas": 1, "ready": true, ...}}
+        {"wait": {"total": 1, "ready": 1, "not_ready": [], "timed_out": false}}
+
+    With `?async=true`, the routes are deployed by a background job instead and the response only
+    carries the job, whose progress can be polled at `/route/jobs/{id}`. The failed routes of a finished
+    job can be deployed again with a POST to `/route/jobs/{id}/retry`.
+
+    Resources whose content is unchanged since they were last deployed are not written again and are
+    reported as "unchanged". The number of writes skipped across the batch is returned in the
+    'X-Keip-Writes-Skipped' header (or the summary line when streaming).
+
+    Identical routes are deployed once, whether they repeat within the batch or are in flight for another
+    request. With an 'Idempotency-Key' header, retries of the request get its response replayed instead of
+    deploying again, unless some of its routes failed.
+
     Returns:
-        JSONResponse: A 201 status code response with the created resources in JSON format.
+        JSONResponse: A 201 status code response with the created resources in JSON format, a 207 status
+            code response with the outcome of each route if any failed, or a 202 status code response with
+            the queued job.
+        StreamingResponse: A 200 status code NDJSON response, if streaming or waiting was requested.
 
     Raises:
         HTTPException: If an unexpected error occurs during processing.
     """
     _LOGGER.info("Received deployment request")
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key is None:
+        return await _deploy_request(request)
+    if len(key) > _MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} exceeds {_MAX_IDEMPOTENCY_KEY_LENGTH} characters",
+        )
+    return await _deploy_idempotent(request, key)
+
+
+async def _body_digest(request: Request) -> str:
+    body_hash = hashlib.sha256()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > cfg.ROUTE_MAX_BODY_BYTES:
+            raise _too_large(f"Request body exceeds {cfg.ROUTE_MAX_BODY_BYTES} bytes")
+        body_hash.update(chunk)
+    return body_hash.hexdigest()
+
+
+async def _forward(chunks: asyncio.Queue) -> AsyncIterator[bytes]:
+    while (chunk := await chunks.get()) is not None:
+        yield chunk
+
+
+def _replayable(stored: _StoredResponse) -> bool:
+    return (
+        stored.status_code < 500
+        and stored.status_code != HTTP_207_MULTI_STATUS
+        and not stored.failed
+    )
+
+
+async def _deploy_idempotent(request: Request, key: str) -> Response:
+    """
+    Deploy a request carrying an 'Idempotency-Key', or replay the response to an earlier request with the
+    same key. A request arriving while another with its key is in flight waits for that one's response. A
+    key reused with a different body is rejected with a 422.
+
+    The response is captured as it is sent, so streamed responses are still streamed to the request that
+    produced them, and the deployment completes (and is kept for its retries) even if that request's
+    client goes away.
+    """
+    body_hash = request.state.body_hash = hashlib.sha256()
+    # The response's head, then its chunks as they are produced, then None
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def _execute() -> _StoredResponse:
+        response = await _deploy_request(request)
+        stored = _StoredResponse(
+            status_code=response.status_code,
+            media_type=response.media_type,
+            headers={
+                name: value
+                for name, value in response.headers.items()
+                if name not in ("content-length", "content-type")
+            },
+            streamed=isinstance(response, StreamingResponse),
+        )
+        events.put_nowait(stored)
+        chunks = []
+        try:
+            if stored.streamed:
+                async for chunk in response.body_iterator:
+                    chunk = chunk.encode() if isinstance(chunk, str) else chunk
+                    chunks.append(chunk)
+                    events.put_nowait(chunk)
+            else:
+                chunks.append(response.body)
+        finally:
+            events.put_nowait(None)
+        stored.content = b"".join(chunks)
+        stored.body_digest = body_hash.hexdigest()
+        outcome = getattr(request.state, "stream_outcome", None)
+        stored.failed = outcome is not None and outcome.failed
+        return stored
+
+    # Partial failures are run again too: the routes that did deploy are answered from their results
+    execution = asyncio.ensure_future(
+        _responses.get_or_run(key, _execute, cacheable=_replayable)
+    )
+    # Kept running, and referenced, if this request's client goes away
+    _background.add(execution)
+    execution.add_done_callback(_background.discard)
+    head = asyncio.ensure_future(events.get())
+    await asyncio.wait((head, execution), return_when=asyncio.FIRST_COMPLETED)
+    if head.done() and head.result().streamed:
+        stored = head.result()
+        return _BodyStreamingResponse(
+            _forward(events),
+            status_code=stored.status_code,
+            headers=stored.headers,
+            media_type=stored.media_type,
+        )
+
+    head.cancel()
+    stored, shared = await execution
+    if not shared:
+        return stored.to_response()
+    if await _body_digest(request) != stored.body_digest:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} was already used with a different request",
+        )
+    _LOGGER.info("Replaying the response to deployment request '%s'", key)
+    return stored.to_response(replayed=True)
+
+
+def _client_id(request: Request) -> str:
+    if cfg.DEPLOY_CLIENT_ID_HEADER:
+        value = request.headers.get(cfg.DEPLOY_CLIENT_ID_HEADER, "")
+        if value:
+            # The original client of a proxied request comes first
+            return value.split(",")[0].strip()
+    return request.client.host if request.client else ""
+
+
+def _retry_after_seconds(e: RateLimitedError) -> int:
+    return max(1, math.ceil(e.retry_after))
+
+
+def _rate_limited(e: RateLimitedError) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(_retry_after_seconds(e))},
+    )
+
+
+async def _deploy_request(request: Request) -> Response:
+    client = _client_id(request)
     try:
-        body = await request.json()
-        route_request = RouteRequest(**body)
-
-        async def _deploy_single_route(route):
-            route_data = RouteData(
-                route_name=route.name,
-                route_xml=route.xml,
-                namespace=route.namespace,
+        if _flag(request, "async"):
+            # The job needs every route, so they are all read, and checked at once, before it is queued
+            with span("read"):
+                read = [route async for route in _read_routes(request)]
+            routes = []
+            errors = []
+            for route in await asyncio.gather(*[_checked(route) for route in read]):
+                if isinstance(route, _InvalidRoute):
+                    errors += route.errors
+                else:
+                    routes.append(route)
+            if errors:
+                return _validation_failed(errors)
+            return _submit_job(routes, client)
+
+        # Turn the client away before reading its body if its routes would be rejected anyway
+        _rate_limiter.check(client, cfg.DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS)
+        if _flag(request, "wait") or _wants_stream(request):
+            # Read back by an idempotent request once the stream ends
+            outcome = request.state.stream_outcome = _StreamOutcome()
+        if _flag(request, "wait"):
+            timeout = _wait_timeout(request)
+            routes = await _peek(_read_routes(request))
+            return _BodyStreamingResponse(
+                _stream_and_wait(routes, client, timeout, outcome),
+                media_type=NDJSON_MEDIA_TYPE,
             )
-            _LOGGER.info("Creating resources for route: %s", route_data.route_name)
-            return await asyncio.to_thread(
-                k8s_client.create_route_resources, route_data
+        if _wants_stream(request):
+            routes = await _peek(_read_routes(request))
+            return _BodyStreamingResponse(
+                _stream_results(routes, client, outcome=outcome),
+                media_type=NDJSON_MEDIA_TYPE,
             )
 
-        results = await asyncio.gather(
-            *[_deploy_single_route(route) for route in route_request.routes]
-        )
-        created_resources = [r for result in results for r in result]
-        return JSONResponse(
-            [asdict(resource) for resource in created_resources], status_code=201
+        results = {}
+        invalid = {}
+        dispatched_any = False
+        snapshot = k8s_client.BatchSnapshot()
+        dispatched = _dispatch(
+            _read_routes(request),
+            lambda route: _deploy_result(
+                route, snapshot, client, cfg.DEPLOY_RATE_LIMIT_MAX_WAIT_SECONDS
+            ),
+            stop_on_invalid=True,
         )
+        async with aclosing(dispatched) as completed:
+            async for index, result in completed:
+                if isinstance(result, _InvalidRoute):
+                    invalid[index] = result.errors
+                    results[index] = _invalid_result(result)
+                elif isinstance(result, _SkippedRoute):
+                    results[index] = _skipped_result(result)
+                else:
+                    dispatched_any = True
+                    results[index] = result
+        if invalid and not dispatched_any:
+            # Nothing was deployed, so the request can be fixed and sent again as a whole
+            return _validation_failed(
+                [error for _, errors in sorted(invalid.items()) for error in errors]
+            )
+
+        route_results = [result for _, result in sorted(results.items())]
+        created_resources = [r for result in route_results for r in result.resources]
+        skipped = _count_unchanged(created_resources)
+        failed = sum(result.error is not None for result in route_results)
+        _log_batch(len(route_results), len(created_resources), skipped)
+        headers = {WRITES_SKIPPED_HEADER: str(skipped)}
+        limited = [r for r in route_results if r.retry_after is not None]
+        if limited:
+            # When the last of the rate-limited routes is expected to get through
+            retry_after = max(limited, key=lambda r: r.retry_after)
+            headers["Retry-After"] = str(retry_after.retry_after)
+            if len(limited) == len(route_results):
+                _LOGGER.warning("Rejected deployment request: %s", retry_after.error)
+                raise HTTPException(
+                    status_code=HTTP_429_TOO_MANY_REQUESTS,
+                    detail=retry_after.error,
+                    headers=headers,
+                )
+        with span("encode"):
+            if failed:
+                _LOGGER.warning(
+                    "%d of %d route(s) failed to deploy", failed, len(route_results)
+                )
+                summary = _summary(len(route_results), failed, skipped)
+                return JSONResponse(
+                    {
+                        "results": [asdict(result) for result in route_results],
+                        "summary": summary,
+                    },
+                    status_code=HTTP_207_MULTI_STATUS,
+                    headers=headers,
+                )
+            return JSONResponse(
+                [asdict(resource) for resource in created_resources],
+                status_code=HTTP_201_CREATED,
+                headers=headers,
+            )
 
     except HTTPException:
         raise
+    except RateLimitedError as e:
+        _LOGGER.warning("Rejected deployment request: %s", e)
+        raise _rate_limited(e) from e
     except ValidationError as e:
-        return JSONResponse(
-            {
-                "status": "error",
-                "message": "Validation failed",
-                "errors": json.loads(e.json()),
-            },
-            status_code=422,
-        )
+        return _validation_failed(json.loads(e.json()))
     except Exception as e:
         _LOGGER.error("An unexpected error occurred: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error") from e
@@ -0,0 +1,11 @@
+from starlette.requests import Request
+from starlette.responses import Response
+
+from core import metrics as core_metrics
+
+
+async def metrics(request: Request):
+    """Expose the process's metrics in the Prometheus text exposition format."""
+    return Response(
+        core_metrics.REGISTRY.render(), media_type=core_metrics.CONTENT_TYPE
+    )
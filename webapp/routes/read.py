@@ -0,0 +1,227 @@
+import asyncio
+import base64
+import binascii
+import bisect
+import hashlib
+import json
+import logging
+from typing import List, Mapping, Optional, Tuple
+
+from kubernetes.client.rest import ApiException
+
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.status import (
+    HTTP_304_NOT_MODIFIED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+import config as cfg
+from core import k8s_client
+from core.informer import Store, parse_label_selector
+from core.readiness import route_status
+from core.route_payload import GZIP_ENCODING
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _caches() -> Tuple[Store, Store]:
+    if not cfg.K8S_INFORMER_ENABLED:
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Route reads are served from the informer cache, which needs K8S_INFORMER_ENABLED",
+        )
+    caches = k8s_client.route_caches()
+    if caches is None:
+        raise HTTPException(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The route cache is not synced yet",
+            headers={"Retry-After": "1"},
+        )
+    return caches
+
+
+def _configmaps(route: Mapping, configmaps: Store) -> List[Optional[dict]]:
+    namespace = route["metadata"]["namespace"]
+    return [
+        configmaps.get(namespace, name)
+        for name in k8s_client.route_configmap_names(route)
+    ]
+
+
+def _route_view(route: Mapping, configmaps: List[Optional[dict]]) -> dict:
+    metadata = route["metadata"]
+    status = route_status(route)
+    del status["name"], status["namespace"]
+    return {
+        "name": metadata["name"],
+        "namespace": metadata["namespace"],
+        "labels": metadata.get("labels", {}),
+        "created": metadata.get("creationTimestamp"),
+        "generation": metadata.get("generation"),
+        "resourceVersion": metadata.get("resourceVersion"),
+        "digest": metadata.get("annotations", {}).get(k8s_client.DIGEST_ANNOTATION),
+        "compressed": route["spec"].get("routeEncoding") == GZIP_ENCODING,
+        "configMaps": [
+            {
+                "name": name,
+                "resourceVersion": (
+                    cm["metadata"].get("resourceVersion") if cm else None
+                ),
+            }
+            for name, cm in zip(k8s_client.route_configmap_names(route), configmaps)
+        ],
+        "status": status,
+    }
+
+
+def _route_etag(route: Mapping, configmaps: List[Optional[dict]]) -> str:
+    """Changes whenever the IntegrationRoute or any of its ConfigMaps do."""
+    versions = [route["metadata"].get("resourceVersion", "")] + [
+        cm["metadata"].get("resourceVersion", "") if cm else "-" for cm in configmaps
+    ]
+    return f'"{".".join(versions)}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # Compared weakly, as RFC 9110 requires for 'If-None-Match'
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _cached_response(request: Request, content: dict, etag: str) -> Response:
+    if _not_modified(request, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return JSONResponse(content, headers={"ETag": etag})
+
+
+def _limit(request: Request) -> int:
+    value = request.query_params.get("limit")
+    if value is None:
+        return cfg.ROUTE_LIST_MAX_LIMIT
+    if not value.isdigit() or int(value) < 1:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="Query parameter 'limit' must be a positive integer",
+        )
+    return min(int(value), cfg.ROUTE_LIST_MAX_LIMIT)
+
+
+def _encode_token(after: Tuple[str, str], query: List[str]) -> str:
+    token = json.dumps([*after, *query], separators=(",", ":"))
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def _decode_token(token: str, query: List[str]) -> Tuple[str, str]:
+    """
+    The namespace and name of the last route of the previous page. Tokens only hold the position reached,
+    so they stay valid however the routes change in between pages.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        namespace, name, *token_query = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail="Invalid continue token"
+        )
+    if token_query != query:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="The continue token was issued for different 'namespace' or 'labelSelector' parameters",
+        )
+    return str(namespace), str(name)
+
+
+async def list_routes(request: Request):
+    """
+    List the routes deployed by keip from the informer cache, without calling the API server. Routes are
+    ordered by namespace and name, and can be filtered with `?namespace=` and a Kubernetes
+    `?labelSelector=` on the IntegrationRoutes' labels. At most `?limit=` routes are returned per page
+    (by default, and at most, 'ROUTE_LIST_MAX_LIMIT'), with a `continue` token for the next page. Tokens
+    carry the last route returned rather than an offset, so pages neither repeat nor skip routes that
+    stayed deployed in between.
+
+    The response carries an ETag that changes whenever a route on the page or the page's bounds do, and
+    a request whose 'If-None-Match' holds it gets an empty 304.
+        {
+            "routes": [{"name": "route-name", "namespace": "default", "status": {...}, ...}],
+            "continue": "WyJkZWZh...",
+            "remaining": 42
+        }
+    """
+    routes, configmaps = _caches()
+    namespace = request.query_params.get("namespace") or None
+    selector = request.query_params.get("labelSelector", "")
+    try:
+        matches = parse_label_selector(selector)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+    limit = _limit(request)
+    query = [namespace or "", selector]
+
+    keys = sorted(
+        (route["metadata"]["namespace"], route["metadata"]["name"])
+        for route in routes.list(namespace)
+        if matches(route["metadata"].get("labels") or {})
+    )
+    start = 0
+    token = request.query_params.get("continue")
+    if token:
+        start = bisect.bisect_right(keys, _decode_token(token, query))
+    page = keys[start : start + limit]
+    remaining = len(keys) - start - len(page)
+
+    items = []
+    etag = hashlib.sha256()
+    for key in page:
+        route = routes.get(*key)
+        if route is None:
+            # Deleted since the keys were listed
+            continue
+        route_configmaps = _configmaps(route, configmaps)
+        items.append(_route_view(route, route_configmaps))
+        etag.update(f"{key}{_route_etag(route, route_configmaps)}".encode())
+    next_token = _encode_token(page[-1], query) if remaining and page else ""
+    etag.update(f"{next_token}{remaining}".encode())
+    return _cached_response(
+        request,
+        {"routes": items, "continue": next_token, "remaining": remaining},
+        f'"{etag.hexdigest()[:32]}"',
+    )
+
+
+async def get_route(request: Request):
+    """
+    Read a route deployed by keip: its IntegrationRoute from the informer cache, and its XML read back from
+    its ConfigMaps. The response carries an ETag made of the resourceVersions of the IntegrationRoute and
+    its ConfigMaps, and a request whose 'If-None-Match' holds it gets an empty 304 without the API server
+    being called.
+    """
+    routes, configmaps = _caches()
+    namespace = request.path_params["namespace"]
+    name = request.path_params["name"]
+    route = routes.get(namespace, name)
+    if route is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Route not found")
+
+    route_configmaps = _configmaps(route, configmaps)
+    etag = _route_etag(route, route_configmaps)
+    if _not_modified(request, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    try:
+        xml = await asyncio.to_thread(k8s_client.read_route_xml, route)
+    except ApiException as e:
+        _LOGGER.error("Failed to read route '%s/%s': %s", namespace, name, e)
+        raise HTTPException(
+            status_code=e.status or HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Kubernetes API error: {e.status} {e.reason}",
+        )
+    return JSONResponse(
+        _route_view(route, route_configmaps) | {"xml": xml}, headers={"ETag": etag}
+    )
@@ -0,0 +1,269 @@
+"""
+Benchmarks `/route` throughput offline by driving `deploy_route` against the in-process fake API server.
+
+Each concurrency level deploys the same batch of routes split across that many concurrent PUT requests,
+first against an empty namespace (creates) and then again (updates), with both the threaded and the
+asyncio Kubernetes client. API latency, error injection and throttling can be configured to approximate a
+real control plane. The CPU time of each phase is reported and, with `--trace-memory`, the peak of the
+memory allocated by Python during it (the fake API server's included, so compare runs rather than read it
+as the server's footprint).
+
+Usage (from the webapp directory):
+    python -m routes.test.load_test.bench_deploy --routes 10,100,1000 --concurrency 1 --latency-ms 5
+    python -m routes.test.load_test.bench_deploy --routes 50 --xml-bytes 1048576 --concurrency 1 --trace-memory
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Mapping, Optional
+
+import httpx
+from kubernetes import client
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+import config as cfg
+import core.k8s_client as k8s_client
+from core.circuit_breaker import CircuitBreaker
+from core.test.fake_apiserver import FakeApiServer
+from routes import deploy
+from routes.deploy import deploy_route
+from routes.test.load_test.replay import percentile
+
+_XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<beans xmlns="http://www.springframework.org/schema/beans"
+       xmlns:int="http://www.springframework.org/schema/integration">
+    <int:channel id="output"/>
+    <!-- {padding} -->
+</beans>
+"""
+
+
+@dataclass
+class BenchResult:
+    client: str
+    phase: str
+    concurrency: int
+    routes: int
+    elapsed: float
+    request_latencies: List[float]
+    api_calls: Mapping[str, int]
+    failed_requests: int
+    cpu_seconds: float
+    peak_bytes: Optional[int] = None
+
+    def row(self) -> str:
+        lat = sorted(self.request_latencies)
+        calls = sum(self.api_calls.values())
+        peak = "-" if self.peak_bytes is None else f"{self.peak_bytes / 2**20:.1f}"
+        return (
+            f"{self.client:<8}{self.phase:<8}{self.concurrency:>6}{self.routes:>8}"
+            f"{self.routes / self.elapsed:>12.1f}"
+            f"{percentile(lat, 50) * 1e3:>10.1f}{percentile(lat, 99) * 1e3:>10.1f}"
+            f"{calls / self.routes:>12.2f}{self.failed_requests:>8}"
+            f"{self.cpu_seconds:>8.2f}{peak:>10}"
+        )
+
+
+HEADER = (
+    f"{'client':<8}{'phase':<8}{'conc':>6}{'routes':>8}{'routes/s':>12}"
+    f"{'p50 ms':>10}{'p99 ms':>10}{'calls/route':>12}{'failed':>8}"
+    f"{'cpu s':>8}{'peak MiB':>10}"
+)
+
+
+def make_routes(count: int, xml_bytes: int, namespace: str = "default") -> List[dict]:
+    padding = "x" * max(xml_bytes - len(_XML_TEMPLATE), 0)
+    xml = _XML_TEMPLATE.format(padding=padding)
+    return [
+        {"name": f"route-{i}", "namespace": namespace, "xml": xml} for i in range(count)
+    ]
+
+
+def use_fake_api(server: FakeApiServer, workdir: str) -> None:
+    """Point `core.k8s_client` at the fake API server, discarding any previous configuration."""
+    os.environ["KUBECONFIG"] = server.write_kubeconfig(
+        os.path.join(workdir, "kubeconfig")
+    )
+    client.Configuration._default = None
+    k8s_client._configured = False
+    k8s_client._config_attempts = 0
+    k8s_client._config_retry_at = 0.0
+    k8s_client._reachable_until = 0.0
+    k8s_client._async_apis.clear()
+    k8s_client.stop_informers()
+    k8s_client._breaker = CircuitBreaker(
+        "kubernetes-api",
+        failure_threshold=k8s_client.cfg.K8S_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=k8s_client.cfg.K8S_CIRCUIT_RESET_SECONDS,
+    )
+    k8s_client.v1 = None
+    k8s_client.routeApi = None
+
+
+# Request bodies are sent in chunks of the size uvicorn reads them in, rather than all at once
+_CHUNK_BYTES = 64 * 1024
+
+
+async def _chunks(body: bytes) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), _CHUNK_BYTES):
+        yield body[start : start + _CHUNK_BYTES]
+
+
+async def _put(http: httpx.AsyncClient, body: bytes, latencies: List[float]) -> bool:
+    start = time.perf_counter()
+    res = await http.put(
+        "/route",
+        content=_chunks(body),
+        headers={
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+        },
+    )
+    latencies.append(time.perf_counter() - start)
+    return res.status_code < 300
+
+
+async def run_phase(
+    server: FakeApiServer,
+    client_mode: str,
+    phase: str,
+    routes: List[dict],
+    concurrency: int,
+) -> BenchResult:
+    cfg.K8S_ASYNC_CLIENT_ENABLED = client_mode == "async"
+    app = Starlette(routes=[Route("/route", deploy_route, methods=["PUT"])])
+    transport = httpx.ASGITransport(app=app)
+    # Encoded up front, so that only the server's side of the requests is measured
+    bodies = [
+        json.dumps({"routes": routes[i::concurrency]}).encode()
+        for i in range(min(concurrency, len(routes)))
+    ]
+    latencies: List[float] = []
+
+    # Each phase measures deploying the routes, not replaying the previous phase's results
+    deploy._route_results.clear()
+    server.reset_request_log()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as http:
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        ok = await asyncio.gather(*[_put(http, body, latencies) for body in bodies])
+        elapsed = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+    peak_bytes = None
+    if tracemalloc.is_tracing():
+        peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+    await k8s_client.close_async_client()
+
+    api_calls = {}
+    for method, _ in server.request_log:
+        api_calls[method] = api_calls.get(method, 0) + 1
+    return BenchResult(
+        client_mode,
+        phase,
+        concurrency,
+        len(routes),
+        elapsed,
+        latencies,
+        api_calls,
+        ok.count(False),
+        cpu_seconds,
+        peak_bytes,
+    )
+
+
+async def run(args: argparse.Namespace) -> List[BenchResult]:
+    results = []
+    for count in args.routes:
+        routes = make_routes(count, args.xml_bytes)
+        for concurrency in args.concurrency:
+            for client_mode in args.client:
+                with FakeApiServer(
+                    latency=args.latency_ms / 1e3,
+                    latency_jitter=args.jitter_ms / 1e3,
+                    error_rates=args.error_rates,
+                    max_qps=args.max_qps,
+                    burst=args.burst,
+                ) as server, tempfile.TemporaryDirectory() as workdir:
+                    use_fake_api(server, workdir)
+                    for phase in ("create", "update"):
+                        result = await run_phase(
+                            server, client_mode, phase, routes, concurrency
+                        )
+                        print(result.row(), flush=True)
+                        results.append(result)
+    return results
+
+
+def _parse_error_rates(value: str) -> Mapping[int, float]:
+    rates = {}
+    for part in filter(None, value.split(",")):
+        code, rate = part.split(":")
+        rates[int(code)] = float(rate)
+    return rates
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--routes",
+        type=lambda v: [int(c) for c in v.split(",")],
+        default=[500],
+        help="Comma-separated numbers of routes per batch to sweep",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(c) for c in v.split(",")],
+        default=[1, 4, 16],
+        help="Comma-separated numbers of concurrent PUT requests to sweep",
+    )
+    parser.add_argument(
+        "--client",
+        type=lambda v: v.split(","),
+        default=["thread", "async"],
+        help="Comma-separated Kubernetes clients to compare: thread, async",
+    )
+    parser.add_argument(
+        "--xml-bytes", type=int, default=2048, help="Size of each route XML"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=5.0, help="API latency per call"
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0.0, help="Random extra latency"
+    )
+    parser.add_argument(
+        "--error-rates",
+        type=_parse_error_rates,
+        default={},
+        help="Injected write failures, e.g. '409:0.01,429:0.01,500:0.005'",
+    )
+    parser.add_argument(
+        "--max-qps", type=float, default=0.0, help="API throttling limit"
+    )
+    parser.add_argument("--burst", type=int, default=1, help="API throttling burst")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Report the peak memory allocated during each phase (slows the benchmark)",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.trace_memory:
+        tracemalloc.start()
+    print(HEADER)
+    asyncio.run(run(args))
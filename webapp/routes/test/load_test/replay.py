@@ -0,0 +1,353 @@
+"""
+Replays webhook traffic captured with 'WEBHOOK_CAPTURE_FILE' against a running webapp instance.
+
+Requests are fired on the captured schedule (optionally sped up), latency percentiles are reported,
+and each response is diffed against the one recorded at capture time.
+
+In soak mode the captured stream is replayed in a loop for a fixed duration while the server's RSS is
+sampled from '/debug/memory' (requires DEBUG_ENDPOINTS_ENABLED), to catch slow leaks.
+
+Usage (from the webapp directory):
+    python -m routes.test.load_test.replay capture.jsonl capture.jsonl.1 --url http://localhost:7080 --speed 10
+    python -m routes.test.load_test.replay capture.jsonl --speed 0 --soak 3600 --max-rss-growth-mib 32
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+import httpx
+
+from routes.capture import redact
+
+# Fields that legitimately differ between runs (e.g. condition timestamps set at sync time).
+VOLATILE_KEYS = frozenset({"lastTransitionTime"})
+
+
+@dataclass
+class CapturedRequest:
+    ts: float
+    path: str
+    status: int
+    request: Mapping
+    response: Mapping
+
+
+@dataclass
+class ReplayResult:
+    record: CapturedRequest
+    latency: float
+    status: Optional[int]
+    diffs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class ReplayReport:
+    results: List[ReplayResult]
+    elapsed: float
+
+    @property
+    def latencies(self) -> List[float]:
+        return sorted(r.latency for r in self.results if r.error is None)
+
+    @property
+    def errors(self) -> List[ReplayResult]:
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def mismatches(self) -> List[ReplayResult]:
+        return [
+            r
+            for r in self.results
+            if r.error is None and (r.diffs or r.status != r.record.status)
+        ]
+
+    def percentile(self, pct: float) -> float:
+        return percentile(self.latencies, pct)
+
+    def summary(self) -> str:
+        lines = [
+            f"Requests:   {len(self.results)} in {self.elapsed:.2f}s",
+            f"Errors:     {len(self.errors)}",
+            f"Mismatches: {len(self.mismatches)}",
+        ]
+        if self.latencies:
+            lines.append(
+                "Latency (ms): "
+                + ", ".join(
+                    f"p{p:g}={self.percentile(p) * 1e3:.2f}"
+                    for p in (50, 90, 95, 99, 100)
+                )
+            )
+        return "\n".join(lines)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def load_capture(paths: Iterable[str]) -> List[CapturedRequest]:
+    """Read captured records from one or more (possibly rotated) files, ordered by capture time."""
+    records = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(CapturedRequest(**json.loads(line)))
+    records.sort(key=lambda r: r.ts)
+    return records
+
+
+def diff_json(expected: Any, actual: Any, path: str = "$") -> List[str]:
+    """List the paths at which two JSON values differ, ignoring volatile fields."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        diffs = []
+        for key in sorted(expected.keys() | actual.keys()):
+            if key in VOLATILE_KEYS:
+                continue
+            if key not in actual:
+                diffs.append(f"{path}.{key}: missing")
+            elif key not in expected:
+                diffs.append(f"{path}.{key}: unexpected")
+            else:
+                diffs.extend(diff_json(expected[key], actual[key], f"{path}.{key}"))
+        return diffs
+
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: length {len(expected)} != {len(actual)}"]
+        diffs = []
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            diffs.extend(diff_json(e, a, f"{path}[{i}]"))
+        return diffs
+
+    if expected != actual:
+        return [f"{path}: {expected!r} != {actual!r}"]
+    return []
+
+
+async def _send(
+    client: httpx.AsyncClient, record: CapturedRequest, delay: float
+) -> ReplayResult:
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    try:
+        res = await client.post(record.path, json=record.request)
+    except httpx.HTTPError as e:
+        return ReplayResult(record, time.perf_counter() - start, None, error=repr(e))
+
+    latency = time.perf_counter() - start
+    try:
+        # Responses are redacted the same way as the capture so both sides are comparable.
+        diffs = diff_json(record.response, redact(res.json()))
+    except ValueError:
+        diffs = ["$: response is not JSON"]
+    return ReplayResult(record, latency, res.status_code, diffs)
+
+
+async def replay(
+    records: List[CapturedRequest], client: httpx.AsyncClient, speed: float = 1.0
+) -> ReplayReport:
+    """
+    Fire the captured requests at the client's base URL, preserving their relative arrival times.
+
+    A speed of N replays the traffic N times faster; a speed of 0 sends everything at once.
+    """
+    if not records:
+        return ReplayReport([], 0.0)
+
+    t0 = records[0].ts
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[_send(client, r, (r.ts - t0) / speed if speed > 0 else 0.0) for r in records]
+    )
+    return ReplayReport(list(results), time.perf_counter() - start)
+
+
+def _print_mismatches(report: ReplayReport, limit: int) -> None:
+    for r in report.mismatches[:limit]:
+        print(f"MISMATCH {r.record.path} (captured at {r.record.ts}):")
+        if r.status != r.record.status:
+            print(f"  status {r.record.status} != {r.status}")
+        for d in r.diffs[:limit]:
+            print(f"  {d}")
+    for r in report.errors[:limit]:
+        print(f"ERROR {r.record.path} (captured at {r.record.ts}): {r.error}")
+
+
+@dataclass
+class SoakReport:
+    replays: List[ReplayReport]
+    # (seconds since start, RSS bytes)
+    rss_samples: List[Tuple[float, int]]
+
+    @property
+    def rss_growth(self) -> int:
+        if len(self.rss_samples) < 2:
+            return 0
+        return self.rss_samples[-1][1] - self.rss_samples[0][1]
+
+    @property
+    def rss_slope(self) -> float:
+        """Least-squares RSS growth rate in bytes per hour."""
+        n = len(self.rss_samples)
+        if n < 2:
+            return 0.0
+        mean_t = sum(t for t, _ in self.rss_samples) / n
+        mean_rss = sum(rss for _, rss in self.rss_samples) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in self.rss_samples)
+        if var_t == 0:
+            return 0.0
+        cov = sum((t - mean_t) * (rss - mean_rss) for t, rss in self.rss_samples)
+        return cov / var_t * 3600
+
+    def summary(self) -> str:
+        merged = ReplayReport(
+            [r for report in self.replays for r in report.results],
+            sum(report.elapsed for report in self.replays),
+        )
+        lines = [f"Iterations: {len(self.replays)}", merged.summary()]
+        if self.rss_samples:
+            rss = [r for _, r in self.rss_samples]
+            lines.append(
+                f"RSS (MiB):  start={rss[0] / _MIB:.1f}, end={rss[-1] / _MIB:.1f}, "
+                f"max={max(rss) / _MIB:.1f}, growth={self.rss_growth / _MIB:.1f}, "
+                f"trend={self.rss_slope / _MIB:.1f}/h"
+            )
+        return "\n".join(lines)
+
+
+_MIB = 1024 * 1024
+
+
+async def _fetch_rss(
+    client: httpx.AsyncClient, headers: Mapping[str, str]
+) -> Optional[int]:
+    try:
+        res = await client.get("/debug/memory", headers=headers)
+        res.raise_for_status()
+        return res.json()["rss_bytes"]
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        print(f"Failed to sample RSS: {e!r}", file=sys.stderr)
+        return None
+
+
+async def _sample_rss(
+    client: httpx.AsyncClient,
+    samples: List[Tuple[float, int]],
+    start: float,
+    interval: float,
+    headers: Mapping[str, str],
+) -> None:
+    while True:
+        if (rss := await _fetch_rss(client, headers)) is not None:
+            samples.append((time.perf_counter() - start, rss))
+        await asyncio.sleep(interval)
+
+
+async def soak(
+    records: List[CapturedRequest],
+    client: httpx.AsyncClient,
+    duration: float,
+    speed: float = 0.0,
+    rss_interval: float = 10.0,
+    debug_token: str = "",
+) -> SoakReport:
+    """Replay the captured stream repeatedly for `duration` seconds while sampling the server's RSS."""
+    headers = {"Authorization": f"Bearer {debug_token}"} if debug_token else {}
+    samples: List[Tuple[float, int]] = []
+    replays = []
+    start = time.perf_counter()
+    sampler = asyncio.create_task(
+        _sample_rss(client, samples, start, rss_interval, headers)
+    )
+    try:
+        while time.perf_counter() - start < duration:
+            replays.append(await replay(records, client, speed))
+    finally:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+    # Take a final sample so the reported growth covers the whole run.
+    if (rss := await _fetch_rss(client, headers)) is not None:
+        samples.append((time.perf_counter() - start, rss))
+
+    return SoakReport(replays, samples)
+
+
+async def _main(args: argparse.Namespace) -> int:
+    records = load_capture(args.capture_files)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        if args.soak:
+            soak_report = await soak(
+                records,
+                client,
+                args.soak,
+                args.speed,
+                args.rss_interval,
+                args.debug_token,
+            )
+            for report in soak_report.replays:
+                _print_mismatches(report, args.max_diffs)
+            print(soak_report.summary())
+            failed = any(r.errors or r.mismatches for r in soak_report.replays)
+            if soak_report.rss_growth > args.max_rss_growth_mib * _MIB:
+                print(f"RSS grew by more than {args.max_rss_growth_mib} MiB")
+                failed = True
+            return 1 if failed else 0
+
+        report = await replay(records, client, args.speed)
+
+    _print_mismatches(report, args.max_diffs)
+    print(report.summary())
+    return 1 if report.errors or report.mismatches else 0
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture_files", nargs="+", help="Captured JSON-lines files")
+    parser.add_argument("--url", default="http://localhost:7080", help="Webapp URL")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed multiplier (0 sends all requests at once)",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--max-diffs", type=int, default=10, help="Max mismatches/diffs to print"
+    )
+    parser.add_argument(
+        "--soak",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Replay the capture in a loop for this long while tracking server RSS",
+    )
+    parser.add_argument(
+        "--rss-interval", type=float, default=10.0, help="Seconds between RSS samples"
+    )
+    parser.add_argument(
+        "--max-rss-growth-mib",
+        type=float,
+        default=64.0,
+        help="Fail the soak test if RSS grows by more than this",
+    )
+    parser.add_argument(
+        "--debug-token", default="", help="Bearer token for the '/debug' endpoints"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(_parse_args())))
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from conftest import load_json_as_dict
+from core.sync import sync
+from routes.capture import REDACTED, TrafficCapture, redact
+from routes.test.load_test.replay import (
+    diff_json,
+    load_capture,
+    percentile,
+    replay,
+)
+from routes.webhook import build_webhook
+
+_TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def route_request():
+    request = load_json_as_dict(f"{_TEST_DIR}/json/full-route-request.json")
+    request["parent"]["spec"]["env"] = [
+        {"name": "DB_PASSWORD", "value": "hunter2"},
+        {"name": "LOG_LEVEL", "value": "DEBUG"},
+    ]
+    return request
+
+
+def _webhook_app(capture: TrafficCapture) -> Starlette:
+    return Starlette(
+        routes=[Route("/sync", endpoint=build_webhook(sync, capture), methods=["POST"])]
+    )
+
+
+def test_redact_secret_values():
+    value = {
+        "apiToken": "abc",
+        "password": "pw",
+        "passwordSecretRef": "keystore-password",
+        "secretSources": [{"name": "route-secret"}],
+        "tls": {"keystore": {"jks": {"secretName": "tls-secret"}}},
+        "env": [
+            {"name": "DB_PASSWORD", "value": "hunter2"},
+            {"name": "LOG_LEVEL", "value": "DEBUG"},
+        ],
+        "children": [{"kind": "Secret", "data": {"key": "dmFsdWU="}}],
+    }
+
+    assert redact(value) == {
+        "apiToken": REDACTED,
+        "password": REDACTED,
+        "passwordSecretRef": "keystore-password",
+        "secretSources": [{"name": "route-secret"}],
+        "tls": {"keystore": {"jks": {"secretName": "tls-secret"}}},
+        "env": [
+            {"name": "DB_PASSWORD", "value": REDACTED},
+            {"name": "LOG_LEVEL", "value": "DEBUG"},
+        ],
+        "children": [{"kind": "Secret", "data": {"key": REDACTED}}],
+    }
+    assert value["password"] == "pw"
+
+
+def test_capture_rotates_files(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    capture = TrafficCapture(str(path), max_bytes=200, backup_count=2)
+
+    for i in range(10):
+        capture.record("/sync", {"i": i, "padding": "x" * 100}, {})
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["capture.jsonl", "capture.jsonl.1", "capture.jsonl.2"]
+    records = load_capture([str(tmp_path / f) for f in files])
+    assert [r.request["i"] for r in records] == [7, 8, 9]
+
+
+def test_capture_sampling(tmp_path):
+    capture = TrafficCapture(str(tmp_path / "capture.jsonl"), sample_rate=0.0)
+
+    assert not any(capture.should_sample() for _ in range(100))
+
+
+def test_webhook_captures_redacted_traffic(tmp_path, route_request):
+    path = tmp_path / "capture.jsonl"
+
+    async def send():
+        transport = httpx.ASGITransport(app=_webhook_app(TrafficCapture(str(path))))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.post("/sync", json=route_request)
+
+    res = asyncio.run(send())
+
+    assert res.status_code == 200
+    [record] = load_capture([str(path)])
+    assert record.path == "/sync"
+    assert record.status == 200
+    assert "hunter2" not in path.read_text()
+    assert {"name": "DB_PASSWORD", "value": REDACTED} in record.request["parent"][
+        "spec"
+    ]["env"]
+
+
+def test_replay_matches_recorded_responses(tmp_path, route_request):
+    path = tmp_path / "capture.jsonl"
+    capture = TrafficCapture(str(path))
+    for i in range(3):
+        capture.record("/sync", route_request, sync(route_request))
+
+    async def run():
+        transport = httpx.ASGITransport(app=_webhook_app(capture=None))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await replay(load_capture([str(path)]), c, speed=0)
+
+    report = asyncio.run(run())
+
+    assert len(report.results) == 3
+    assert report.errors == []
+    assert report.mismatches == []
+    assert report.percentile(50) > 0
+
+
+def test_replay_reports_mismatches(tmp_path, route_request):
+    path = tmp_path / "capture.jsonl"
+    response = sync(route_request)
+    response["status"]["expectedReplicas"] = 99
+    TrafficCapture(str(path)).record("/sync", route_request, response)
+
+    async def run():
+        transport = httpx.ASGITransport(app=_webhook_app(capture=None))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await replay(load_capture([str(path)]), c, speed=0)
+
+    report = asyncio.run(run())
+
+    [mismatch] = report.mismatches
+    assert mismatch.diffs == ["$.status.expectedReplicas: 99 != 1"]
+
+
+def test_diff_json_ignores_volatile_fields():
+    expected = {"conditions": [{"type": "Ready", "lastTransitionTime": "a"}]}
+    actual = {"conditions": [{"type": "Ready", "lastTransitionTime": "b"}]}
+
+    assert diff_json(expected, actual) == []
+    assert diff_json({"a": [1, 2]}, {"a": [1]}) == ["$.a: length 2 != 1"]
+    assert diff_json({"a": 1}, {"b": 1}) == ["$.a: missing", "$.b: unexpected"]
+
+
+@pytest.mark.parametrize(
+    "pct, expected", [(50, 5), (90, 9), (99, 10), (100, 10), (0, 1)]
+)
+def test_percentile(pct, expected):
+    assert percentile(list(range(1, 11)), pct) == expected
+
+
+def test_load_capture_orders_by_timestamp(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    lines = [
+        {"ts": 2.0, "path": "/sync", "status": 200, "request": {}, "response": {}},
+        {"ts": 1.0, "path": "/sync", "status": 200, "request": {}, "response": {}},
+    ]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+
+    assert [r.ts for r in load_capture([str(path)])] == [1.0, 2.0]
@@ -52,3 +52,18 @@ def test_status_endpoint_with_cors_not_enabled_on_bad_input(
     assert response.json() == {"status": "UP"}
 
     assert ACCESS_CONTROL_ALLOW_ORIGIN not in response.headers
+
+
+@pytest.mark.parametrize("method", ["GET", "PUT", "POST", "DELETE"])
+def test_preflight_allows_route_methods(method):
+    test_client = TestClient(_with_cors(app, "http://localhost:8000"))
+    response = test_client.options(
+        "/route/jobs/some-job/retry",
+        headers={
+            "Origin": "http://localhost:8000",
+            "Access-Control-Request-Method": method,
+        },
+    )
+
+    assert response.status_code == 200
+    assert method in response.headers["Access-Control-Allow-Methods"]
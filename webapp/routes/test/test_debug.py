@@ -0,0 +1,126 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+from starlette.testclient import TestClient
+
+from conftest import load_json_as_dict
+from core.diagnostics import register_cache
+from core.sync import sync
+from routes import debug
+from routes.capture import TrafficCapture
+from routes.test.load_test.replay import SoakReport, load_capture, soak
+from routes.webhook import build_webhook
+
+_TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def app():
+    return Starlette(
+        routes=[
+            Route("/sync", endpoint=build_webhook(sync), methods=["POST"]),
+            Mount("/debug", routes=debug.routes),
+        ]
+    )
+
+
+@pytest.fixture
+def test_client(app):
+    client = TestClient(app)
+    yield client
+    client.post("/debug/memory/tracemalloc/stop")
+
+
+def test_memory_report(test_client):
+    register_cache("test-cache", lambda: 42)
+
+    res = test_client.get("/debug/memory")
+
+    assert res.status_code == 200
+    report = res.json()
+    assert report["rss_bytes"] > 0
+    assert len(report["gc"]["counts"]) == 3
+    assert report["caches"]["test-cache"] == 42
+    assert report["tracemalloc"] == {"tracing": False}
+
+
+def test_tracemalloc_snapshots_and_diff(test_client):
+    res = test_client.post("/debug/memory/tracemalloc/start?frames=5")
+    assert res.json()["tracing"] is True
+    assert res.json()["frames"] == 5
+
+    first = test_client.post("/debug/memory/snapshot?limit=5").json()
+    assert len(first["top"]) <= 5
+    assert first["diff"] is None
+
+    retained = [bytearray(1024) for _ in range(1000)]  # noqa: F841
+    second = test_client.post("/debug/memory/snapshot?limit=5").json()
+    assert second["diff"]
+    assert any(d["size_diff"] >= 1024 * 1000 for d in second["diff"])
+
+    res = test_client.post("/debug/memory/tracemalloc/stop")
+    assert res.json() == {"tracing": False}
+
+
+def test_snapshot_without_tracing_conflicts(test_client):
+    res = test_client.post("/debug/memory/snapshot")
+
+    assert res.status_code == 409
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=abc", "groupBy=module"])
+def test_snapshot_invalid_params(test_client, query):
+    test_client.post("/debug/memory/tracemalloc/start")
+
+    res = test_client.post(f"/debug/memory/snapshot?{query}")
+
+    assert res.status_code == 400
+
+
+def test_token_required_when_configured(test_client, mocker):
+    mocker.patch("config.DEBUG_ENDPOINTS_TOKEN", "s3cret")
+
+    assert test_client.get("/debug/memory").status_code == 401
+    assert (
+        test_client.get(
+            "/debug/memory", headers={"Authorization": "Bearer wrong"}
+        ).status_code
+        == 401
+    )
+    assert (
+        test_client.get(
+            "/debug/memory", headers={"Authorization": "Bearer s3cret"}
+        ).status_code
+        == 200
+    )
+
+
+def test_soak_tracks_rss(tmp_path, app):
+    path = tmp_path / "capture.jsonl"
+    request = load_json_as_dict(f"{_TEST_DIR}/json/full-route-request.json")
+    TrafficCapture(str(path)).record("/sync", request, sync(request))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await soak(
+                load_capture([str(path)]), c, duration=0.2, rss_interval=0.05
+            )
+
+    report = asyncio.run(run())
+
+    assert len(report.replays) > 1
+    assert all(not r.errors and not r.mismatches for r in report.replays)
+    assert len(report.rss_samples) >= 2
+    assert "RSS (MiB)" in report.summary()
+
+
+def test_soak_rss_slope():
+    report = SoakReport([], [(0.0, 100), (1800.0, 150), (3600.0, 200)])
+
+    assert report.rss_growth == 100
+    assert report.rss_slope == pytest.approx(100)
@@ -1,13 +1,22 @@
 import pytest
+import asyncio
 import copy
+import io
 import json
 import os
+import tarfile
+import threading
+import time
+import zipfile
 from starlette.applications import Starlette
 from starlette.routing import Route
 from starlette.testclient import TestClient
 
 from unittest.mock import patch
 
+from kubernetes.client.rest import ApiException
+
+from routes import deploy
 from routes.deploy import deploy_route
 from models import Resource, Status
 
@@ -24,6 +33,14 @@ def mock_k8s_config():
         yield
 
 
+@pytest.fixture(autouse=True)
+def clear_result_caches():
+    """Deployments are reused across requests, which would hide each test's mocks from the next."""
+    yield
+    deploy._responses.clear()
+    deploy._route_results.clear()
+
+
 @pytest.fixture(scope="module")
 def test_client():
     app = Starlette(routes=[Route("/route", deploy_route, methods=["PUT"])])
@@ -107,5 +124,900 @@ def test_deploy_route_generic_exception(mock_k8s_client, test_client):
 
     res = test_client.put("/route", json=body)
 
-    assert res.status_code == 500
-    assert "Internal server error" in res.text
+    assert res.status_code == 207
+    assert res.json() == {
+        "results": [
+            {
+                "name": "my-route",
+                "namespace": "default",
+                "status": 500,
+                "resources": [],
+                "error": "Internal server error",
+                "retryable": False,
+                "retry_after": None,
+            }
+        ],
+        "summary": {"total": 1, "succeeded": 0, "failed": 1, "writes_skipped": 0},
+    }
+    assert "Something went wrong" not in res.text
+
+
+def test_deploy_route_partial_failure(mock_k8s_client, test_client):
+    def _create(route_data, snapshot):
+        if route_data.route_name == "unavailable-route":
+            raise ApiException(status=503, reason="Service Unavailable")
+        if route_data.route_name == "forbidden-route":
+            raise ApiException(status=403, reason="Forbidden")
+        return _created(route_data, snapshot)
+
+    mock_k8s_client.create_route_resources.side_effect = _create
+    route = body["routes"][0]
+    names = ["unavailable-route", "my-route", "forbidden-route"]
+    request_body = {"routes": [dict(route, name=name) for name in names]}
+
+    res = test_client.put("/route", json=request_body)
+
+    assert res.status_code == 207
+    results = res.json()["results"]
+    # Reported in the order of the body
+    assert [r["name"] for r in results] == names
+    assert [(r["status"], r["retryable"]) for r in results] == [
+        (503, True),
+        (201, False),
+        (403, False),
+    ]
+    assert results[1]["resources"] == [{"name": "my-route", "status": "created"}]
+    assert results[2]["error"] == "Kubernetes API error: 403 Forbidden"
+    assert res.json()["summary"] == {
+        "total": 3,
+        "succeeded": 1,
+        "failed": 2,
+        "writes_skipped": 0,
+    }
+    assert res.headers["x-keip-writes-skipped"] == "0"
+
+
+@pytest.mark.parametrize("async_client", [False, True])
+def test_deploy_route_against_fake_api(fake_api, mocker, async_client):
+    """End-to-end through the real k8s_client and a fake API server."""
+    from routes.test.load_test.bench_deploy import make_routes
+
+    mocker.patch("config.K8S_ASYNC_CLIENT_ENABLED", async_client)
+
+    app = Starlette(routes=[Route("/route", deploy_route, methods=["PUT"])])
+    client = TestClient(app)
+    routes = make_routes(3, xml_bytes=256)
+
+    res = client.put("/route", json={"routes": routes})
+
+    assert res.status_code == 201
+    assert [r["status"] for r in res.json()] == [Status.CREATED] * 6
+    assert len(fake_api.objects("configmaps")) == 3
+    assert len(fake_api.objects("integrationroutes")) == 3
+
+    # Deployed again, the routes are checked against the cluster but not written
+    res = client.put("/route", json={"routes": routes})
+
+    assert [r["status"] for r in res.json()] == [Status.UNCHANGED] * 6
+    assert res.headers["X-Keip-Writes-Skipped"] == "6"
+
+    # Within 'ROUTE_DEDUPE_TTL_SECONDS', the routes' results are reused, as unchanged
+    mocker.patch.object(deploy._route_results, "ttl", 30.0)
+    client.put("/route", json={"routes": routes})
+    fake_api.reset_request_log()
+    res = client.put("/route", json={"routes": routes})
+
+    assert [r["status"] for r in res.json()] == [Status.UNCHANGED] * 6
+    assert fake_api.request_log == []
+
+
+def _stream_lines(res):
+    return [json.loads(line) for line in res.text.splitlines()]
+
+
+@pytest.mark.parametrize(
+    "params, headers",
+    [
+        ({"stream": "true"}, {}),
+        ({}, {"Accept": "application/x-ndjson"}),
+    ],
+)
+def test_deploy_route_stream(mock_k8s_client, test_client, params, headers):
+    def _create(route_data, snapshot):
+        if route_data.route_name == "bad-route":
+            raise ApiException(status=422, reason="Unprocessable Entity")
+        return (
+            Resource(name=f"{route_data.route_name}-cm", status=Status.CREATED),
+            Resource(name=route_data.route_name, status=Status.CREATED),
+        )
+
+    mock_k8s_client.create_route_resources.side_effect = _create
+    request_body = copy.deepcopy(body)
+    request_body["routes"].append(dict(request_body["routes"][0], name="bad-route"))
+
+    res = test_client.put(
+        "/route", json=request_body, params=params, headers=headers
+    )
+
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    *results, summary = _stream_lines(res)
+    by_name = {r["name"]: r for r in results}
+    assert by_name["my-route"]["error"] is None
+    assert by_name["my-route"]["resources"] == [
+        {"name": "my-route-cm", "status": "created"},
+        {"name": "my-route", "status": "created"},
+    ]
+    assert by_name["bad-route"]["resources"] == []
+    assert (
+        by_name["bad-route"]["error"]
+        == "Kubernetes API error: 422 Unprocessable Entity"
+    )
+    assert summary == {
+        "summary": {"total": 2, "succeeded": 1, "failed": 1, "writes_skipped": 0}
+    }
+
+
+def test_deploy_route_stream_hides_unexpected_errors(mock_k8s_client, test_client):
+    mock_k8s_client.create_route_resources.side_effect = Exception("secret details")
+
+    res = test_client.put("/route", json=body, params={"stream": "true"})
+
+    result, summary = _stream_lines(res)
+    assert result["error"] == "Internal server error"
+    assert not result["retryable"]
+    assert summary["summary"]["failed"] == 1
+
+
+def test_deploy_route_stream_validation_error(mock_k8s_client, test_client):
+    res = test_client.put("/route", json={}, params={"stream": "true"})
+
+    assert res.status_code == 422
+    assert res.json()["status"] == "error"
+
+
+def _mark_ready(fake_api, stop):
+    """Report the routes in the fake API server Ready for their generation, as the sync webhook would."""
+    while not stop.is_set():
+        for route in fake_api.objects("integrationroutes"):
+            metadata = route["metadata"]
+            if "status" not in route:
+                fake_api.set_status(
+                    "integrationroutes",
+                    metadata["namespace"],
+                    metadata["name"],
+                    {
+                        "expectedReplicas": 1,
+                        "readyReplicas": 1,
+                        "runningReplicas": 1,
+                        "conditions": [
+                            {
+                                "type": "Ready",
+                                "status": "True",
+                                "observedGeneration": metadata["generation"],
+                            }
+                        ],
+                    },
+                )
+        stop.wait(0.01)
+
+
+def test_deploy_route_wait_until_ready(fake_api):
+    from routes.test.load_test.bench_deploy import make_routes
+
+    app = Starlette(routes=[Route("/route", deploy_route, methods=["PUT"])])
+    client = TestClient(app)
+    stop = threading.Event()
+    marker = threading.Thread(target=_mark_ready, args=(fake_api, stop))
+    marker.start()
+    try:
+        res = client.put(
+            "/route",
+            json={"routes": make_routes(2, xml_bytes=256)},
+            params={"wait": "true"},
+        )
+    finally:
+        stop.set()
+        marker.join()
+
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    lines = _stream_lines(res)
+    assert [line["status"] for line in lines[:2]] == [201, 201]
+    assert lines[2]["summary"]["succeeded"] == 2
+    statuses = {}
+    for line in lines[3:-1]:
+        statuses[line["route_status"]["name"]] = line["route_status"]
+    assert {name: s["ready"] for name, s in statuses.items()} == {
+        "route-0": True,
+        "route-1": True,
+    }
+    assert statuses["route-0"]["readyReplicas"] == 1
+    assert lines[-1] == {
+        "wait": {"total": 2, "ready": 2, "not_ready": [], "timed_out": False}
+    }
+    # The watch is stopped with its last waiter
+    assert deploy.k8s_client._route_watch is None
+
+
+def test_deploy_route_wait_times_out(fake_api):
+    app = Starlette(routes=[Route("/route", deploy_route, methods=["PUT"])])
+    client = TestClient(app)
+
+    res = client.put("/route", json=body, params={"wait": "true", "timeout": "0.2"})
+
+    *_, status, wait = _stream_lines(res)
+    assert status["route_status"]["name"] == "my-route"
+    assert not status["route_status"]["ready"]
+    assert wait == {
+        "wait": {
+            "total": 1,
+            "ready": 0,
+            "not_ready": [{"name": "my-route", "namespace": "default"}],
+            "timed_out": True,
+        }
+    }
+
+
+def test_deploy_route_wait_invalid_timeout(mock_k8s_client, test_client):
+    res = test_client.put(
+        "/route", json=body, params={"wait": "true", "timeout": "-1"}
+    )
+
+    assert res.status_code == 400
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+@pytest.fixture
+def jobs_client():
+    from routes.deploy import cancel_job, get_job, retry_job
+
+    app = Starlette(
+        routes=[
+            Route("/route", deploy_route, methods=["PUT"]),
+            Route("/route/jobs/{job_id}", get_job, methods=["GET"]),
+            Route("/route/jobs/{job_id}", cancel_job, methods=["DELETE"]),
+            Route("/route/jobs/{job_id}/retry", retry_job, methods=["POST"]),
+        ]
+    )
+    # Entering the client keeps one event loop running, so background jobs outlive each request
+    with TestClient(app) as client:
+        yield client
+
+
+def _poll_job(client, location):
+    for _ in range(200):
+        job = client.get(location).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job at {location} did not finish")
+
+
+def test_deploy_route_async_job(mock_k8s_client, jobs_client):
+    mock_k8s_client.create_route_resources.return_value = (
+        Resource(name="my-route-cm", status=Status.CREATED),
+        Resource(name="my-route", status=Status.CREATED),
+    )
+
+    res = jobs_client.put("/route", json=body, params={"async": "true"})
+
+    assert res.status_code == 202
+    assert res.headers["location"] == f"/route/jobs/{res.json()['id']}"
+    assert res.json()["status"] == "queued"
+    assert res.json()["total"] == 1
+
+    job = _poll_job(jobs_client, res.headers["location"])
+
+    assert job["status"] == "succeeded"
+    assert job["completed"] == 1
+    assert job["results"] == [
+        {
+            "name": "my-route",
+            "namespace": "default",
+            "status": 201,
+            "resources": [
+                {"name": "my-route-cm", "status": "created"},
+                {"name": "my-route", "status": "created"},
+            ],
+            "error": None,
+            "retryable": False,
+            "retry_after": None,
+        }
+    ]
+
+
+def test_deploy_route_async_job_cancel(mock_k8s_client, jobs_client):
+    mock_k8s_client.create_route_resources.side_effect = lambda *_: time.sleep(0.2)
+
+    location = jobs_client.put(
+        "/route", json=body, params={"async": "true"}
+    ).headers["location"]
+    res = jobs_client.delete(location)
+
+    assert res.status_code == 200
+    assert _poll_job(jobs_client, location)["status"] == "cancelled"
+
+
+def test_deploy_route_async_job_not_found(jobs_client):
+    assert jobs_client.get("/route/jobs/unknown").status_code == 404
+    assert jobs_client.delete("/route/jobs/unknown").status_code == 404
+    assert jobs_client.post("/route/jobs/unknown/retry").status_code == 404
+
+
+def test_deploy_route_async_job_retry_failed(mock_k8s_client, jobs_client):
+    outage = {"down": True}
+    deployed = []
+
+    def _create(route_data, snapshot):
+        if route_data.route_name == "bad-route" and outage["down"]:
+            raise ApiException(status=503, reason="Service Unavailable")
+        deployed.append(route_data.route_name)
+        return _created(route_data, snapshot)
+
+    mock_k8s_client.create_route_resources.side_effect = _create
+    request_body = copy.deepcopy(body)
+    request_body["routes"].append(dict(request_body["routes"][0], name="bad-route"))
+
+    location = jobs_client.put(
+        "/route", json=request_body, params={"async": "true"}
+    ).headers["location"]
+    job = _poll_job(jobs_client, location)
+    assert (job["status"], job["failed"]) == ("failed", 1)
+
+    outage["down"] = False
+    res = jobs_client.post(f"{location}/retry")
+
+    assert res.status_code == 202
+    assert res.json()["total"] == 1
+    retried = _poll_job(jobs_client, res.headers["location"])
+    assert retried["status"] == "succeeded"
+    assert [r["name"] for r in retried["results"]] == ["bad-route"]
+    # Only the failed route was deployed again
+    assert deployed == ["my-route", "bad-route"]
+
+    res = jobs_client.post(f"{res.headers['location']}/retry")
+    assert res.status_code == 409
+    assert res.text == "Job has no failed routes to retry"
+
+
+def test_deploy_route_async_job_retry_unfinished(mock_k8s_client, jobs_client):
+    mock_k8s_client.create_route_resources.side_effect = lambda *_: time.sleep(0.2)
+
+    location = jobs_client.put(
+        "/route", json=body, params={"async": "true"}
+    ).headers["location"]
+
+    res = jobs_client.post(f"{location}/retry")
+
+    assert res.status_code == 409
+    assert res.text == "Job has not finished yet"
+    _poll_job(jobs_client, location)
+
+
+def test_deploy_route_async_queue_full(mock_k8s_client, jobs_client, mocker):
+    from core.jobs import QueueFullError
+
+    mocker.patch("routes.deploy.jobs.submit", side_effect=QueueFullError("full"))
+
+    res = jobs_client.put("/route", json=body, params={"async": "true"})
+
+    assert res.status_code == 503
+    assert res.headers["retry-after"] == "30"
+
+
+def _created(route_data, snapshot):
+    return (Resource(name=route_data.route_name, status=Status.CREATED),)
+
+
+def test_deploy_route_reports_every_invalid_route(mock_k8s_client, test_client):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {
+        "routes": [
+            dict(route, name="Invalid"),
+            dict(route, name="not-deployed"),
+            dict(route, name="also_invalid"),
+        ]
+    }
+
+    res = test_client.put("/route", json=request_body)
+
+    assert res.status_code == 422
+    assert [e["loc"] for e in res.json()["errors"]] == [
+        ["routes", 0, "name"],
+        ["routes", 2, "name"],
+    ]
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+def test_deploy_route_reports_invalid_routes_after_deployed_ones(
+    mock_k8s_client, test_client
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {
+        "routes": [
+            route,
+            dict(route, name="Invalid"),
+            dict(route, name="not-deployed"),
+            dict(route, name="also_invalid"),
+        ]
+    }
+
+    res = test_client.put("/route", json=request_body)
+
+    assert res.status_code == 207
+    results = res.json()["results"]
+    assert [(r["name"], r["status"]) for r in results] == [
+        ("my-route", 201),
+        ("Invalid", 422),
+        ("not-deployed", 424),
+        ("also_invalid", 422),
+    ]
+    assert results[1]["error"].startswith("Validation failed: name:")
+    assert results[2]["retryable"]
+    assert res.json()["summary"]["failed"] == 3
+    deployed = [
+        c.args[0].route_name
+        for c in mock_k8s_client.create_route_resources.call_args_list
+    ]
+    assert deployed == ["my-route"]
+
+
+def test_deploy_route_stream_reports_invalid_routes(mock_k8s_client, test_client):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {"routes": [dict(route, name="Invalid"), route]}
+
+    res = test_client.put("/route", json=request_body, params={"stream": "true"})
+
+    *results, summary = _stream_lines(res)
+    by_name = {r["name"]: r for r in results}
+    assert by_name["Invalid"]["error"].startswith("Validation failed: name:")
+    assert by_name["my-route"]["error"] is None
+    assert summary["summary"]["failed"] == 1
+
+
+@pytest.mark.parametrize(
+    "limit, size",
+    [("ROUTE_MAX_BODY_BYTES", 1024), ("ROUTE_MAX_ITEM_BYTES", 512)],
+)
+def test_deploy_route_too_large(mock_k8s_client, test_client, mocker, limit, size):
+    mocker.patch(f"config.{limit}", size)
+    route = dict(body["routes"][0], xml="<beans/>" + " " * 600)
+
+    res = test_client.put("/route", json={"routes": [route, route]})
+
+    assert res.status_code == 413
+
+
+def test_deploy_route_invalid_json(mock_k8s_client, test_client):
+    res = test_client.put(
+        "/route",
+        content=b'{"routes": [{"name": ]}',
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert res.status_code == 400
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+def test_dispatch_reads_no_further_than_the_routes_in_flight(mocker):
+    from routes.deploy import _dispatch
+
+    mocker.patch("config.DEPLOY_MAX_CONCURRENCY", 2)
+    route = body["routes"][0]
+    read = []
+
+    async def _routes():
+        for i in range(10):
+            read.append(i)
+            yield route
+
+    async def _run():
+        release = asyncio.Event()
+
+        async def _slow(route):
+            await release.wait()
+            return len(read)
+
+        # Two routes in flight, and a third read but waiting for a slot
+        dispatched = _dispatch(_routes(), _slow)
+        first = asyncio.ensure_future(dispatched.__anext__())
+        await asyncio.sleep(0.05)
+        in_flight = len(read)
+        release.set()
+        await first
+        rest = [result async for _, result in dispatched]
+        return in_flight, len(rest) + 1
+
+    assert asyncio.run(_run()) == (3, 10)
+
+
+def test_deploy_route_rejects_invalid_xml(mock_k8s_client, test_client):
+    xml = body["routes"][0]["xml"].replace("</beans>", "</bean>")
+    route = dict(body["routes"][0], xml=xml)
+
+    res = test_client.put("/route", json={"routes": [route]})
+
+    assert res.status_code == 422
+    [error] = res.json()["errors"]
+    assert error["loc"] == ["routes", 0, "xml"]
+    assert error["msg"] == "line 17, column 2: mismatched tag"
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+def _checking_in_parallel(mocker, delay=0.05):
+    """Slow the XML check down, failing the routes marked invalid, and count the checks running at once."""
+    checks = {"running": 0, "peak": 0}
+
+    async def _check(xml):
+        checks["running"] += 1
+        checks["peak"] = max(checks["peak"], checks["running"])
+        try:
+            await asyncio.sleep(delay if "invalid" in xml else delay / 5)
+        finally:
+            checks["running"] -= 1
+        if "invalid" in xml:
+            raise deploy.xml_preflight.XmlPreflightError("invalid route")
+
+    mocker.patch.object(deploy.xml_preflight, "check_route_xml_async", _check)
+    return checks
+
+
+def test_deploy_route_checks_xml_in_parallel(mock_k8s_client, test_client, mocker):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    checks = _checking_in_parallel(mocker)
+    routes = [dict(body["routes"][0], name=f"route-{i}") for i in range(4)]
+
+    res = test_client.put("/route", json={"routes": routes})
+
+    assert res.status_code == 201
+    assert checks["peak"] == 4
+
+
+def test_deploy_route_async_job_checks_xml_in_parallel(
+    mock_k8s_client, jobs_client, mocker
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    checks = _checking_in_parallel(mocker)
+    routes = [dict(body["routes"][0], name=f"route-{i}") for i in range(4)]
+    routes[2]["xml"] += "<!-- invalid -->"
+
+    res = jobs_client.put("/route", json={"routes": routes}, params={"async": "true"})
+
+    assert res.status_code == 422
+    assert [e["loc"] for e in res.json()["errors"]] == [["routes", 2, "xml"]]
+    assert checks["peak"] == 4
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+def test_deploy_route_waits_for_the_checks_of_earlier_routes(
+    mock_k8s_client, test_client, mocker
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    _checking_in_parallel(mocker)
+    routes = [dict(body["routes"][0], name=f"route-{i}") for i in range(4)]
+    # Checked last, after the routes behind it passed their own checks
+    routes[1]["xml"] += "<!-- invalid -->"
+
+    res = test_client.put("/route", json={"routes": routes})
+
+    assert res.status_code == 207
+    assert [(r["name"], r["status"]) for r in res.json()["results"]] == [
+        ("route-0", 201),
+        ("route-1", 422),
+        ("route-2", 424),
+        ("route-3", 424),
+    ]
+    deployed = [
+        c.args[0].route_name
+        for c in mock_k8s_client.create_route_resources.call_args_list
+    ]
+    assert deployed == ["route-0"]
+
+    routes[0]["xml"] += "<!-- invalid -->"
+    res = test_client.put("/route", json={"routes": routes})
+
+    assert res.status_code == 422
+    assert [e["loc"] for e in res.json()["errors"]] == [
+        ["routes", 0, "xml"],
+        ["routes", 1, "xml"],
+    ]
+    assert mock_k8s_client.create_route_resources.call_count == 1
+
+
+@pytest.mark.parametrize("params", [{}, {"stream": "true"}])
+def test_deploy_route_idempotency_key_replays_response(
+    mock_k8s_client, test_client, params
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    headers = {"Idempotency-Key": "deploy-1"}
+
+    first = test_client.put("/route", json=body, params=params, headers=headers)
+    deploy._route_results.clear()
+    second = test_client.put("/route", json=body, params=params, headers=headers)
+
+    assert second.status_code == first.status_code
+    assert second.content == first.content
+    assert second.headers["content-type"] == first.headers["content-type"]
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert mock_k8s_client.create_route_resources.call_count == 1
+
+
+def test_deploy_route_idempotency_key_reused_with_other_body(
+    mock_k8s_client, test_client
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    headers = {"Idempotency-Key": "deploy-1"}
+    other = {"routes": [dict(body["routes"][0], name="other-route")]}
+
+    test_client.put("/route", json=body, headers=headers)
+    res = test_client.put("/route", json=other, headers=headers)
+
+    assert res.status_code == 422
+    assert mock_k8s_client.create_route_resources.call_count == 1
+
+
+def test_deploy_route_idempotency_key_too_long(mock_k8s_client, test_client):
+    res = test_client.put("/route", json=body, headers={"Idempotency-Key": "k" * 256})
+
+    assert res.status_code == 400
+    mock_k8s_client.create_route_resources.assert_not_called()
+
+
+def test_deploy_route_failures_are_not_replayed(mock_k8s_client, test_client):
+    errors = iter([Exception("transient")])
+
+    def _flaky(route_data, snapshot):
+        error = next(errors, None)
+        if error:
+            raise error
+        return _created(route_data, snapshot)
+
+    mock_k8s_client.create_route_resources.side_effect = _flaky
+    headers = {"Idempotency-Key": "deploy-1"}
+
+    assert test_client.put("/route", json=body, headers=headers).status_code == 207
+    assert test_client.put("/route", json=body, headers=headers).status_code == 201
+
+
+def test_deploy_route_streamed_failures_are_not_replayed(mock_k8s_client, test_client):
+    errors = iter([ApiException(status=503, reason="Service Unavailable")])
+
+    def _flaky(route_data, snapshot):
+        error = next(errors, None)
+        if error:
+            raise error
+        return _created(route_data, snapshot)
+
+    mock_k8s_client.create_route_resources.side_effect = _flaky
+    headers = {"Idempotency-Key": "deploy-1"}
+    params = {"stream": "true"}
+
+    first = test_client.put("/route", json=body, params=params, headers=headers)
+    second = test_client.put("/route", json=body, params=params, headers=headers)
+
+    assert _stream_lines(first)[0]["status"] == 503
+    assert "idempotent-replayed" not in second.headers
+    assert _stream_lines(second)[0]["status"] == 201
+    assert mock_k8s_client.create_route_resources.call_count == 2
+
+
+def test_deploy_route_collapses_duplicate_routes(mock_k8s_client, test_client):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {"routes": [route, route, dict(route, name="other-route")]}
+
+    res = test_client.put("/route", json=request_body)
+
+    assert res.status_code == 201
+    assert [r["name"] for r in res.json()] == ["my-route", "other-route"]
+    assert mock_k8s_client.create_route_resources.call_count == 2
+
+
+def test_deploy_route_redeploys_recent_deployments(mock_k8s_client, test_client):
+    mock_k8s_client.create_route_resources.side_effect = _created
+
+    for _ in range(2):
+        assert test_client.put("/route", json=body).status_code == 201
+
+    # Resources edited or deleted since are repaired
+    assert mock_k8s_client.create_route_resources.call_count == 2
+
+
+def test_deploy_route_reuses_recent_deployments(
+    mock_k8s_client, test_client, mocker
+):
+    mocker.patch.object(deploy._route_results, "ttl", 30.0)
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    changed = {"routes": [dict(route, xml=route["xml"] + " ")]}
+
+    statuses = [
+        test_client.put("/route", json=request_body).json()[0]["status"]
+        for request_body in (body, body, changed)
+    ]
+
+    assert statuses == [Status.CREATED, Status.UNCHANGED, Status.CREATED]
+    assert mock_k8s_client.create_route_resources.call_count == 2
+
+
+def test_deploy_route_rate_limited_client(mock_k8s_client, test_client, mocker):
+    from core.rate_limit import FairRateLimiter
+
+    mocker.patch(
+        "routes.deploy._rate_limiter",
+        FairRateLimiter("test-client", 0, 1, client_rate=0.01, client_burst=1),
+    )
+    mock_k8s_client.create_route_resources.side_effect = _created
+
+    assert test_client.put("/route", json=body).status_code == 201
+    res = test_client.put("/route", json=body)
+
+    assert res.status_code == 429
+    assert res.headers["retry-after"] == "100"
+    assert mock_k8s_client.create_route_resources.call_count == 1
+
+
+def test_deploy_route_stream_rate_limited_namespace(
+    mock_k8s_client, test_client, mocker
+):
+    from core.rate_limit import FairRateLimiter
+
+    mocker.patch(
+        "routes.deploy._rate_limiter",
+        FairRateLimiter("test-namespace", 0, 1, key_rate=0.01, key_burst=1),
+    )
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {"routes": [route, dict(route, name="other-route")]}
+
+    res = test_client.put("/route", json=request_body, params={"stream": "true"})
+
+    *results, summary = _stream_lines(res)
+    [limited] = [r for r in results if r["error"]]
+    assert limited["error"].startswith("Namespace rate limit exceeded, retry after")
+    assert limited["retry_after"] == 100
+    assert summary["summary"]["failed"] == 1
+
+
+def test_deploy_route_rate_limited_routes(mock_k8s_client, test_client, mocker):
+    from core.rate_limit import FairRateLimiter
+
+    mocker.patch(
+        "routes.deploy._rate_limiter",
+        FairRateLimiter("test-namespace", 0, 1, key_rate=0.01, key_burst=1),
+    )
+    mock_k8s_client.create_route_resources.side_effect = _created
+    route = body["routes"][0]
+    request_body = {
+        "routes": [route, dict(route, name="second"), dict(route, name="third")]
+    }
+
+    res = test_client.put("/route", json=request_body)
+
+    assert res.status_code == 207
+    assert res.headers["retry-after"] == "100"
+    assert [r["retry_after"] for r in res.json()["results"]] == [None, 100, 100]
+
+    # None of them get through
+    res = test_client.put("/route", json={"routes": request_body["routes"][1:]})
+
+    assert res.status_code == 429
+    assert res.headers["retry-after"] == "100"
+    assert res.text.startswith("Namespace rate limit exceeded")
+
+
+def _tar_gz(files):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for path, data in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, data in files.items():
+            archive.writestr(path, data)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize(
+    "archive, content_type",
+    [(_tar_gz, "application/gzip"), (_zip, "application/zip")],
+)
+def test_deploy_route_archive(mock_k8s_client, test_client, archive, content_type):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    xml = body["routes"][0]["xml"].encode()
+    files = {
+        "default/my-route.xml": xml,
+        "./other/second-route.xml": xml,
+        "README.md": b"Not a route",
+        "__MACOSX/default/._my-route.xml": b"Not a route either",
+    }
+
+    res = test_client.put(
+        "/route", content=archive(files), headers={"Content-Type": content_type}
+    )
+
+    assert res.status_code == 201
+    assert sorted(r["name"] for r in res.json()) == ["my-route", "second-route"]
+    deployed = sorted(
+        (c.args[0].namespace, c.args[0].route_name, c.args[0].route_xml)
+        for c in mock_k8s_client.create_route_resources.call_args_list
+    )
+    assert deployed == [
+        ("default", "my-route", xml.decode()),
+        ("other", "second-route", xml.decode()),
+    ]
+
+
+def test_deploy_route_archive_stream_reports_invalid_entries(
+    mock_k8s_client, test_client
+):
+    mock_k8s_client.create_route_resources.side_effect = _created
+    xml = body["routes"][0]["xml"].encode()
+    files = {
+        "default/my-route.xml": xml,
+        "default/Invalid.xml": xml,
+        "no-namespace.xml": xml,
+        "default/not-xml.xml": b"<beans>",
+    }
+
+    res = test_client.put(
+        "/route",
+        content=_tar_gz(files),
+        params={"stream": "true"},
+        headers={"Content-Type": "application/x-gtar"},
+    )
+
+    *results, summary = _stream_lines(res)
+    by_name = {r["name"]: r for r in results}
+    assert by_name["my-route"]["error"] is None
+    assert by_name["Invalid"]["error"].startswith("Validation failed: name:")
+    assert by_name["no-namespace"]["error"].startswith("Validation failed: path:")
+    assert by_name["not-xml"]["error"].startswith("Validation failed: xml:")
+    assert summary["summary"]["failed"] == 3
+
+
+def test_deploy_route_archive_validation_errors(mock_k8s_client, test_client):
+    files = {"default/Invalid.xml": body["routes"][0]["xml"].encode()}
+
+    res = test_client.put(
+        "/route", content=_zip(files), headers={"Content-Type": "application/zip"}
+    )
+
+    assert res.status_code == 422
+    assert [e["loc"] for e in res.json()["errors"]] == [
+        ["archive", "default/Invalid.xml", "name"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "content, status",
+    [
+        (b"not an archive", 400),
+        (_zip({"default/my-route.xml": b" " * 1024}), 413),
+        (_zip({"big.bin": b" " * 4096, "default/my-route.xml": b"<beans/>"}), 413),
+        (_zip({"README.md": b"Not a route"}), 422),
+    ],
+)
+def test_deploy_route_invalid_archive(
+    mock_k8s_client, test_client, mocker, content, status
+):
+    mocker.patch("config.ROUTE_MAX_ITEM_BYTES", 512)
+    mocker.patch("config.ROUTE_MAX_INFLATED_BYTES", 2048)
+
+    res = test_client.put(
+        "/route", content=content, headers={"Content-Type": "application/zip"}
+    )
+
+    assert res.status_code == status
+    mock_k8s_client.create_route_resources.assert_not_called()
@@ -0,0 +1,248 @@
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core import k8s_client
+from core.route_payload import minify_xml
+from models import RouteData
+from routes.read import get_route, list_routes
+
+ROUTES = [
+    ("default", "a"),
+    ("default", "b"),
+    ("default", "c"),
+    ("other", "a"),
+    ("other", "d"),
+]
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    app = Starlette(
+        routes=[
+            Route("/route", list_routes, methods=["GET"]),
+            Route("/route/{namespace}/{name}", get_route, methods=["GET"]),
+        ]
+    )
+    return TestClient(app)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for condition"
+        time.sleep(0.01)
+
+
+def _deploy(namespace, name, xml="<beans/>"):
+    k8s_client.create_route_resources(
+        RouteData(route_name=name, namespace=namespace, route_xml=xml)
+    )
+
+
+def _cached(namespace, name, resource_version=None):
+    """Wait for the informer to hold the route, in a version newer than `resource_version`."""
+
+    def _synced():
+        cached, route = k8s_client.cached_object("IntegrationRoute", namespace, name)
+        return route is not None and (
+            route["metadata"]["resourceVersion"] != resource_version
+        )
+
+    _wait_for(_synced)
+
+
+@pytest.fixture
+def cache(fake_api, monkeypatch):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_ENABLED", True)
+    k8s_client._ensure_configured()
+    for namespace, name in ROUTES:
+        _deploy(namespace, name)
+    for namespace, name in ROUTES:
+        _cached(namespace, name)
+    _wait_for(lambda: len(k8s_client._informers["ConfigMap"].store) == len(ROUTES))
+    return fake_api
+
+
+def _names(res):
+    return [(r["namespace"], r["name"]) for r in res.json()["routes"]]
+
+
+def test_list_routes(cache, test_client):
+    cache.reset_request_log()
+
+    res = test_client.get("/route")
+
+    assert res.status_code == 200
+    # Served from the informer cache
+    assert cache.request_log == []
+    assert _names(res) == ROUTES
+    route = res.json()["routes"][0]
+    assert route["configMaps"] == [
+        {
+            "name": "a-cm",
+            "resourceVersion": cache.get_object("configmaps", "default", "a-cm")[
+                "metadata"
+            ]["resourceVersion"],
+        }
+    ]
+    assert route["status"]["ready"] is False
+    assert route["digest"]
+    assert "xml" not in route
+    assert res.json()["continue"] == ""
+
+
+def test_list_routes_pages(cache, test_client):
+    first = test_client.get("/route", params={"limit": 2})
+    # Routes added and removed before the position reached don't shift the next pages
+    _deploy("default", "0")
+    k8s_client.routeApi.delete_namespaced_custom_object(
+        k8s_client.ROUTE_API_GROUP,
+        k8s_client.ROUTE_API_VERSION,
+        "default",
+        k8s_client.ROUTE_PLURAL,
+        "a",
+    )
+    _cached("default", "0")
+    _wait_for(
+        lambda: k8s_client.cached_object("IntegrationRoute", "default", "a")[1] is None
+    )
+    second = test_client.get(
+        "/route", params={"limit": 2, "continue": first.json()["continue"]}
+    )
+    third = test_client.get(
+        "/route", params={"limit": 2, "continue": second.json()["continue"]}
+    )
+
+    assert _names(first) == ROUTES[:2]
+    assert first.json()["remaining"] == 3
+    assert _names(second) == ROUTES[2:4]
+    assert _names(third) == ROUTES[4:]
+    assert third.json()["continue"] == ""
+
+
+def test_list_routes_filters(cache, test_client):
+    version = cache.get_object("integrationroutes", "other", "d")["metadata"]
+    k8s_client.routeApi.patch_namespaced_custom_object(
+        k8s_client.ROUTE_API_GROUP,
+        k8s_client.ROUTE_API_VERSION,
+        "other",
+        k8s_client.ROUTE_PLURAL,
+        "d",
+        {"metadata": {"labels": {"team": "blue"}}},
+    )
+    _cached("other", "d", version["resourceVersion"])
+
+    by_namespace = test_client.get("/route", params={"namespace": "other"})
+    by_label = test_client.get("/route", params={"labelSelector": "team in (blue)"})
+    without_label = test_client.get(
+        "/route", params={"namespace": "other", "labelSelector": "!team"}
+    )
+
+    assert _names(by_namespace) == [("other", "a"), ("other", "d")]
+    assert _names(by_label) == [("other", "d")]
+    assert _names(without_label) == [("other", "a")]
+
+
+def test_list_routes_continue_token_is_bound_to_its_query(cache, test_client):
+    first = test_client.get("/route", params={"limit": 1, "namespace": "other"})
+
+    res = test_client.get(
+        "/route", params={"limit": 1, "continue": first.json()["continue"]}
+    )
+
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"limit": "0"},
+        {"limit": "many"},
+        {"continue": "not-a-token"},
+        {"labelSelector": "team in (blue"},
+    ],
+)
+def test_list_routes_invalid_params(cache, test_client, params):
+    res = test_client.get("/route", params=params)
+
+    assert res.status_code == 400
+
+
+def test_list_routes_etag(cache, test_client):
+    res = test_client.get("/route")
+    etag = res.headers["ETag"]
+
+    not_modified = test_client.get("/route", headers={"If-None-Match": etag})
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.content == b""
+
+    version = cache.get_object("integrationroutes", "default", "b")["metadata"]
+    cache.set_status("integrationroutes", "default", "b", {"readyReplicas": 1})
+    _cached("default", "b", version["resourceVersion"])
+
+    modified = test_client.get("/route", headers={"If-None-Match": etag})
+
+    assert modified.status_code == 200
+    assert modified.headers["ETag"] != etag
+
+
+def test_get_route(cache, test_client):
+    res = test_client.get("/route/other/d")
+
+    assert res.status_code == 200
+    assert res.json()["name"] == "d"
+    assert res.json()["xml"] == "<beans/>"
+    etag = res.headers["ETag"]
+    route = cache.get_object("integrationroutes", "other", "d")
+    configmap = cache.get_object("configmaps", "other", "d-cm")
+    assert etag == (
+        f'"{route["metadata"]["resourceVersion"]}.'
+        f'{configmap["metadata"]["resourceVersion"]}"'
+    )
+
+    cache.reset_request_log()
+    not_modified = test_client.get(
+        "/route/other/d", headers={"If-None-Match": f"W/{etag}"}
+    )
+
+    assert not_modified.status_code == 304
+    assert cache.request_log == []
+
+
+def test_get_compressed_route(cache, test_client, monkeypatch):
+    monkeypatch.setattr("config.ROUTE_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr("config.ROUTE_COMPRESSION_MIN_BYTES", 64)
+    monkeypatch.setattr("config.ROUTE_CHUNK_BYTES", 64)
+    xml = (
+        "<beans>\n"
+        + "".join(f'    <bean id="b{i}" class="C{i * 7919}"/>\n' for i in range(50))
+        + "</beans>"
+    )
+    version = cache.get_object("integrationroutes", "default", "c")["metadata"]
+    _deploy("default", "c", xml)
+    _cached("default", "c", version["resourceVersion"])
+
+    res = test_client.get("/route/default/c")
+
+    assert res.json()["compressed"]
+    assert len(res.json()["configMaps"]) > 1
+    assert res.json()["xml"] == minify_xml(xml)
+
+
+def test_get_missing_route(cache, test_client):
+    res = test_client.get("/route/default/missing")
+
+    assert res.status_code == 404
+
+
+def test_reads_need_the_informers(test_client, monkeypatch):
+    monkeypatch.setattr(k8s_client.cfg, "K8S_INFORMER_ENABLED", False)
+
+    assert test_client.get("/route").status_code == 503
+    assert test_client.get("/route/default/a").status_code == 503
@@ -71,3 +71,41 @@ def test_sync_endpoint_empty_body(test_client, endpoint, status_code):
 @pytest.fixture(scope="module")
 def test_client():
     return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "endpoint, request_file, expected_spans",
+    [
+        (
+            "/webhook/sync",
+            "full-route-request.json",
+            ["read", "decode", "status", "children", "sync", "encode"],
+        ),
+        (
+            "/webhook/addons/certmanager/sync",
+            "full-cert-request.json",
+            ["read", "decode", "certificate", "sync", "encode"],
+        ),
+    ],
+)
+def test_sync_endpoint_server_timing(
+    test_client, endpoint, request_file, expected_spans
+):
+    request = load_json_as_dict(
+        f"{os.path.dirname(os.path.abspath(__file__))}/json/{request_file}"
+    )
+
+    response = test_client.post(endpoint, json=request)
+
+    server_timing = response.headers["Server-Timing"]
+    metrics = [m.split(";")[0].strip() for m in server_timing.split(",")]
+    assert metrics == expected_spans + ["total"]
+
+
+def test_metrics_endpoint(test_client):
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE keip_k8s_throttle_wait_seconds histogram" in response.text
+    assert 'keip_concurrency_limit{limiter="deploy"} 64' in response.text
@@ -1,6 +1,7 @@
+import json
 import logging
 from json import JSONDecodeError
-from typing import Callable, Mapping
+from typing import Callable, Mapping, Optional
 
 from starlette.exceptions import HTTPException
 from starlette.requests import Request
@@ -9,6 +10,8 @@ from starlette.routing import Route
 from starlette.status import HTTP_400_BAD_REQUEST
 
 from core.sync import sync
+from core.tracing import span
+from routes.capture import TrafficCapture, get_configured_capture
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -20,12 +23,21 @@ def _summarize_request(body: dict) -> str:
     return f"name={metadata.get('name')}, namespace={metadata.get('namespace')}, generation={metadata.get('generation')}"
 
 
-def build_webhook(sync_func: Callable[[Mapping], Mapping]):
+def build_webhook(
+    sync_func: Callable[[Mapping], Mapping],
+    capture: Optional[TrafficCapture] = None,
+):
+    capture = capture or get_configured_capture()
+
     async def webhook(request: Request):
         try:
-            body = await request.json()
+            with span("read"):
+                raw_body = await request.body()
+            with span("decode"):
+                body = json.loads(raw_body)
             _LOGGER.debug("Webhook request: %s", _summarize_request(body))
-            response = sync_func(body)
+            with span("sync"):
+                response = sync_func(body)
         except JSONDecodeError as e:
             raise HTTPException(
                 status_code=HTTP_400_BAD_REQUEST,
@@ -44,7 +56,13 @@ def build_webhook(sync_func: Callable[[Mapping], Mapping]):
             )
 
         _LOGGER.debug("Webhook response: status=%s", response.get("status", {}))
-        return JSONResponse(response)
+
+        if capture and capture.should_sample():
+            with span("capture"):
+                capture.record(request.url.path, body, response)
+
+        with span("encode"):
+            return JSONResponse(response)
 
     return webhook
 